@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import trio
+
+from iotfs.utils._fs_utils import Updates, normalize_update_path
+from iotfs.utils import _logging
+
+
+class Adapter():
+
+    """
+    Adapter is the base class of every input adapter. An adapter defines the way data flows into the filesystem.
+    A subclass implements produce, which reads its source and sends (operation, path, payload) updates
+    into a bounded channel. When the channel is full, produce is blocked until the updates are applied.
+    Updates are collected into batches, which are applied to the filesystem with a single bulk update.
+
+    ...
+
+    Attributes
+    ----------
+    root : str, optional
+        a path relative to the mountpoint, below which all updates are applied
+    batch_size : int, optional
+        maximum amount of updates in a batch
+    batch_interval : float, optional
+        maximum seconds a batch waits for further updates
+    buffer_size : int, optional
+        maximum amount of updates waiting to be applied
+
+    """
+
+    def __init__(self, root="", batch_size=1000, batch_interval=0.05, buffer_size=10000):
+        """
+        Parameters
+        ----------
+        root : str, optional
+            a path relative to the mountpoint, below which all updates are applied
+        batch_size : int, optional
+            maximum amount of updates in a batch
+        batch_interval : float, optional
+            maximum seconds a batch waits for further updates
+        buffer_size : int, optional
+            maximum amount of updates waiting to be applied
+        """
+
+        self.log = _logging.create_logger(self.__class__.__name__)
+        self.root = root.strip(os.sep)
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.buffer_size = buffer_size
+        self.received = 0
+        self.applied = 0
+        self.batches = 0
+
+    async def run(self, target):
+        """ Runs the adapter until its source is exhausted.
+
+        Parameters
+        ----------
+        target : iotfs.filesystem.fs.FileSystem or iotfs.filesystem.data.data.Data
+            an object providing apply_updates
+        """
+
+        send_channel, receive_channel = trio.open_memory_channel(self.buffer_size)
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(self.__consume, receive_channel, target)
+            async with send_channel:
+                await self.produce(send_channel)
+
+    async def produce(self, channel):
+        """ Reads the source of the adapter and sends updates into channel. Needs to be implemented by a subclass.
+
+        """
+        raise NotImplementedError("Adapter needs to implement produce.")
+
+    def update(self, path, payload, operation=Updates.WRITE):
+        """ Creates an update of path below root.
+
+        Raises
+        ------
+        ValueError
+            If path contains ".." or the update would change a reserved directory of the filesystem, e.g. .iotfs.
+        """
+        return (operation, normalize_update_path(self.root + os.sep + path), payload)
+
+    async def apply(self, target, batch, atomic=False):
+        """ Applies a batch while no handler of the filesystem changes any inode.
+        Returns the amount of applied updates, see iotfs.filesystem.data.data.Data.apply_updates.
+
+        """
+        data = target.data if hasattr(target, "data") else target
+        async with data.locks.all():
+            return target.apply_updates(batch, atomic=atomic)
+
+    async def __consume(self, channel, target):
+        async with channel:
+            while True:
+                try:
+                    batch = [await channel.receive()]
+                except trio.EndOfChannel:
+                    return
+                closed = await self.__fill(channel, batch)
+                self.received += len(batch)
+                try:
+                    self.applied += await self.apply(target, batch)
+                    self.batches += 1
+                except Exception as e:
+                    self.log.error("Applying batch of %d updates failed: %s", len(batch), e)
+                if closed:
+                    return
+
+    async def __fill(self, channel, batch):
+        """ Adds further updates to batch until it is full or the batch interval is over.
+        Returns True, if the channel is closed.
+
+        """
+        deadline = trio.current_time() + self.batch_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(channel.receive_nowait())
+                continue
+            except trio.WouldBlock:
+                pass
+            except trio.EndOfChannel:
+                return True
+            with trio.move_on_at(deadline):
+                try:
+                    batch.append(await channel.receive())
+                except trio.EndOfChannel:
+                    return True
+                continue
+            break
+        return False
+
+
+def parse_line(line):
+    """ Parses a line of bytes in the form "path payload" into a path and a payload.
+
+    Raises
+    ------
+    ValueError
+        If the line contains no path.
+    """
+
+    parts = line.strip().split(None, 1)
+    if len(parts) == 0:
+        raise ValueError("Line contains no path.")
+    if len(parts) == 1:
+        return os.fsdecode(parts[0]), b""
+    return os.fsdecode(parts[0]), parts[1]
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import trio
+
+from iotfs.adapters.adapter import Adapter
+from iotfs.utils._fs_utils import Updates
+
+
+def _scan(directory):
+    """ Returns a dict of relative file paths and their (mtime, size) below directory.
+
+    """
+    files = dict()
+    for dir_path, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(dir_path, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files[os.path.relpath(path, directory)] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def _read(directory, paths):
+    contents = []
+    for path in paths:
+        try:
+            with open(os.path.join(directory, path), "rb") as f:
+                contents.append((path, f.read()))
+        except OSError:
+            continue
+    return contents
+
+
+class DirectoryAdapter(Adapter):
+
+    """
+    DirectoryAdapter watches a directory of the host and mirrors its files into the filesystem.
+    The directory is scanned every interval. New and changed files are written, removed files are removed.
+    Scanning and reading run in a worker thread.
+
+    ...
+
+    Attributes
+    ----------
+    directory : str
+        a directory to watch
+    interval : float, optional
+        seconds between two scans
+    root : str, optional
+        a path relative to the mountpoint, below which all updates are applied
+
+    """
+
+    def __init__(self, directory, interval=1.0, root="", **kwargs):
+        """
+        Parameters
+        ----------
+        directory : str
+            a directory to watch
+        interval : float, optional
+            seconds between two scans
+        root : str, optional
+            a path relative to the mountpoint, below which all updates are applied
+        """
+
+        super().__init__(root=root, **kwargs)
+        self.directory = directory
+        self.interval = interval
+        self.files = dict()
+
+    async def produce(self, channel):
+        while True:
+            files = await trio.to_thread.run_sync(_scan, self.directory)
+            changed = [path for path in files if self.files.get(path) != files[path]]
+            removed = [path for path in self.files if path not in files]
+            for path, content in await trio.to_thread.run_sync(_read, self.directory, changed):
+                await self.__send(channel, path, content, Updates.WRITE)
+            for path in removed:
+                await self.__send(channel, path, b"", Updates.REMOVE)
+            self.files = files
+            await trio.sleep(self.interval)
+
+    async def __send(self, channel, path, payload, operation):
+        try:
+            update = self.update(path, payload, operation=operation)
+        except ValueError as e:
+            self.log.warning("Skipped file %s: %s", path, e)
+            return
+        await channel.send(update)
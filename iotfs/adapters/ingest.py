@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+import errno
+import os
+import socket
+import struct
+
+import trio
+
+from iotfs.adapters.adapter import Adapter
+from iotfs.utils._fs_utils import Updates, remove_socket
+
+# Frames of the ingest protocol start with their length (without the length itself) and their type.
+# BATCH   producer -> filesystem: sequence, amount of messages, messages
+# ACK     filesystem -> producer: sequence, status (0 or an errno), amount of applied messages
+# A message is an operation (iotfs.utils._fs_utils.Updates), the lengths of its path and its payload, the path
+# relative to the root of the adapter and the payload. All integers are big endian.
+BATCH = 1
+ACK = 2
+
+# length, type
+_FRAME = struct.Struct("!IB")
+# sequence, amount of messages
+_BATCH = struct.Struct("!II")
+# operation, length of path, length of payload
+_MESSAGE = struct.Struct("!BHI")
+# sequence, status, amount of applied messages
+_ACK = struct.Struct("!IBI")
+
+_OPERATIONS = {operation.value: operation for operation in Updates}
+
+RECEIVE_SIZE = 65536
+# Larger frames close the connection.
+DEFAULT_MAX_FRAME = 64 * 1024 * 1024
+
+
+def encode_batch(sequence, updates):
+    """ Encodes a BATCH frame of (operation, path, payload) updates.
+
+    """
+    messages = []
+    for operation, path, payload in updates:
+        path = os.fsencode(path)
+        payload = os.fsencode(payload) if payload is not None else b""
+        messages.append(_MESSAGE.pack(operation.value, len(path), len(payload)) + path + payload)
+    body = _BATCH.pack(sequence, len(messages)) + b"".join(messages)
+    return _FRAME.pack(len(body) + 1, BATCH) + body
+
+
+def encode_ack(sequence, status, applied):
+    return _FRAME.pack(_ACK.size + 1, ACK) + _ACK.pack(sequence, status, applied)
+
+
+def decode_frame(buffer, offset=0):
+    """ Decodes the frame of buffer starting at offset.
+    Returns a tuple of frame type, body and the offset of the next frame or None, if the frame is incomplete.
+
+    """
+    if len(buffer) - offset < _FRAME.size:
+        return None
+    length, frame_type = _FRAME.unpack_from(buffer, offset)
+    end = offset + 4 + length
+    if end > len(buffer):
+        return None
+    return frame_type, bytes(buffer[offset + _FRAME.size:end]), end
+
+
+def decode_ack(body):
+    """ Decodes the body of an ACK frame into its sequence, status and amount of applied messages.
+
+    """
+    return _ACK.unpack_from(body)
+
+
+def decode_batch(body):
+    """ Decodes the body of a BATCH frame into its sequence and a list of (operation, path, payload) updates.
+
+    Raises
+    ------
+    ValueError
+        If the body is truncated or contains an unknown operation.
+    """
+    try:
+        sequence, count = _BATCH.unpack_from(body)
+        offset = _BATCH.size
+        updates = []
+        for _ in range(count):
+            operation, path_length, payload_length = _MESSAGE.unpack_from(body, offset)
+            offset += _MESSAGE.size
+            end = offset + path_length + payload_length
+            if end > len(body):
+                raise ValueError("Message exceeds its batch.")
+            path = os.fsdecode(body[offset:offset + path_length])
+            payload = body[offset + path_length:end]
+            offset = end
+            if operation not in _OPERATIONS:
+                raise ValueError("Unknown operation: {}".format(operation))
+            operation = _OPERATIONS[operation]
+            updates.append((operation, path, payload if operation in (Updates.WRITE, Updates.APPEND) else None))
+    except struct.error as e:
+        raise ValueError("Truncated batch: {}".format(e))
+    return sequence, updates
+
+
+class IngestAdapter(Adapter):
+
+    """
+    IngestAdapter accepts framed batches of (operation, path, payload) messages on a Unix domain socket, so producers
+    in any language write many values without a round trip through FUSE per file.
+    Every batch is applied with a single bulk update on the trio loop of the filesystem, while no handler changes any
+    inode, and acknowledged with the amount of applied messages afterwards. Readers see the usual files.
+    Unlike other adapters, batches are not collected across producers: a batch is the unit a producer is
+    acknowledged for. A batch is applied completely or not at all: malformed batches and batches with a path
+    containing ".." or below a reserved directory, e.g. .iotfs, are acknowledged with EINVAL, batches with a failing
+    message with its errno and no applied messages.
+
+    ...
+
+    Attributes
+    ----------
+    path : str
+        path of the Unix domain socket
+    root : str, optional
+        a path relative to the mountpoint, below which all updates are applied
+    max_frame : int, optional
+        maximum size of a frame in bytes, larger frames close the connection
+
+    """
+
+    def __init__(self, path, root="", max_frame=DEFAULT_MAX_FRAME, **kwargs):
+        """
+        Parameters
+        ----------
+        path : str
+            path of the Unix domain socket
+        root : str, optional
+            a path relative to the mountpoint, below which all updates are applied
+        max_frame : int, optional
+            maximum size of a frame in bytes, larger frames close the connection
+        """
+
+        super().__init__(root=root, **kwargs)
+        self.path = path
+        self.max_frame = max_frame
+        self.listeners = None
+
+    async def run(self, target):
+        """ Serves producers until cancelled.
+
+        Parameters
+        ----------
+        target : iotfs.filesystem.fs.FileSystem or iotfs.filesystem.data.data.Data
+            an object providing apply_updates
+        """
+
+        remove_socket(self.path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.path)
+        sock.listen(socket.SOMAXCONN)
+        self.listeners = [trio.SocketListener(trio.socket.from_stdlib_socket(sock))]
+        self.log.info("Listening on %s", self.path)
+
+        async def handler(stream):
+            async with stream:
+                await self.__handle_stream(stream, target)
+
+        try:
+            await trio.serve_listeners(handler, self.listeners)
+        finally:
+            try:
+                remove_socket(self.path)
+            except OSError as e:
+                self.log.warning("Socket %s not removed: %s", self.path, e)
+
+    async def __handle_stream(self, stream, target):
+        buffer = bytearray()
+        while True:
+            chunk = await stream.receive_some(RECEIVE_SIZE)
+            if not chunk:
+                return
+            buffer += chunk
+            offset = 0
+            while True:
+                if len(buffer) - offset >= _FRAME.size and _FRAME.unpack_from(buffer, offset)[0] > self.max_frame:
+                    self.log.warning("Frame exceeds %d bytes, closing connection.", self.max_frame)
+                    return
+                frame = decode_frame(buffer, offset)
+                if frame is None:
+                    break
+                frame_type, body, offset = frame
+                if frame_type == BATCH:
+                    await stream.send_all(await self.__apply_batch(target, body))
+            del buffer[:offset]
+
+    async def __apply_batch(self, target, body):
+        try:
+            sequence, updates = decode_batch(body)
+        except ValueError as e:
+            self.log.warning("Malformed batch: %s", e)
+            sequence = _BATCH.unpack_from(body)[0] if len(body) >= _BATCH.size else 0
+            return encode_ack(sequence, errno.EINVAL, 0)
+        try:
+            batch = [self.update(path, payload, operation=operation) for operation, path, payload in updates]
+        except ValueError as e:
+            self.log.warning("Rejected batch %d: %s", sequence, e)
+            return encode_ack(sequence, errno.EINVAL, 0)
+        self.received += len(batch)
+        try:
+            applied = await self.apply(target, batch, atomic=True)
+        except OSError as e:
+            self.log.warning("Rejected batch %d: %s", sequence, e)
+            return encode_ack(sequence, e.errno or errno.EIO, 0)
+        except Exception as e:
+            self.log.error("Applying batch of %d updates failed: %s", len(batch), e)
+            return encode_ack(sequence, errno.EIO, 0)
+        self.applied += applied
+        self.batches += 1
+        return encode_ack(sequence, 0, applied)
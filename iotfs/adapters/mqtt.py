@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+import struct
+
+import trio
+
+from iotfs.adapters.adapter import Adapter
+
+# MQTT 3.1.1 control packet types (http://docs.oasis-open.org/mqtt/mqtt/v3.1.1/os/mqtt-v3.1.1-os.html)
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+SUBACK = 9
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+RECEIVE_SIZE = 65536
+
+
+def encode_length(length):
+    """ Encodes the remaining length of a packet as variable byte integer.
+
+    """
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length > 0:
+            byte |= 0x80
+        encoded.append(byte)
+        if length == 0:
+            return bytes(encoded)
+
+
+def encode_string(string):
+    if isinstance(string, str):
+        string = string.encode("utf-8")
+    return struct.pack("!H", len(string)) + string
+
+
+def encode_packet(packet_type, body=b"", flags=0):
+    return bytes([(packet_type << 4) | flags]) + encode_length(len(body)) + body
+
+
+def decode_packet(buffer, offset=0):
+    """ Decodes the packet of buffer starting at offset.
+    Returns a tuple of packet type, flags, body and the offset of the next packet or None, if the packet is incomplete.
+
+    """
+    multiplier = 1
+    length = 0
+    idx = offset + 1
+    while True:
+        if idx >= len(buffer):
+            return None
+        byte = buffer[idx]
+        length += (byte & 0x7F) * multiplier
+        multiplier *= 128
+        idx += 1
+        if byte & 0x80 == 0:
+            break
+    end = idx + length
+    if end > len(buffer):
+        return None
+    return buffer[offset] >> 4, buffer[offset] & 0x0F, bytes(buffer[idx:end]), end
+
+
+def decode_publish(flags, body):
+    """ Decodes the body of a PUBLISH packet into its topic, payload and packet identifier.
+
+    """
+    (topic_length,) = struct.unpack_from("!H", body)
+    topic = body[2:2 + topic_length].decode("utf-8")
+    idx = 2 + topic_length
+    packet_id = None
+    if (flags >> 1) & 0x03 > 0:
+        (packet_id,) = struct.unpack_from("!H", body, idx)
+        idx += 2
+    return topic, body[idx:], packet_id
+
+
+class MQTTAdapter(Adapter):
+
+    """
+    MQTTAdapter subscribes to topics of a broker speaking MQTT 3.1.1.
+    Every published message writes its payload into the file of its topic, so levels of a topic become directories.
+
+    ...
+
+    Attributes
+    ----------
+    host : str
+        a host of the broker
+    port : int, optional
+        a port of the broker
+    topics : list, optional
+        topic filters to subscribe to
+    client_id : str, optional
+        a client identifier
+    keep_alive : int, optional
+        seconds between keep alive pings
+    root : str, optional
+        a path relative to the mountpoint, below which all updates are applied
+
+    """
+
+    def __init__(self, host, port=1883, topics=["#"], client_id="iotfs", keep_alive=60, root="", **kwargs):
+        """
+        Parameters
+        ----------
+        host : str
+            a host of the broker
+        port : int, optional
+            a port of the broker
+        topics : list, optional
+            topic filters to subscribe to
+        client_id : str, optional
+            a client identifier
+        keep_alive : int, optional
+            seconds between keep alive pings
+        root : str, optional
+            a path relative to the mountpoint, below which all updates are applied
+        """
+
+        super().__init__(root=root, **kwargs)
+        self.host = host
+        self.port = port
+        self.topics = topics
+        self.client_id = client_id
+        self.keep_alive = keep_alive
+        self.send_lock = trio.Lock()
+
+    async def produce(self, channel):
+        stream = await trio.open_tcp_stream(self.host, self.port)
+        async with stream:
+            await self.__connect(stream)
+            async with trio.open_nursery() as nursery:
+                nursery.start_soon(self.__ping, stream)
+                await self.__receive(stream, channel)
+                nursery.cancel_scope.cancel()
+
+    async def __connect(self, stream):
+        # Protocol name, level 4 (3.1.1), clean session flag and keep alive.
+        body = encode_string("MQTT") + bytes([4, 0x02]) + struct.pack("!H", self.keep_alive) +\
+            encode_string(self.client_id)
+        await self.__send(stream, encode_packet(CONNECT, body))
+        subscription = struct.pack("!H", 1)
+        for topic in self.topics:
+            # Messages are received with QoS 0.
+            subscription += encode_string(topic) + bytes([0])
+        await self.__send(stream, encode_packet(SUBSCRIBE, subscription, flags=0x02))
+        self.log.info("Connected to %s:%d with topics %s", self.host, self.port, self.topics)
+
+    async def __ping(self, stream):
+        while True:
+            await trio.sleep(self.keep_alive / 2)
+            await self.__send(stream, encode_packet(PINGREQ))
+
+    async def __send(self, stream, packet):
+        # Pings and acknowledgements are sent by different tasks.
+        async with self.send_lock:
+            await stream.send_all(packet)
+
+    async def __receive(self, stream, channel):
+        buffer = bytearray()
+        while True:
+            chunk = await stream.receive_some(RECEIVE_SIZE)
+            if not chunk:
+                self.log.warning("Broker closed connection.")
+                return
+            buffer += chunk
+            offset = 0
+            while True:
+                packet = decode_packet(buffer, offset)
+                if packet is None:
+                    break
+                packet_type, flags, body, offset = packet
+                if packet_type == CONNACK and body[1] != 0:
+                    raise ConnectionError("Broker refused connection with code {}.".format(body[1]))
+                if packet_type == PUBLISH:
+                    topic, payload, packet_id = decode_publish(flags, body)
+                    if packet_id is not None:
+                        await self.__send(stream, encode_packet(PUBACK, struct.pack("!H", packet_id)))
+                    try:
+                        update = self.update(topic, payload)
+                    except ValueError as e:
+                        self.log.warning("Dropped message of topic %s: %s", topic, e)
+                        continue
+                    await channel.send(update)
+            del buffer[:offset]
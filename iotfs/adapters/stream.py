@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import trio
+
+from iotfs.adapters.adapter import Adapter, parse_line
+
+# Maximum size of a received datagram or chunk of a stream.
+RECEIVE_SIZE = 65536
+
+
+class StreamAdapter(Adapter):
+
+    """
+    StreamAdapter listens on a TCP or UDP port for line-delimited updates.
+    Every line has the form "path payload" and writes payload into the file at path.
+    A TCP connection or a UDP datagram may contain any amount of lines.
+
+    ...
+
+    Attributes
+    ----------
+    port : int
+        a port to listen on
+    host : str, optional
+        a host address to bind to
+    protocol : str, optional
+        either "tcp" or "udp"
+    root : str, optional
+        a path relative to the mountpoint, below which all updates are applied
+
+    """
+
+    def __init__(self, port, host="127.0.0.1", protocol="tcp", root="", **kwargs):
+        """
+        Parameters
+        ----------
+        port : int
+            a port to listen on
+        host : str, optional
+            a host address to bind to
+        protocol : str, optional
+            either "tcp" or "udp"
+        root : str, optional
+            a path relative to the mountpoint, below which all updates are applied
+        """
+
+        super().__init__(root=root, **kwargs)
+        if protocol not in ("tcp", "udp"):
+            raise ValueError("Protocol is neither tcp nor udp: {}".format(protocol))
+        self.port = port
+        self.host = host
+        self.protocol = protocol
+        self.listeners = None
+
+    async def produce(self, channel):
+        if self.protocol == "tcp":
+            self.listeners = await trio.open_tcp_listeners(self.port, host=self.host)
+            self.log.info("Listening on tcp %s:%d", self.host, self.port)
+
+            async def handler(stream):
+                async with stream:
+                    await self.__handle_stream(stream, channel.clone())
+
+            await trio.serve_listeners(handler, self.listeners)
+        else:
+            await self.__receive_datagrams(channel)
+
+    async def __handle_stream(self, stream, channel):
+        async with channel:
+            rest = b""
+            while True:
+                chunk = await stream.receive_some(RECEIVE_SIZE)
+                if not chunk:
+                    break
+                lines = (rest + chunk).split(b"\n")
+                rest = lines.pop()
+                await self.__send_lines(lines, channel)
+            await self.__send_lines([rest], channel)
+
+    async def __receive_datagrams(self, channel):
+        sock = trio.socket.socket(trio.socket.AF_INET, trio.socket.SOCK_DGRAM)
+        with sock:
+            await sock.bind((self.host, self.port))
+            self.log.info("Listening on udp %s:%d", self.host, self.port)
+            while True:
+                datagram, _ = await sock.recvfrom(RECEIVE_SIZE)
+                await self.__send_lines(datagram.split(b"\n"), channel)
+
+    async def __send_lines(self, lines, channel):
+        for line in lines:
+            if line.strip() == b"":
+                continue
+            try:
+                update = self.update(*parse_line(line))
+            except ValueError as e:
+                self.log.warning(e)
+                continue
+            await channel.send(update)
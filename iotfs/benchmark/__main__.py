@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+from argparse import ArgumentParser
+import sys
+
+from iotfs.benchmark import report, suite
+
+
+def parse_args():
+    '''Parse command line'''
+
+    parser = ArgumentParser(description="Benchmarks the handlers of the filesystems without mounting them.")
+
+    parser.add_argument('--fs', type=str, nargs='+', default=["standard", "producer"],
+                        choices=sorted(suite.FILESYSTEMS), help='Filesystems to benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='Amounts of inodes of the trees')
+    parser.add_argument('--fanouts', type=int, nargs='+', default=[10, 1000],
+                        help='Amounts of files per directory')
+    parser.add_argument('--count', type=int, default=1000,
+                        help='Calls per operation')
+    parser.add_argument('--logging', action='store_true', default=False,
+                        help='Keep logging of the handlers enabled')
+    parser.add_argument('--save', type=str, default=None,
+                        help='Save the results as JSON baseline')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='Compare the results with a JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Relative change of throughput or p99 latency, which counts as regression')
+    return parser.parse_args()
+
+
+def main():
+    options = parse_args()
+
+    results = suite.run(filesystems=options.fs, sizes=options.sizes, fanouts=options.fanouts,
+                        count=options.count, with_logging=options.logging)
+    print(report.format_results(results))
+    if options.save is not None:
+        report.save(results, options.save)
+    if options.baseline is not None:
+        regressions = report.compare(results, report.load(options.baseline), threshold=options.threshold)
+        for scenario, operation, metric, old, new in regressions:
+            print("REGRESSION {} {} {}: {:.1f} -> {:.1f}".format(scenario, operation, metric, old, new))
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
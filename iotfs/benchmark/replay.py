@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+from argparse import ArgumentParser
+import logging
+import sys
+import time
+
+from pyfuse3 import FUSEError
+import trio
+
+from iotfs.benchmark import report
+from iotfs.benchmark.suite import FILESYSTEMS, create_filesystem, fake_readdir_token
+from iotfs.filesystem._trace import Payload, read_trace, result_inode, result_handle
+
+from iotfs.utils._fs_utils import Updates, ROOT_INODE
+
+# Indices of the arguments of an operation, which are inodes. Inodes of a trace are mapped to the ones
+# of the replaying filesystem, as both may number new inodes differently.
+INODE_ARGUMENTS = {"rename": (0, 2), "link": (0, 1), "readdir": (0, 1), "setattr": (0, 3), "statfs": (),
+                   "forget": (), "apply_updates": ()}
+
+# Operations, whose first argument is a file handle. Handles are mapped like inodes.
+HANDLE_OPERATIONS = ("read", "write", "flush", "fsync", "release")
+
+# Amount of arguments of the handlers returning a file handle. Traces record the handle as additional argument.
+OPENING_ARGUMENTS = {"open": 3, "create": 5}
+
+
+def _prepare(operation, args, inodes, handles):
+    args = [b"\0" * arg.length if isinstance(arg, Payload) else arg for arg in args]
+    if operation in HANDLE_OPERATIONS:
+        args[0] = handles.get(args[0], args[0])
+        return args
+    for idx in INODE_ARGUMENTS.get(operation, (0,)):
+        if args[idx] is not None:
+            args[idx] = inodes.get(args[idx], args[idx])
+    if operation == "forget":
+        args[0] = [(inodes.get(inode, inode), nlookup) for inode, nlookup in args[0]]
+    elif operation == "readdir":
+        args[2] = []
+    elif operation == "apply_updates":
+        args[0] = [(Updates(update), path, b"\0" * data.length) for update, path, data in args[0]]
+    return args
+
+
+async def replay(fs, records, recorded_speed=False):
+    """ Calls the handlers of fs with the operations of a trace in the order they started.
+
+    Parameters
+    ----------
+    fs : iotfs.filesystem.fs.FileSystem
+        a fresh filesystem
+    records : list
+        records returned by iotfs.filesystem._trace.read_trace
+    recorded_speed : bool, optional
+        whether operations start at their recorded time. Otherwise they are replayed as fast as possible.
+
+    Returns
+    -------
+    tuple
+        latencies in seconds by operation and amount of operations, whose outcome differs from the trace
+    """
+    latencies = dict()
+    mismatches = 0
+    inodes = {ROOT_INODE: ROOT_INODE}
+    handles = dict()
+    started = time.perf_counter()
+    with fake_readdir_token():
+        for operation, start, _, error, inode, args in sorted(records, key=lambda record: record[1]):
+            if recorded_speed:
+                await trio.sleep(max(start - (time.perf_counter() - started), 0))
+            handle = None
+            if operation in OPENING_ARGUMENTS:
+                # Traces recorded before handles were allocated by the filesystem use the inode as handle.
+                handle = args[-1] if len(args) > OPENING_ARGUMENTS[operation] else inode or args[0]
+                args = args[:OPENING_ARGUMENTS[operation]]
+            args = _prepare(operation, args, inodes, handles)
+            result = None
+            replayed_error = 0
+            before = time.perf_counter()
+            try:
+                if operation == "apply_updates":
+                    fs.apply_updates(*args)
+                else:
+                    result = await getattr(fs, operation)(*args)
+            except FUSEError as e:
+                replayed_error = e.errno
+            except OSError as e:
+                # Rejected atomic batches
+                replayed_error = e.errno
+            except Exception:
+                replayed_error = -1
+            latencies.setdefault(operation, []).append(time.perf_counter() - before)
+            if (replayed_error != 0) != (error != 0):
+                mismatches += 1
+            if inode != 0 and result_inode(result) != 0:
+                inodes[inode] = result_inode(result)
+            if handle is not None and result_handle(result) is not None:
+                handles[handle] = result_handle(result)
+    return latencies, mismatches
+
+
+def parse_args():
+    '''Parse command line'''
+
+    parser = ArgumentParser(description="Replays a trace of operations against a fresh filesystem.")
+
+    parser.add_argument('trace', type=str, help='A trace file recorded by FileSystem.start_trace')
+    parser.add_argument('--fs', type=str, default="standard", choices=sorted(FILESYSTEMS),
+                        help='Filesystem to replay the trace with')
+    parser.add_argument('--recorded-speed', action='store_true', default=False,
+                        help='Start operations at their recorded time instead of as fast as possible')
+    parser.add_argument('--save', type=str, default=None,
+                        help='Save the results as JSON baseline')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='Compare the results with a JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Relative change of throughput or p99 latency, which counts as regression')
+    return parser.parse_args()
+
+
+def main():
+    options = parse_args()
+
+    mount_point, records = read_trace(options.trace)
+    recorded = dict()
+    for operation, _, duration, _, _, _ in records:
+        recorded.setdefault(operation, []).append(duration)
+    logging.disable(logging.CRITICAL)
+    latencies, mismatches = trio.run(replay, create_filesystem(options.fs, mount_point), records,
+                                  options.recorded_speed)
+    logging.disable(logging.NOTSET)
+
+    results = {
+        "recorded": dict((operation, report.summarize(values)) for operation, values in recorded.items()),
+        "replay/" + options.fs: dict((operation, report.summarize(values)) for operation, values in latencies.items())
+    }
+    print(report.format_results(results))
+    print("{} of {} operations ended differently than recorded.".format(mismatches, len(records)))
+    if options.save is not None:
+        report.save(results, options.save)
+    if options.baseline is not None:
+        regressions = report.compare(results, report.load(options.baseline), threshold=options.threshold)
+        for scenario, operation, metric, old, new in regressions:
+            print("REGRESSION {} {} {}: {:.1f} -> {:.1f}".format(scenario, operation, metric, old, new))
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
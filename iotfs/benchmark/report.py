@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(latencies, percent):
+    """ Returns the nearest-rank percentile of sorted latencies.
+
+    """
+    if len(latencies) == 0:
+        return 0.0
+    rank = max(int(round(percent / 100.0 * len(latencies))) - 1, 0)
+    return latencies[min(rank, len(latencies) - 1)]
+
+
+def summarize(latencies):
+    """ Summarizes the latencies in seconds of single operations.
+
+    Returns
+    -------
+    dict
+        count, ops_per_sec and p50, p90, p99 and max in microseconds
+    """
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    summary = {
+        "count": len(latencies),
+        "ops_per_sec": len(latencies) / total if total > 0 else 0.0,
+        "max": latencies[-1] * 1e6 if latencies else 0.0,
+    }
+    for percent in PERCENTILES:
+        summary["p{}".format(percent)] = percentile(latencies, percent) * 1e6
+    return summary
+
+
+def save(results, path):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results, baseline, threshold=0.2):
+    """ Compares results with a baseline of a previous run.
+    An operation regressed, if its throughput dropped or its p99 latency rose by more than threshold.
+    Scenarios and operations missing in either run are ignored.
+
+    Returns
+    -------
+    list
+        tuples of scenario, operation, metric, baseline value and current value
+    """
+    regressions = []
+    for scenario, operations in sorted(results.items()):
+        for operation, summary in sorted(operations.items()):
+            old = baseline.get(scenario, {}).get(operation)
+            if old is None:
+                continue
+            if summary["ops_per_sec"] < old["ops_per_sec"] * (1 - threshold):
+                regressions.append((scenario, operation, "ops_per_sec", old["ops_per_sec"], summary["ops_per_sec"]))
+            if summary["p99"] > old["p99"] * (1 + threshold):
+                regressions.append((scenario, operation, "p99", old["p99"], summary["p99"]))
+    return regressions
+
+
+def format_results(results):
+    lines = ["{:<48} {:<10} {:>12} {:>10} {:>10} {:>10}".format(
+        "scenario", "operation", "ops/sec", "p50 us", "p90 us", "p99 us")]
+    for scenario, operations in sorted(results.items()):
+        for operation, summary in sorted(operations.items()):
+            lines.append("{:<48} {:<10} {:>12.0f} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+                scenario, operation, summary["ops_per_sec"], summary["p50"], summary["p90"], summary["p99"]))
+    return "\n".join(lines)
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+import contextlib
+import logging
+import os
+import random
+import stat
+import time
+
+import pyfuse3
+import trio
+
+from iotfs.benchmark.report import summarize
+from iotfs.filesystem.standard_fs import StandardFileSystem
+from iotfs.filesystem.producer_fs import ProducerFileSystem
+
+from iotfs.utils._fs_utils import Types, ROOT_INODE
+
+FILESYSTEMS = {"standard": StandardFileSystem, "producer": ProducerFileSystem}
+OPERATIONS = ("lookup", "getattr", "readdir", "create", "write", "read", "rename", "unlink", "forget")
+
+FILE_MODE = stat.S_IFREG | 0o644
+PAYLOAD = b"x" * 4096
+
+
+class _CountingQueue():
+
+    """
+    _CountingQueue takes the events of a ProducerFileSystem without any listener consuming them.
+
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def put(self, item):
+        self.count += 1
+
+
+def _readdir_reply(token, name, attr, next_id):
+    token.append((name, attr, next_id))
+    return True
+
+
+@contextlib.contextmanager
+def fake_readdir_token():
+    """ Replaces pyfuse3.readdir_reply, so readdir can be called with a list as token.
+
+    """
+    readdir_reply = pyfuse3.readdir_reply
+    pyfuse3.readdir_reply = _readdir_reply
+    try:
+        yield
+    finally:
+        pyfuse3.readdir_reply = readdir_reply
+
+
+def create_filesystem(name, mount_point="benchmark"):
+    """ Creates a filesystem of FILESYSTEMS. It is never mounted.
+
+    """
+    fs_class = FILESYSTEMS[name]
+    if issubclass(fs_class, ProducerFileSystem):
+        return fs_class(mount_point, queue=_CountingQueue())
+    return fs_class(mount_point)
+
+
+def build_tree(fs, size, fanout):
+    """ Adds directories below the root with fanout files each, until the tree has size inodes.
+
+    Returns
+    -------
+    tuple
+        inodes of the directories and (parent inode, name, inode) of the files
+    """
+    directories = []
+    files = []
+    count = len(fs.data.nodes)
+    while count < size:
+        directory = fs.data.add_entry("d{}".format(len(directories)), ROOT_INODE, node_type=Types.DIR)
+        directories.append(directory.inode)
+        count += 1
+        for idx in range(min(fanout, size - count)):
+            entry = fs.data.add_entry("f{}".format(idx), directory.inode, data="0")
+            files.append((directory.inode, entry.name, entry.inode))
+            count += 1
+    return directories, files
+
+
+async def _timed(latencies, operation):
+    start = time.perf_counter()
+    result = await operation
+    latencies.append(time.perf_counter() - start)
+    return result
+
+
+async def run_operations(fs, directories, files, count, seed=0):
+    """ Calls every handler of OPERATIONS count times and measures the latency of each call.
+
+    Returns
+    -------
+    dict
+        summaries of the latencies by operation
+    """
+    rand = random.Random(seed)
+    ctx = pyfuse3.RequestContext()
+    latencies = dict((operation, []) for operation in OPERATIONS)
+
+    for parent_inode, name, _ in (rand.choice(files) for _ in range(count)):
+        await _timed(latencies["lookup"], fs.lookup(parent_inode, name, ctx))
+    for _, _, inode in (rand.choice(files) for _ in range(count)):
+        await _timed(latencies["getattr"], fs.getattr(inode, ctx))
+    with fake_readdir_token():
+        for inode in (rand.choice(directories) for _ in range(count)):
+            await _timed(latencies["readdir"], fs.readdir(inode, 0, []))
+
+    # Files are created, changed and removed in an own directory, so the tree keeps its size.
+    scratch = fs.data.add_entry("scratch", ROOT_INODE, node_type=Types.DIR).inode
+    created = []
+    for idx in range(count):
+        fh, attr = await _timed(latencies["create"], fs.create(
+            scratch, "c{}".format(idx).encode(), FILE_MODE, os.O_RDWR, ctx))
+        created.append((fh, attr.st_ino))
+    for fh, _ in created:
+        await _timed(latencies["write"], fs.write(fh, 0, PAYLOAD))
+    for fh, _ in created:
+        await _timed(latencies["read"], fs.read(fh, 0, len(PAYLOAD)))
+    for idx, (fh, _) in enumerate(created):
+        await fs.release(fh)
+        await _timed(latencies["rename"], fs.rename(
+            scratch, "c{}".format(idx).encode(), scratch, "r{}".format(idx).encode(), 0, ctx))
+    for idx in range(count):
+        await _timed(latencies["unlink"], fs.unlink(scratch, "r{}".format(idx).encode(), ctx))
+    for _, inode in created:
+        await _timed(latencies["forget"], fs.forget([(inode, 1)]))
+    await fs.rmdir(ROOT_INODE, b"scratch", ctx)
+
+    return dict((operation, summarize(values)) for operation, values in latencies.items())
+
+
+def run(filesystems=("standard", "producer"), sizes=(1000, 10000, 100000), fanouts=(10, 1000), count=1000,
+        with_logging=False):
+    """ Runs every combination of filesystem, tree size and directory fan-out.
+
+    Parameters
+    ----------
+    filesystems : tuple, optional
+        names of FILESYSTEMS
+    sizes : tuple, optional
+        amounts of inodes of the trees
+    fanouts : tuple, optional
+        amounts of files per directory
+    count : int, optional
+        calls per operation
+    with_logging : bool, optional
+        whether handlers log as in a deployment. Otherwise logging is disabled to measure the handlers only.
+
+    Returns
+    -------
+    dict
+        summaries of the operations by scenario, as "filesystem/size=.../fanout=..."
+    """
+    if not with_logging:
+        logging.disable(logging.CRITICAL)
+    results = dict()
+    try:
+        for name in filesystems:
+            for size in sizes:
+                for fanout in fanouts:
+                    fs = create_filesystem(name)
+                    directories, files = build_tree(fs, size, fanout)
+                    scenario = "{}/size={}/fanout={}".format(name, size, fanout)
+                    results[scenario] = trio.run(run_operations, fs, directories, files, count)
+    finally:
+        logging.disable(logging.NOTSET)
+    return results
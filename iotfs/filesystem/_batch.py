@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+
+from iotfs.utils._fs_utils import Updates, normalize_update_path
+
+# Names of the operations of records, unlink and rmdir both remove a path.
+OPERATIONS = {
+    "write": Updates.WRITE,
+    "append": Updates.APPEND,
+    "mkdir": Updates.MKDIR,
+    "remove": Updates.REMOVE,
+    "unlink": Updates.REMOVE,
+    "rmdir": Updates.REMOVE
+}
+
+
+def parse_batch(buf):
+    """ Parses the records of a batch into (operation, path, payload) updates.
+    A batch is either a JSON object or list of objects with the keys op, path and data, or a record per line:
+    "write path payload", "append path payload", "mkdir path" or "remove path". The payload is the rest of the line.
+    Paths are normalized, paths with ".." parts or below the directories of the filesystem, e.g. .iotfs, are
+    rejected. The whole batch is parsed, before anything is applied.
+
+    Raises
+    ------
+    ValueError
+        If a record is malformed or its path is invalid, so none of the batch is applied.
+    """
+
+    text = buf.decode("utf-8") if isinstance(buf, (bytes, bytearray)) else buf
+    if text.lstrip().startswith(("[", "{")):
+        return _parse_json(text)
+    updates = []
+    for number, line in enumerate(text.split("\n"), 1):
+        if line.strip() == "":
+            continue
+        parts = line.strip().split(None, 2)
+        if len(parts) < 2:
+            raise ValueError("Record {} contains no path: {}".format(number, line))
+        updates.append(_update(parts[0], parts[1], parts[2] if len(parts) > 2 else "", number))
+    return updates
+
+
+def _parse_json(text):
+    try:
+        records = json.loads(text)
+    except ValueError as e:
+        raise ValueError("Invalid JSON batch: {}".format(e))
+    if isinstance(records, dict):
+        records = [records]
+    if not isinstance(records, list):
+        raise ValueError("A JSON batch is an object or a list of objects.")
+    updates = []
+    for number, record in enumerate(records, 1):
+        if not isinstance(record, dict) or not isinstance(record.get("path"), str):
+            raise ValueError("Record {} contains no path: {}".format(number, record))
+        data = record.get("data", "")
+        if not isinstance(data, str):
+            # Numbers and other values are written as JSON.
+            data = json.dumps(data)
+        updates.append(_update(record.get("op", "write"), record["path"], data, number))
+    return updates
+
+
+def _update(name, path, payload, number):
+    operation = OPERATIONS.get(str(name).lower())
+    if operation is None:
+        raise ValueError("Record {} has an unknown operation: {}".format(number, name))
+    try:
+        path = normalize_update_path(path)
+    except ValueError as e:
+        raise ValueError("Record {} has an invalid path: {}".format(number, e))
+    if operation in (Updates.WRITE, Updates.APPEND):
+        return (operation, path, os.fsencode(payload))
+    return (operation, path, None)
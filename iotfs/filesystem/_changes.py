@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import os
+
+import trio
+
+DEFAULT_CAPACITY = 10000
+DEFAULT_WAIT = 5.0
+
+
+class ChangeLog():
+
+    """
+    ChangeLog keeps the latest changes of a filesystem as a stream of lines "seq<TAB>op<TAB>path<TAB>size".
+    The stream is read like a growing file: a read at its end waits for new changes. Only the latest capacity
+    changes are kept, reads of dropped parts return a line of "#" of the same length, so offsets stay valid.
+    A read waits at most wait seconds and returns nothing then, readers like tail -f just read again.
+
+    ...
+
+    Attributes
+    ----------
+    capacity : int, optional
+        amount of kept changes
+    wait : float, optional
+        seconds a read at the end of the stream waits for changes
+
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, wait=DEFAULT_WAIT):
+        """
+        Parameters
+        ----------
+        capacity : int, optional
+            amount of kept changes
+        wait : float, optional
+            seconds a read at the end of the stream waits for changes
+        """
+
+        if capacity < 1:
+            raise ValueError("Invalid capacity: {}".format(capacity))
+        self.capacity = capacity
+        self.wait = wait
+        self.seq = 0
+        # Encoded lines and their offsets in the stream, dropped lines are before head.
+        self.lines = []
+        self.offsets = []
+        self.head = 0
+        self.end = 0
+        # Set on the next change, created by a waiting read.
+        self.changed = None
+
+    @property
+    def start(self):
+        """ Offset of the first kept line.
+
+        """
+        return self.offsets[self.head] if self.head < len(self.offsets) else self.end
+
+    def append(self, op, path, size=0):
+        """ Appends a change of path and wakes up waiting reads.
+
+        """
+        self.seq += 1
+        line = "{}\t{}\t{}\t{}\n".format(self.seq, op, path, size if size is not None else 0)
+        line = os.fsencode(line)
+        self.lines.append(line)
+        self.offsets.append(self.end)
+        self.end += len(line)
+        if len(self.lines) - self.head > self.capacity:
+            self.head += 1
+            # Dropped lines are removed in bulk, so appending stays O(1) amortized.
+            if self.head >= self.capacity:
+                del self.lines[:self.head]
+                del self.offsets[:self.head]
+                self.head = 0
+        if self.changed is not None:
+            self.changed.set()
+            self.changed = None
+
+    def snapshot(self):
+        """ Returns the kept lines.
+
+        """
+        return b"".join(self.lines[self.head:])
+
+    async def read(self, off, size):
+        """ Returns up to size bytes of the stream from off. Waits for changes at the end of the stream.
+
+        """
+        if off >= self.end:
+            with trio.move_on_after(self.wait):
+                while off >= self.end:
+                    if self.changed is None:
+                        self.changed = trio.Event()
+                    await self.changed.wait()
+            if off >= self.end:
+                return b""
+        start = self.start
+        if off < start:
+            length = min(size, start - off)
+            if off + length == start:
+                return b"#" * (length - 1) + b"\n"
+            return b"#" * length
+        idx = bisect.bisect_right(self.offsets, off, self.head) - 1
+        skip = off - self.offsets[idx]
+        chunks = []
+        length = 0
+        while idx < len(self.lines) and length < skip + size:
+            chunks.append(self.lines[idx])
+            length += len(self.lines[idx])
+            idx += 1
+        return b"".join(chunks)[skip:skip + size]
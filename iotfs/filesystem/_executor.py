@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+import concurrent.futures
+
+import trio
+
+from iotfs.utils import _logging
+
+DEFAULT_MAX_IN_FLIGHT = 4
+
+
+def _wait(future):
+    return future.result()
+
+
+class Executor():
+
+    """
+    Executor runs blocking, CPU- or disk-bound functions outside of the trio loop serving the kernel requests.
+    Functions run in worker threads or, when processes is set, in worker processes. Results and exceptions
+    are returned to the awaiting task. At most max_in_flight functions run at the same time,
+    further calls wait for a free slot.
+
+    ...
+
+    Attributes
+    ----------
+    max_in_flight : int, optional
+        maximum amount of functions running at the same time
+    processes : bool, optional
+        whether functions run in worker processes instead of threads. Functions and arguments need to be picklable.
+    logger : logging.logger, optional
+        an already initialized logger instance
+
+    """
+
+    def __init__(self, max_in_flight=DEFAULT_MAX_IN_FLIGHT, processes=False, logger=None):
+        """
+        Parameters
+        ----------
+        max_in_flight : int, optional
+            maximum amount of functions running at the same time
+        processes : bool, optional
+            whether functions run in worker processes instead of threads. Functions and arguments need to be picklable.
+        logger : logging.logger, optional
+            an already initialized logger instance
+        """
+
+        if max_in_flight < 1:
+            raise ValueError("Invalid maximum of functions in flight: {}".format(max_in_flight))
+        if logger is not None:
+            self.log = logger
+        else:
+            self.log = _logging.create_logger(self.__class__.__name__)
+        self.max_in_flight = max_in_flight
+        self.limiter = trio.CapacityLimiter(max_in_flight)
+        self.pool = None
+        if processes:
+            self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=max_in_flight)
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def in_flight(self):
+        return self.limiter.borrowed_tokens
+
+    async def run(self, func, *args):
+        """ Runs func with args in a worker and returns its result.
+        A cancelled task stops waiting only after the worker finished, so shared state is never changed
+        behind the back of the loop.
+
+        """
+        self.submitted += 1
+        try:
+            if self.pool is None:
+                result = await trio.to_thread.run_sync(func, *args, limiter=self.limiter)
+            else:
+                async with self.limiter:
+                    future = self.pool.submit(func, *args)
+                    # The thread only waits for the process, so it isn't counted twice.
+                    result = await trio.to_thread.run_sync(_wait, future)
+        except BaseException:
+            self.failed += 1
+            raise
+        self.completed += 1
+        return result
+
+    def shutdown(self):
+        """ Stops the worker processes after running functions are done.
+
+        """
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
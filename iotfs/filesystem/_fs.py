@@ -2,6 +2,7 @@
 
 import pyfuse3
 import errno
+import inspect
 import stat
 import time
 import os
@@ -16,15 +17,27 @@ else:
     faulthandler.enable()
 
 from iotfs.filesystem.data.entry import SymbolicEntry
+from iotfs.filesystem.data.node import VirtualFile, StreamFile
 from iotfs.filesystem.data.data import Data
-
-from iotfs.utils._fs_utils import Types, Encodings, LinkTypes, ROOT_INODE
+from iotfs.filesystem._changes import ChangeLog
+from iotfs.filesystem._executor import Executor
+from iotfs.filesystem._handles import HandleTable
+from iotfs.filesystem._invalidator import Invalidator
+from iotfs.filesystem._trace import result_inode, result_handle, UNKNOWN_ERROR
+from iotfs.filesystem._profiler import Profiler
+from iotfs.filesystem._watchdog import Watchdog
+
+from iotfs.filesystem.data.xattr_index import link_name
+from iotfs.utils._fs_utils import Types, Encodings, LinkTypes, ROOT_INODE, SERIES_SUFFIX, PROFILE_XATTR, QUERY_MODE,\
+    CachePolicies
 from iotfs.utils import _logging
+from iotfs.utils._metrics import Metrics
 
 
 def wrapper(*params):
     """ wrapper is a decorator wrapper.
-    It logs a unique count and the operation name.
+    It logs a unique count and the operation name, counts operations and errors and records them into a trace.
+    Successful changes of the tree are appended to the change log.
 
     """
     def decorator(func):
@@ -39,7 +52,30 @@ def wrapper(*params):
             fs.log.debug("---")
             fs.log.debug(func.__name__ + ":" + s)
             fs.log.debug("---")
-            result = await func(*args, **kwargs)
+            fs.metrics.increment("operations")
+            fs.metrics.increment("operations." + func.__name__)
+            trace = fs.trace
+            if trace is not None:
+                start = trace.now()
+            result = None
+            error = 0
+            profiled = fs.profiler.enter(func.__name__)
+            try:
+                result = await func(*args, **kwargs)
+            except FUSEError as e:
+                fs.metrics.increment("errors")
+                error = e.errno
+                raise
+            except Exception:
+                error = UNKNOWN_ERROR
+                raise
+            finally:
+                fs.profiler.exit(profiled)
+                if trace is not None:
+                    trace.record(func.__name__, args[1:], start, trace.now() - start, error, result_inode(result),
+                                 result_handle(result))
+            if func.__name__ in CHANGES:
+                _record_change(fs, func.__name__, args[1:], result)
             fs.log.info("unique: %d, success", fs.unique)
             fs.unique += 2
             return result
@@ -47,6 +83,45 @@ def wrapper(*params):
     return decorator
 
 
+# Handlers changing the tree -> indices of the parent inode and the name of the changed entry in their arguments.
+# Written files are recorded on release only, not on every write.
+CHANGES = {"create": (0, 1), "mknod": (0, 1), "mkdir": (0, 1), "symlink": (0, 1), "link": (1, 2), "unlink": (0, 1),
+           "rmdir": (0, 1), "rename": (2, 3), "setattr": None, "write": None, "release": None}
+
+
+def _record_change(fs, operation, args, result):
+    try:
+        if operation == "write":
+            handle = fs.handles.get(args[0])
+            if handle is not None:
+                fs.written[handle.fh] = handle.inode
+            return
+        if operation in ("release", "setattr"):
+            if operation == "release":
+                inode = fs.written.pop(args[0], None)
+                if inode is None:
+                    return
+            else:
+                inode = args[0]
+                if not args[1].update_size:
+                    return
+                for fh in [fh for fh, written in fs.written.items() if written == inode]:
+                    del fs.written[fh]
+            operation = "write" if operation == "release" else "truncate"
+            fs.changes.append(operation, fs.data.get_relative_path(inode), fs.data.nodes[inode].size)
+            return
+        parent_idx, name_idx = CHANGES[operation]
+        path = os.path.normpath(os.path.join(fs.data.get_relative_path(args[parent_idx]),
+                                             os.fsdecode(args[name_idx])))
+        entry = fs.data.get_entry_by_parent_name(args[parent_idx], args[name_idx])
+        size = 0
+        if entry is not None and operation not in ("unlink", "rmdir"):
+            size = fs.data.nodes[entry.inode].size
+        fs.changes.append(operation, path, size)
+    except Exception as e:
+        fs.log.warning("Change of %s not recorded: %s", operation, e)
+
+
 class _FileSystem(pyfuse3.Operations):
 
     """
@@ -88,9 +163,37 @@ class _FileSystem(pyfuse3.Operations):
 
         self.data = Data(logger=self.log)
         self.data.add_root_entry(mount_point)
+        # Runs blocking work outside of the loop handling the requests.
+        self.executor = Executor(logger=self.log)
+        self.metrics = Metrics()
+        # iotfs.filesystem._trace.TraceWriter, while operations are traced
+        self.trace = None
+        # Every handler is wrapped by the code of wrapper, which marks handlers in sampled stacks.
+        self.profiler = Profiler(_FileSystem.getattr.__code__, self.log)
+        self.watchdog = Watchdog(_FileSystem.getattr.__code__, self.metrics, self.log)
+        # Changes of adapters reach readers despite the caches of the kernel.
+        self.invalidator = Invalidator(self.executor, self.metrics, self.log)
+        self.data.invalidator = self.invalidator
+        self.data.bodies.metrics = self.metrics
+        self.data.bodies.executor = self.executor
+        self.data.compression.executor = self.executor
+        self.data.compression.metrics = self.metrics
+        self.data.store.metrics = self.metrics
+        self.data.links.metrics = self.metrics
+        self.data.page_cache.metrics = self.metrics
+        # Changes of the tree, read as stream from a control file.
+        self.changes = ChangeLog()
+        # Handles of open files, sequential reads are read ahead.
+        self.handles = HandleTable(self.data, self.executor, self.metrics, self.log)
+        # handles written since they were opened -> their inodes
+        self.written = dict()
 
     def __getattr(self, inode):
         self.log.debug("get attributes of %i", inode)
+        if self.data.xattrs.is_view(inode):
+            return self.__view_getattr(inode)
+        if self.data.snapshots.is_view(inode):
+            return self.__snapshot_getattr(inode)
         if inode not in self.data.nodes:
             self.log.error("Inode not in nodes!")
             raise FUSEError(errno.ENOENT)
@@ -115,9 +218,107 @@ class _FileSystem(pyfuse3.Operations):
         attr.st_gid = node.gid
         attr.st_uid = node.uid
         attr.st_ino = inode
+        if node.type == Types.FILE and self.data.page_cache.policy_of(inode, node) is CachePolicies.LIVE:
+            # Sizes of live files change without writes of the kernel.
+            attr.attr_timeout = 0
 
         return attr
 
+    def __view_getattr(self, inode):
+        key = self.data.xattrs.key(inode)
+        if key is None:
+            raise FUSEError(errno.ENOENT)
+        # Views take times and owner of the query directory.
+        node = self.data.nodes[self.data.xattrs.root]
+        attr = pyfuse3.EntryAttributes()
+        if len(key) == 3:
+            attr.st_mode = stat.S_IFLNK | 0o777
+            attr.st_size = len(self.__view_link(key))
+            attr.st_nlink = 1
+        else:
+            attr.st_mode = stat.S_IFDIR | QUERY_MODE
+            attr.st_size = 0
+            attr.st_nlink = 2
+        attr.st_atime_ns = node.atime
+        attr.st_ctime_ns = node.ctime
+        attr.st_mtime_ns = node.mtime
+        attr.st_gid = node.gid
+        attr.st_uid = node.uid
+        attr.st_ino = inode
+        # Views change with the extended attributes, so the kernel must not cache them.
+        attr.entry_timeout = 0
+        attr.attr_timeout = 0
+        return attr
+
+    def __snapshot_node(self, inode):
+        """ Returns the snapshot, the live inode and the frozen node of a snapshot view.
+
+        """
+        snapshot, live = self.data.snapshots.resolve(inode)
+        node = self.data.snapshots.node(snapshot, live) if snapshot is not None else None
+        if node is None:
+            raise FUSEError(errno.ENOENT)
+        return snapshot, live, node
+
+    def __snapshot_getattr(self, inode):
+        snapshot, live, node = self.__snapshot_node(inode)
+        attr = pyfuse3.EntryAttributes()
+        attr.st_mode = self.data.snapshots.read_only(node.mode)
+        attr.st_size = node.size
+        attr.st_nlink = 1
+        attr.st_atime_ns = node.atime
+        attr.st_ctime_ns = node.ctime
+        attr.st_mtime_ns = node.mtime
+        attr.st_gid = node.gid
+        attr.st_uid = node.uid
+        attr.st_ino = inode
+        return attr
+
+    def __view_link(self, key):
+        """ Returns the target of the link view of key, relative to its value directory.
+
+        """
+        directory = os.path.join(self.data.get_entry(self.data.xattrs.root).get_full_path(),
+                                 os.fsdecode(key[0]), os.fsdecode(key[1]))
+        return os.fsencode(os.path.relpath(self.data.get_entry(key[2]).get_full_path(), directory))
+
+    def __view_name(self, key):
+        if len(key) == 3:
+            return link_name(key[2], self.data.get_entry(key[2]).name)
+        return key[-1]
+
+    def __check_writable(self, *inodes):
+        # The query directories only change with extended attributes, snapshots never change.
+        for inode in inodes:
+            if self.data.snapshots.is_view(inode):
+                raise FUSEError(errno.EROFS)
+            if self.data.xattrs.is_browsable(inode) or self.data.xattrs.is_view(inode) or\
+                    inode == self.data.snapshots.root:
+                raise FUSEError(errno.EACCES)
+
+    async def __refresh(self, inode, handle=None):
+        """ Calls the provider of a virtual file, if its content is stale.
+        Providers of files with a state per open file are called by reads through their handle only.
+
+        """
+        node = self.data.nodes.get(inode)
+        if isinstance(node, StreamFile):
+            node.size = node.stream.end
+            return None
+        if isinstance(node, VirtualFile):
+            try:
+                if node.session:
+                    return await self.data.providers.provide(node, handle) if handle is not None else None
+                return await self.data.providers.fetch(inode, node)
+            except Exception:
+                raise FUSEError(errno.EIO)
+        return None
+
+    async def __attributes(self, inode):
+        # Handlers use this instead of getattr, so only requests of the kernel are logged and traced.
+        await self.__refresh(inode)
+        return self.__getattr(inode)
+
     @wrapper(1)
     async def getattr(self, inode, ctx=None):
         """Get attributes for *inode*
@@ -126,7 +327,7 @@ class _FileSystem(pyfuse3.Operations):
         attributes of *inode*. The `~EntryAttributes.entry_timeout` attribute is
         ignored in this context.
         """
-        return self.__getattr(inode)
+        return await self.__attributes(inode)
 
     @wrapper(1, 4)
     async def setattr(self, inode, attr, fields, fh, ctx):
@@ -148,44 +349,53 @@ class _FileSystem(pyfuse3.Operations):
         The method should return an `EntryAttributes` instance (containing both
         the changed and unchanged values).
         """
-        if inode not in self.data.nodes:
-            self.log.error("Inode %d not saved.", inode)
-            raise Exception("Inode not found.")
-        node = self.data.nodes[inode]
-        try:
-            if fields.update_size:
-                # This is needed for truncating files.
-                if node.data is None:
-                    node.data = b''
-                if len(node.data) < attr.st_size:
-                    node.data = node.data + b'\0' * \
-                        (attr.st_size - len(node.data))
-                else:
-                    node.data = node.data[:attr.st_size]
-                self.log.debug("new size: %d", node.size)
-                self.log.debug("new data: %s", node.data)
-            if fields.update_mode:
-                node.mode = attr.st_mode
-                self.log.debug("new mode: %s", oct(node.mode))
-            if fields.update_uid:
-                node.uid = attr.st_uid
-                self.log.debug("new uid: %d", node.uid)
-            if fields.update_gid:
-                node.gid = attr.st_gid
-                self.log.debug("new gid: %d", node.gid)
-            if fields.update_atime:
-                node.atime = attr.st_atime_ns
-                self.log.debug("new atime: %d", node.atime)
-            if fields.update_mtime:
-                node.mtime = attr.st_mtime_ns
-                self.log.debug("new mtime: %d", node.mtime)
-            node.ctime = int(time.time() * 1e9)
-            self.data.nodes[inode] = node
-
-        except OSError as exc:
-            raise FUSEError(exc.errno)
-
-        return await self.getattr(inode)
+        self.__check_writable(inode)
+        async with self.data.locks.inodes(inode):
+            if inode not in self.data.nodes:
+                self.log.error("Inode %d not saved.", inode)
+                raise Exception("Inode not found.")
+            node = self.data.nodes[inode]
+            self.data.snapshots.preserve(inode)
+            update_size = fields.update_size
+            if update_size and isinstance(node, VirtualFile):
+                if not node.is_writable():
+                    raise FUSEError(errno.EACCES)
+                # Truncating a writable virtual file is ignored. Written data is handed to its writer.
+                update_size = False
+            try:
+                if update_size:
+                    # This is needed for truncating files.
+                    if node.data is None:
+                        node.data = b''
+                    if len(node.data) < attr.st_size:
+                        node.data = node.data + b'\0' * \
+                            (attr.st_size - len(node.data))
+                    else:
+                        node.data = node.data[:attr.st_size]
+                    self.log.debug("new size: %d", node.size)
+                    self.log.debug("new data: %s", node.data)
+                if fields.update_mode:
+                    node.mode = attr.st_mode
+                    self.log.debug("new mode: %s", oct(node.mode))
+                if fields.update_uid:
+                    node.uid = attr.st_uid
+                    self.log.debug("new uid: %d", node.uid)
+                if fields.update_gid:
+                    node.gid = attr.st_gid
+                    self.log.debug("new gid: %d", node.gid)
+                if fields.update_atime:
+                    node.atime = attr.st_atime_ns
+                    self.log.debug("new atime: %d", node.atime)
+                if fields.update_mtime:
+                    node.mtime = attr.st_mtime_ns
+                    self.log.debug("new mtime: %d", node.mtime)
+                node.ctime = int(time.time() * 1e9)
+                self.data.nodes[inode] = node
+
+            except OSError as exc:
+                raise FUSEError(exc.errno)
+
+            return await self.__attributes(inode)
 
     @wrapper(1, 2, 3)
     async def setxattr(self, inode, name, value, ctx):
@@ -197,7 +407,22 @@ class _FileSystem(pyfuse3.Operations):
         """
 
         # http://man7.org/linux/man-pages/man7/xattr.7.html
-        self.data.nodes[inode].xattr[name] = value
+        if inode == ROOT_INODE and name == PROFILE_XATTR:
+            # Commands of the profiler are neither stored nor indexed.
+            try:
+                self.profiler.control(value)
+            except ValueError as e:
+                self.log.error(e)
+                raise FUSEError(errno.EINVAL)
+            return
+        self.__check_writable(inode)
+        async with self.data.locks.inodes(inode):
+            self.data.snapshots.preserve(inode)
+            xattr = self.data.nodes[inode].xattr
+            if name in xattr:
+                self.data.xattrs.discard(inode, name, xattr[name])
+            xattr[name] = value
+            self.data.xattrs.add(inode, name, value)
 
     @wrapper(1, 2)
     async def getxattr(self, inode, name, ctx):
@@ -208,7 +433,12 @@ class _FileSystem(pyfuse3.Operations):
         guaranteed not to contain zero-bytes (``\\0``).
         """
 
-        xattr = self.data.nodes[inode].xattr
+        if self.data.xattrs.is_view(inode):
+            raise FUSEError(errno.ENODATA)
+        if self.data.snapshots.is_view(inode):
+            xattr = self.__snapshot_node(inode)[2].xattr
+        else:
+            xattr = self.data.nodes[inode].xattr
 
         if name not in xattr:
             # https://github.com/libfuse/pyfuse3/blob/master/src/xattr.h ENOATTR = ENODATA
@@ -237,6 +467,14 @@ class _FileSystem(pyfuse3.Operations):
         self.log.debug(self.data.entries)
         self.log.debug("Name: %s", name)
 
+        if self.data.xattrs.is_browsable(parent_inode):
+            key = self.data.xattrs.lookup(parent_inode, name, lambda inode: self.data.get_entry(inode).name)
+            if key is None:
+                raise FUSEError(errno.ENOENT)
+            return self.__getattr(self.data.xattrs.view(*key))
+        if parent_inode == self.data.snapshots.root or self.data.snapshots.is_view(parent_inode):
+            return self.__snapshot_lookup(parent_inode, name)
+
         # TODO: Bug if new entry has the same name as root node.
         if parent_inode == ROOT_INODE and self.data.get_entry(parent_inode).name == name:
             self.log.debug("Looked up root dir.")
@@ -252,6 +490,7 @@ class _FileSystem(pyfuse3.Operations):
                     raise FUSEError(errno.ENOENT)
                 else:
                     self.data.try_increase_op_count(inode)
+                    await self.__refresh(inode)
                     return self.__getattr(inode)
 
         self.log.debug("Couldn't find inode. Is it a SymbolicEntry?")
@@ -299,6 +538,19 @@ class _FileSystem(pyfuse3.Operations):
 
         return attr
 
+    def __snapshot_lookup(self, parent_inode, name):
+        snapshots = self.data.snapshots
+        if parent_inode == snapshots.root:
+            snapshot = snapshots.snapshots.get(os.fsdecode(name))
+            if snapshot is None:
+                raise FUSEError(errno.ENOENT)
+            return self.__getattr(snapshots.view(snapshot, snapshot.inode))
+        snapshot, live, _ = self.__snapshot_node(parent_inode)
+        inode = snapshots.lookup(snapshot, live, name)
+        if inode is None:
+            raise FUSEError(errno.ENOENT)
+        return self.__getattr(snapshots.view(snapshot, inode))
+
     @wrapper(1)
     async def open(self, inode, flags, ctx):
         """Open a inode *inode* with *flags*.
@@ -318,9 +570,23 @@ class _FileSystem(pyfuse3.Operations):
 
         self.log.debug(stat.filemode(flags))
         self.log.debug(stat.S_IMODE(flags))
-        if (flags & os.O_TRUNC) != 0:
-            self.log.warning("Truncating data of inode: %d", inode)
-            self.data.nodes[inode].data = ""
+        if self.data.snapshots.is_view(inode):
+            if flags & (os.O_WRONLY | os.O_RDWR | os.O_APPEND | os.O_TRUNC) != 0:
+                raise FUSEError(errno.EROFS)
+            self.__snapshot_node(inode)
+            # Snapshots never change.
+            return pyfuse3.FileInfo(fh=self.handles.open(inode, flags).fh, keep_cache=True)
+        node = self.data.nodes[inode]
+        if (flags & os.O_TRUNC) != 0 and isinstance(node, VirtualFile):
+            if not node.is_writable():
+                raise FUSEError(errno.EACCES)
+        elif (flags & os.O_TRUNC) != 0:
+            # Writes waiting for the body hold the lock, so they aren't applied after the truncation.
+            async with self.data.locks.inodes(inode):
+                self.log.warning("Truncating data of inode: %d", inode)
+                self.data.snapshots.preserve(inode)
+                node.data = ""
+                self.data.page_cache.changed(inode)
         if not (flags & os.O_RDWR or flags & os.O_RDONLY or flags & os.O_WRONLY or flags & os.O_APPEND):
 
             self.log.error("False permission.")
@@ -331,10 +597,18 @@ class _FileSystem(pyfuse3.Operations):
             self.log.debug("whole flags: %s", oct(flags))
             # raise pyfuse3.FUSEError(errno.EPERM)
         self.data.try_increase_op_count(inode)
-        return pyfuse3.FileInfo(fh=inode)
+        keep_cache, direct_io = self.data.page_cache.open(inode, node)
+        return pyfuse3.FileInfo(fh=self.handles.open(inode, flags).fh, keep_cache=keep_cache, direct_io=direct_io)
+
+    def __handle(self, fh):
+        handle = self.handles.get(fh)
+        if handle is None:
+            self.log.error("Unknown file handle %d", fh)
+            raise FUSEError(errno.EBADF)
+        return handle
 
     @wrapper(1)
-    async def read(self, inode, off, size):
+    async def read(self, fh, off, size):
         """Read *size* bytes from *fh* at position *off*
         *fh* will by an integer filehandle returned by a prior `open` or
         `create` call.
@@ -342,7 +616,29 @@ class _FileSystem(pyfuse3.Operations):
         on EOF or error, otherwise the rest of the data will be substituted with
         zeroes.
         """
-
+        handle = self.__handle(fh)
+        inode = handle.inode
+
+        if self.data.snapshots.is_view(inode):
+            snapshot, live, node = self.__snapshot_node(inode)
+            if not self.data.snapshots.is_live(snapshot, live):
+                return node.get_data()[off: off+size]
+            # Unchanged since the snapshot, so the live file is read.
+            inode = live
+        node = self.data.nodes.get(inode)
+        if isinstance(node, StreamFile):
+            # Waits at the end of the stream for new content.
+            return await node.read(off, size)
+        content = await self.__refresh(inode, handle)
+        if content is not None:
+            return content[off: off+size]
+        if node is not None:
+            # Sequential reads of contents, which are slow to read, are read ahead.
+            self.handles.read(handle, inode, off, size, node)
+            await self.data.bodies.fault(inode, node, self.executor)
+            if self.data.compression.is_compressed(node):
+                # Decompresses the blocks in range only.
+                return self.data.compression.read(inode, node, off, size)
         self.log.debug(self.data.nodes[inode].get_data()[off: off+size])
         return self.data.nodes[inode].get_data()[off: off+size]
 
@@ -357,24 +653,25 @@ class _FileSystem(pyfuse3.Operations):
         (Successful) execution of this handler increases the lookup count for
         the returned inode by one.
         """
-
-        if name.decode("utf-8")[-4:] == ".swp":
-            self.log.debug("Creating a swap file.")
-        try:
-            self.log.debug("Trying to get inode")
-            inode = self.data.add_entry(name, parent_inode, mode=mode).inode
-            self.log.debug("Got inode %d", inode)
-            attr = self.__getattr(inode)
-            self.log.debug("got attributes for inode %d", inode)
-            self.log.debug(str(attr))
-        except Exception as e:
-            self.log.error(e)
-            self.log.error("Create Failed")
-
-        return (inode, attr)
+        self.__check_writable(parent_inode)
+        async with self.data.locks.inodes(parent_inode):
+            if name.decode("utf-8")[-4:] == ".swp":
+                self.log.debug("Creating a swap file.")
+            try:
+                self.log.debug("Trying to get inode")
+                inode = self.data.add_entry(name, parent_inode, mode=mode).inode
+                self.log.debug("Got inode %d", inode)
+                attr = self.__getattr(inode)
+                self.log.debug("got attributes for inode %d", inode)
+                self.log.debug(str(attr))
+            except Exception as e:
+                self.log.error(e)
+                self.log.error("Create Failed")
+
+            return (self.handles.open(inode, flags).fh, attr)
 
     @wrapper(1, 2)
-    async def write(self, inode, off, buf):
+    async def write(self, fh, off, buf):
         """Write *buf* into *fh* at *off*
         *fh* will by an integer filehandle returned by a prior `open` or
         `create` call.
@@ -383,23 +680,65 @@ class _FileSystem(pyfuse3.Operations):
         system *must* always write *all* the provided data (i.e., return
         ``len(buf)``).
         """
+        handle = self.__handle(fh)
+        inode = handle.inode
+        node = self.data.nodes.get(inode)
+        if isinstance(node, VirtualFile):
+            # Virtual files have no content to protect, writers may lock whatever they change.
+            if not node.is_writable():
+                raise FUSEError(errno.EACCES)
+            if off != 0 and not node.appends:
+                # The writer parses whole buffers, the rest of a split buffer would be parsed on its own.
+                self.log.error("Writes to inode %d start at offset 0, not %d.", inode, off)
+                raise FUSEError(errno.EINVAL)
+            if not node.lines:
+                await self.__write_virtual(handle, node, buf)
+                return len(buf)
+            # The incomplete last line of a handle waits for its next write or its flush.
+            lines = handle.lines(buf)
+            if len(lines) > 0:
+                await self.__write_virtual(handle, node, lines)
+            return len(buf)
+        async with self.data.locks.inodes(inode):
+            node = self.data.nodes.get(inode)
+            if node is not None:
+                await self.data.bodies.fault(inode, node, self.executor)
+                self.data.snapshots.preserve(inode)
+            try:
+                output = ""
+                node = self.data.nodes[inode]
+                data = node.get_data(encoding=Encodings.UTF_8_ENCODING)
+                self.log.debug("data: %s", data)
+                buffer = buf.decode("utf-8")
+                self.log.debug("buffer: %s", buffer)
+                output = data[:off] + buffer + data[off:]
+                self.log.debug("output: %s", output)
+                self.data.nodes[inode].data = output
+            except KeyError:
+                self.log.warning("Inode %d does not exist.", inode)
+            except Exception as e:
+                self.log.error(e)
+                self.log.error("Write was not successful.")
+            return len(buf)
 
+    async def __write_virtual(self, handle, node, buf):
         try:
-            output = ""
-            node = self.data.nodes[inode]
-            data = node.get_data(encoding=Encodings.UTF_8_ENCODING)
-            self.log.debug("data: %s", data)
-            buffer = buf.decode("utf-8")
-            self.log.debug("buffer: %s", buffer)
-            output = data[:off] + buffer + data[off:]
-            self.log.debug("output: %s", output)
-            self.data.nodes[inode].data = output
-        except KeyError:
-            self.log.warning("Inode %d does not exist.", inode)
-        except Exception as e:
+            written = node.writer(handle, buf) if node.session else node.writer(buf)
+            if inspect.isawaitable(written):
+                await written
+        except ValueError as e:
             self.log.error(e)
-            self.log.error("Write was not successful.")
-        return len(buf)
+            # A rejected line isn't completed by later writes.
+            handle.partial = b""
+            raise FUSEError(errno.EINVAL)
+        self.data.providers.discard(handle.inode)
+
+    async def __flush_lines(self, handle):
+        node = self.data.nodes.get(handle.inode)
+        if len(handle.partial) == 0 or not isinstance(node, VirtualFile):
+            return
+        buf, handle.partial = handle.partial, b""
+        await self.__write_virtual(handle, node, buf)
 
     @wrapper(1, 2)
     async def access(self, inode, mode, ctx):
@@ -414,21 +753,32 @@ class _FileSystem(pyfuse3.Operations):
         raise FUSEError(errno.ENOSYS)
 
     @wrapper(1)
-    async def release(self, inode):
+    async def release(self, fh):
         """Release open file
-        This method will be called when the last file descriptor of *inode* has
+        This method will be called when the last file descriptor of *fh* has
         been closed, i.e. when the file is no longer opened by any client
         process.
-        *inode* will by an integer filehandle returned by a prior `open` or
+        *fh* will by an integer filehandle returned by a prior `open` or
         `create` call. Once `release` has been called, no future requests for
-        *inode* will be received (until the value is re-used in the return value of
+        *fh* will be received (until the value is re-used in the return value of
         another `open` or `create` call).
         This method may return an error by raising `FUSEError`, but the error
         will be discarded because there is no corresponding client request.
         """
+        handle = self.handles.release(fh)
+        if handle is None:
+            self.log.warning("Can't release unknown file handle %d.", fh)
+            return
+        inode = handle.inode
+        if self.data.snapshots.is_view(inode):
+            return
         if inode not in self.data.nodes:
             self.log.warning("Can't release inode. Doesn't exist anymore.")
             return
+        try:
+            await self.__flush_lines(handle)
+        except FUSEError:
+            self.log.warning("Dropped the incomplete last line written to inode %d.", inode)
         self.data.nodes[inode].unlock()
         self.data.try_decrease_op_count(inode)
 
@@ -449,27 +799,31 @@ class _FileSystem(pyfuse3.Operations):
             (and of course only if at that point there are no more directory entries
             associated with the inode either).
             """
-
-        children = self.data.get_children(parent_inode)
-        if len(children) == 0:
-            self.log.warning(
-                "Found no children for parent_inode %d.", parent_inode)
-            return
-        for entry in children:
-            try:
-                if entry.name == name:
-                    inode = entry.inode
-                    self.log.info("Lock inode: %d", inode)
-                    self.log.info("open_count: %d",
-                                  self.data.nodes[inode].open_count)
-                    self.data.nodes[inode].set_invisible()
-                    if self.data.nodes[inode].open_count <= 1:
-                        self.data.nodes[inode].lock()
-            except KeyError:
-                self.log.warning("Inode %d does not exist.", inode)
+        self.__check_writable(parent_inode)
+        async with self.data.locks.inodes(parent_inode):
+            children = self.data.get_children(parent_inode)
+            if len(children) == 0:
+                self.log.warning(
+                    "Found no children for parent_inode %d.", parent_inode)
+                return
+            for entry in children:
+                try:
+                    if entry.name == name:
+                        inode = entry.inode
+                        self.log.info("Lock inode: %d", inode)
+                        self.log.info("open_count: %d",
+                                      self.data.nodes[inode].open_count)
+                        self.data.snapshots.preserve(inode)
+                        self.data.nodes[inode].set_invisible()
+                        # Unlinked files are no results of queries anymore.
+                        self.data.xattrs.discard_node(inode, self.data.nodes[inode].xattr)
+                        if self.data.nodes[inode].open_count <= 1:
+                            self.data.nodes[inode].lock()
+                except KeyError:
+                    self.log.warning("Inode %d does not exist.", inode)
 
     @wrapper(1)
-    async def flush(self, inode):
+    async def flush(self, fh):
         """Handle close() syscall.
         *fh* will by an integer filehandle returned by a prior `open` or
         `create` call.
@@ -477,7 +831,10 @@ class _FileSystem(pyfuse3.Operations):
         called multiple times for the same open file (e.g. if the file handle
         has been duplicated).
         """
-        pass
+        handle = self.handles.get(fh)
+        if handle is not None:
+            # A last line without newline is complete, once its file is closed.
+            await self.__flush_lines(handle)
 
     @wrapper(1)
     async def forget(self, inode_list):
@@ -499,6 +856,8 @@ class _FileSystem(pyfuse3.Operations):
 
         for (inode, nlookup) in inode_list:
             self.log.debug("inode: %d, nlookup: %d", inode, nlookup)
+            if self.data.xattrs.is_view(inode) or self.data.snapshots.is_view(inode):
+                continue
             try:
                 if self.data.nodes[inode].open_count > nlookup:
                     self.data.nodes[inode].dec_open_count(nlookup)
@@ -512,7 +871,7 @@ class _FileSystem(pyfuse3.Operations):
                 self.data.try_remove_inode(inode)
 
     @wrapper(1)
-    async def fsync(self, inode, datasync):
+    async def fsync(self, fh, datasync):
         """Flush buffers for open file *fh*
         If *datasync* is true, only the file contents should be
         flushed (in contrast to the metadata about the file).
@@ -546,26 +905,22 @@ class _FileSystem(pyfuse3.Operations):
         reaches zero (and of course only if at that point there are no more
         directory entries associated with *inode_deref* either).
         """
+        self.__check_writable(parent_inode_old, parent_inode_new)
         # See https://github.com/libfuse/pyfuse3/blob/1730558574361bf7b05b1be2a228a0443deca088/examples/tmpfs.py#L224
-        if flags != 0:
-            raise FUSEError(errno.EINVAL)
+        async with self.data.locks.inodes(parent_inode_old, parent_inode_new):
+            if flags != 0:
+                raise FUSEError(errno.EINVAL)
 
-        entry_old = self.data.get_entry_by_parent_name(
-            parent_inode_old, name_old)
+            entry_old = self.data.get_entry_by_parent_name(
+                parent_inode_old, name_old)
 
-        self.log.debug(entry_old)
-        self.data.nodes[entry_old.inode].parent = parent_inode_new
-        parent_entry_new = self.data.get_entry(parent_inode_new)
-
-        entry_new = self.data.entries.move(entry_old,
-                                           entry_old.path, parent_entry_new.get_full_path())
-        entry_new.name = name_new
-        entry_new.parent = parent_entry_new
-        self.log.debug(entry_new)
-        self.log.debug("parent inodes from %d to %d",
-                       parent_inode_old, parent_inode_new)
-        self.log.debug("name from %s to %s", name_old, name_new)
-        self.log.debug("flags %d", flags)
+            self.log.debug(entry_old)
+            entry_new = self.data.rename_entry(entry_old, parent_inode_new, name_new)
+            self.log.debug(entry_new)
+            self.log.debug("parent inodes from %d to %d",
+                           parent_inode_old, parent_inode_new)
+            self.log.debug("name from %s to %s", name_old, name_new)
+            self.log.debug("flags %d", flags)
 
     @wrapper(1, 2, 3)
     async def symlink(self, parent_inode, name, target, ctx):
@@ -578,18 +933,20 @@ class _FileSystem(pyfuse3.Operations):
         (Successful) execution of this handler increases the lookup count for
         the returned inode by one.
         """
-        try:
-            target = os.fsdecode(target)
-            if target[0] != os.sep:
-                target = os.sep + os.fsdecode(target)
-            self.log.debug("Using path: %s", target)
-            inode = self.data.add_link_entry(
-                name, parent_inode, LinkTypes.SYMBOLIC, link_path=target).inode
-            self.data.try_increase_op_count(inode)
-        except Exception as e:
-            self.log.error(e)
-            raise FUSEError(errno.ENOENT)
-        return self.__getattr(inode)
+        self.__check_writable(parent_inode)
+        async with self.data.locks.inodes(parent_inode):
+            try:
+                target = os.fsdecode(target)
+                if target[0] != os.sep:
+                    target = os.sep + os.fsdecode(target)
+                self.log.debug("Using path: %s", target)
+                inode = self.data.add_link_entry(
+                    name, parent_inode, LinkTypes.SYMBOLIC, link_path=target).inode
+                self.data.try_increase_op_count(inode)
+            except Exception as e:
+                self.log.error(e)
+                raise FUSEError(errno.ENOENT)
+            return self.__getattr(inode)
 
     @wrapper(1)
     async def readlink(self, inode, ctx):
@@ -598,6 +955,17 @@ class _FileSystem(pyfuse3.Operations):
 
         Currently, this function only works in this FUSE filesystem.
         """
+        if self.data.xattrs.is_view(inode):
+            key = self.data.xattrs.key(inode)
+            if key is None or len(key) != 3:
+                raise FUSEError(errno.ENOENT)
+            return self.__view_link(key)
+        if self.data.snapshots.is_view(inode):
+            snapshot, live, _ = self.__snapshot_node(inode)
+            entry = self.data.snapshots.entry(snapshot, live)
+            if type(entry) is not SymbolicEntry:
+                raise FUSEError(errno.EINVAL)
+            return os.fsencode(entry.link_path)
         entry = self.data.get_link_entry(inode, LinkTypes.SYMBOLIC)
         self.log.debug("Read link of {}".format(entry))
         if entry is None:
@@ -616,10 +984,12 @@ class _FileSystem(pyfuse3.Operations):
         (Successful) execution of this handler increases the lookup count for
         the returned inode by one.
         """
-        self.data.add_link_entry(
-            new_name, new_parent_inode, LinkTypes.HARDLINK, target_inode=inode)
-        self.data.try_increase_op_count(inode)
-        return await self.getattr(inode)
+        self.__check_writable(inode, new_parent_inode)
+        async with self.data.locks.inodes(inode, new_parent_inode):
+            self.data.add_link_entry(
+                new_name, new_parent_inode, LinkTypes.HARDLINK, target_inode=inode)
+            self.data.try_increase_op_count(inode)
+            return await self.__attributes(inode)
 
     @wrapper(2)
     async def mknod(self, parent_inode, name, mode, rdev, ctx):
@@ -634,10 +1004,12 @@ class _FileSystem(pyfuse3.Operations):
         (Successful) execution of this handler increases the lookup count for
         the returned inode by one.
         """
-        self.log.debug("With mode: %s", mode)
+        self.__check_writable(parent_inode)
+        async with self.data.locks.inodes(parent_inode):
+            self.log.debug("With mode: %s", mode)
 
-        inode = self.data.add_inode(name, parent_inode, mode=mode)
-        return self.__getattr(inode)
+            inode = self.data.add_inode(name, parent_inode, mode=mode)
+            return self.__getattr(inode)
 
     @wrapper(2)
     async def mkdir(self, parent_inode, name, mode, ctx):
@@ -649,9 +1021,28 @@ class _FileSystem(pyfuse3.Operations):
         attributes of the newly created directory entry.
         (Successful) execution of this handler increases the lookup count for
         the returned inode by one.
+
+        Directories with the suffix ``.series`` are created as time series.
+        Directories created in the snapshots directory are snapshots of the tree.
         """
-        return self.__getattr(self.data.add_entry(name, parent_inode,
-                                                  node_type=Types.DIR, mode=mode).inode)
+        if parent_inode == self.data.snapshots.root:
+            return self.__create_snapshot(name)
+        self.__check_writable(parent_inode)
+        async with self.data.locks.inodes(parent_inode):
+            if name.decode("utf-8").endswith(SERIES_SUFFIX):
+                return self.__getattr(self.data.add_series_entry(name, parent_inode, mode=mode).inode)
+            return self.__getattr(self.data.add_entry(name, parent_inode,
+                                                      node_type=Types.DIR, mode=mode).inode)
+
+    def __create_snapshot(self, name):
+        try:
+            snapshot = self.data.snapshots.create(os.fsdecode(name))
+        except FileExistsError:
+            raise FUSEError(errno.EEXIST)
+        except ValueError:
+            raise FUSEError(errno.EINVAL)
+        self.log.info("Took snapshot %s.", snapshot.name)
+        return self.__getattr(self.data.snapshots.view(snapshot, snapshot.inode))
 
     @wrapper(1)
     async def opendir(self, inode, ctx):
@@ -661,7 +1052,8 @@ class _FileSystem(pyfuse3.Operations):
         be passed to the `readdir`, `fsyncdir` and `releasedir` methods to
         identify the directory.
         """
-        self.data.try_increase_op_count(inode)
+        if not self.data.xattrs.is_view(inode) and not self.data.snapshots.is_view(inode):
+            self.data.try_increase_op_count(inode)
         return inode
 
     @wrapper(1)
@@ -689,6 +1081,19 @@ class _FileSystem(pyfuse3.Operations):
         `readdir_reply` returns True).
         """
         self.log.debug("start_id: %s", start_id)
+        if self.data.xattrs.is_browsable(inode):
+            # Listed from the index, ordered by the inodes of the views as start_id refers to them.
+            views = sorted((self.data.xattrs.view(*key), key) for key in self.data.xattrs.children(inode))
+            for view, key in views:
+                if view > start_id and not pyfuse3.readdir_reply(token, self.__view_name(key),
+                                                                 self.__getattr(view), view):
+                    break
+            return
+        if inode == self.data.snapshots.root or self.data.snapshots.is_view(inode):
+            for view, name in self.__snapshot_children(inode):
+                if view > start_id and not pyfuse3.readdir_reply(token, name, self.__getattr(view), view):
+                    break
+            return
         dir_path = self.data.get_entry(inode).get_full_path()
         self.log.debug("dirpath: %s", dir_path)
         entries = self.data.get_children(inode)
@@ -709,13 +1114,28 @@ class _FileSystem(pyfuse3.Operations):
                 if node.is_invisible() is True:
                     self.log.debug("Node %s is invisible.", entry.name)
                     continue
-                if not pyfuse3.readdir_reply(token, entry.name, await self.getattr(inode), inode):
+                if not pyfuse3.readdir_reply(token, entry.name, await self.__attributes(inode), inode):
                     break
         except Exception as e:
             self.log.error("Readdir failed.")
             self.log.error(e)
         return
 
+    def __snapshot_children(self, inode):
+        """ Returns the views and names of the children of the snapshots directory or a snapshot view,
+        ordered by the inodes of the views as start_id refers to them.
+
+        """
+        snapshots = self.data.snapshots
+        if inode == snapshots.root:
+            children = [(snapshots.view(snapshot, snapshot.inode), os.fsencode(snapshot.name))
+                        for snapshot in snapshots.snapshots.values()]
+        else:
+            snapshot, live, _ = self.__snapshot_node(inode)
+            children = [(snapshots.view(snapshot, child), snapshots.name(snapshot, child))
+                        for child in snapshots.children(snapshot, live)]
+        return sorted(children)
+
     @wrapper(2)
     async def rmdir(self, parent_inode, name, ctx):
         """Remove directory *name*
@@ -734,37 +1154,48 @@ class _FileSystem(pyfuse3.Operations):
         is not required to check if there are still other directory entries
         refering to the same inode. This conveniently avoids the ambigiouties
         associated with the ``.`` and ``..`` entries).
-        """
 
-        try:
-            self.log.debug("Getting childs of: {0} with name: {1}".format(
-                self.data.nodes[parent_inode], name))
+        Removing a directory of the snapshots directory drops the snapshot.
+        """
+        if parent_inode == self.data.snapshots.root:
+            try:
+                self.data.snapshots.remove(os.fsdecode(name))
+            except KeyError:
+                raise FUSEError(errno.ENOENT)
+            return
+        self.__check_writable(parent_inode)
+        async with self.data.locks.inodes(parent_inode):
+            try:
+                self.log.debug("Getting childs of: {0} with name: {1}".format(
+                    self.data.nodes[parent_inode], name))
 
-            filtered_list = [entry for entry in self.data.get_children(
-                parent_inode) if entry.name == name]
+                filtered_list = [entry for entry in self.data.get_children(
+                    parent_inode) if entry.name == name]
 
-            self.log.debug("filtered list of entries with name %s:", name)
-            self.log.debug(filtered_list)
+                self.log.debug("filtered list of entries with name %s:", name)
+                self.log.debug(filtered_list)
 
-            if len(filtered_list) > 1:
-                self.log.warning("Found more than one entry.")
-                for item in filtered_list:
-                    if item.link_type is None:
-                        inode = item.inode
-                        break
-            else:
-                inode = filtered_list[0].inode
-
-            # TODO: check this behavior. Could result in errors.
-            self.data.try_decrease_op_count(inode)
-            self.log.info("Lock inode: %d", inode)
-            self.log.info("open_count: %d", self.data.nodes[inode].open_count)
-            # Forget path for readdir. But it will be accessible via getattr, if lookup_count > 1.
-            self.data.nodes[inode].set_invisible()
-            if self.data.nodes[inode].open_count <= 1:
-                self.data.nodes[inode].lock()
-        except Exception as e:
-            self.log.error(e)
+                if len(filtered_list) > 1:
+                    self.log.warning("Found more than one entry.")
+                    for item in filtered_list:
+                        if item.link_type is None:
+                            inode = item.inode
+                            break
+                else:
+                    inode = filtered_list[0].inode
+
+                # TODO: check this behavior. Could result in errors.
+                self.data.try_decrease_op_count(inode)
+                self.log.info("Lock inode: %d", inode)
+                self.log.info("open_count: %d", self.data.nodes[inode].open_count)
+                # Forget path for readdir. But it will be accessible via getattr, if lookup_count > 1.
+                self.data.snapshots.preserve(inode)
+                self.data.nodes[inode].set_invisible()
+                self.data.xattrs.discard_node(inode, self.data.nodes[inode].xattr)
+                if self.data.nodes[inode].open_count <= 1:
+                    self.data.nodes[inode].lock()
+            except Exception as e:
+                self.log.error(e)
 
     @wrapper(1)
     async def releasedir(self, inode):
@@ -773,6 +1204,8 @@ class _FileSystem(pyfuse3.Operations):
         *fh* has been released, no further `readdir` requests will be received
         for it (until it is opened again with `opendir`).
         """
+        if self.data.xattrs.is_view(inode) or self.data.snapshots.is_view(inode):
+            return
         self.data.nodes[inode].unlock()
         self.data.try_decrease_op_count(inode)
 
@@ -798,9 +1231,7 @@ class _FileSystem(pyfuse3.Operations):
         stats.f_bsize = 512
         stats.f_frsize = 512
 
-        size_sum = 0
-        for inodes in self.data.nodes:
-            size_sum += self.data.nodes[inodes].size
+        size_sum = self.data.total_size
 
         stats.f_blocks = size_sum // stats.f_frsize
         stats.f_bfree = max(size_sum // stats.f_frsize, 1024)
@@ -850,8 +1281,12 @@ class _FileSystem(pyfuse3.Operations):
         This method must return a sequence of `bytes` objects.  The objects must
         not include zero-bytes (``\\0``).
         """
+        if self.data.xattrs.is_view(inode):
+            return []
+        if self.data.snapshots.is_view(inode):
+            return list(self.__snapshot_node(inode)[2].xattr.keys())
         if inode in self.data.nodes and self.data.nodes[inode].xattr is not None:
-            return self.data.nodes[inode].xattr.values()
+            return list(self.data.nodes[inode].xattr.keys())
         raise FUSEError(pyfuse3.ENOATTR)
 
     @wrapper(1, 2)
@@ -862,5 +1297,10 @@ class _FileSystem(pyfuse3.Operations):
         an error code of `ENOATTR`. *name* will be of type `bytes`, but is
         guaranteed not to contain zero-bytes (``\\0``).
         """
-        if name in self.data.nodes[inode].xattr:
-            del self.data.nodes[inode].xattr[name]
+        self.__check_writable(inode)
+        async with self.data.locks.inodes(inode):
+            self.data.snapshots.preserve(inode)
+            xattr = self.data.nodes[inode].xattr
+            if name not in xattr:
+                raise FUSEError(pyfuse3.ENOATTR)
+            self.data.xattrs.discard(inode, name, xattr.pop(name))
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+
+import trio
+
+from iotfs.utils import _logging
+
+# Reads continuing the previous read of a handle, after which the handle reads sequentially.
+SEQUENTIAL_READS = 2
+# Bytes read ahead of a sequential handle start with MIN_WINDOW and double up to MAX_WINDOW.
+MIN_WINDOW = 128 * 1024
+MAX_WINDOW = 2 * 1024 * 1024
+
+
+class Handle():
+
+    """
+    Handle is the state of an open file: its inode, the flags it was opened with and the history of its reads.
+    A handle reads sequentially, once SEQUENTIAL_READS reads continued the previous one. The window read ahead
+    of a sequential handle doubles with every read, a random read resets it.
+
+    ...
+
+    Attributes
+    ----------
+    fh : int
+        the file handle passed by the kernel
+    inode : int
+        the inode of the opened file
+    flags : int
+        the flags of open
+
+    """
+
+    def __init__(self, fh, inode, flags):
+        """
+        Parameters
+        ----------
+        fh : int
+            the file handle passed by the kernel
+        inode : int
+            the inode of the opened file
+        flags : int
+            the flags of open
+        """
+
+        self.fh = fh
+        self.inode = inode
+        self.flags = flags
+        # End of the last read, at which a sequential read continues.
+        self.offset = 0
+        self.streak = 0
+        self.reads = 0
+        self.window = 0
+        # End of the range read ahead.
+        self.ahead = 0
+        # The end of the writes to a virtual file, which is no complete line yet.
+        self.partial = b""
+        # State of the writer and the provider of a virtual file per open file.
+        self.state = None
+
+    def is_sequential(self):
+        return self.streak >= SEQUENTIAL_READS
+
+    def record(self, off, size):
+        """ Records a read of size bytes from off.
+
+        Returns
+        -------
+        tuple
+            offset and size of the range to read ahead or None
+        """
+        self.reads += 1
+        if off == self.offset:
+            self.streak += 1
+        else:
+            self.streak = 0
+            self.window = 0
+            self.ahead = 0
+        self.offset = off + size
+        if not self.is_sequential():
+            return None
+        self.window = min(max(self.window * 2, MIN_WINDOW), MAX_WINDOW)
+        start = max(self.ahead, self.offset)
+        end = self.offset + self.window
+        if start >= end:
+            return None
+        self.ahead = end
+        return start, end - start
+
+    def lines(self, buf):
+        """ Returns the complete lines written through the handle up to buf. The incomplete last line is kept
+        until the next write.
+
+        """
+        buf = self.partial + buf
+        end = buf.rfind(b"\n") + 1
+        self.partial = buf[end:]
+        return buf[:end]
+
+
+class HandleTable():
+
+    """
+    HandleTable allocates the file handles of open and create and keeps a Handle per open file until its
+    release. Sequential reads of files, whose content is slow to read, are read ahead by a background task:
+    spilled contents are read back from disk and blocks of compressed contents are decompressed into the cache of
+    iotfs.filesystem.data.compression.Compression, both by workers of executor.
+    Reads are counted by their pattern in metrics.
+
+    ...
+
+    Attributes
+    ----------
+    data : iotfs.filesystem.data.data.Data
+        the data, whose files are opened
+    executor : iotfs.filesystem._executor.Executor
+        the executor reading ahead
+    metrics : iotfs.utils._metrics.Metrics, optional
+        metrics, in which reads, read ahead ranges and open handles are counted
+    logger : logging.logger, optional
+        an already initialized logger instance
+
+    """
+
+    def __init__(self, data, executor, metrics=None, logger=None):
+        """
+        Parameters
+        ----------
+        data : iotfs.filesystem.data.data.Data
+            the data, whose files are opened
+        executor : iotfs.filesystem._executor.Executor
+            the executor reading ahead
+        metrics : iotfs.utils._metrics.Metrics, optional
+            metrics, in which reads, read ahead ranges and open handles are counted
+        logger : logging.logger, optional
+            an already initialized logger instance
+        """
+
+        if logger is not None:
+            self.log = logger
+        else:
+            self.log = _logging.create_logger("HandleTable", debug=True)
+        self.data = data
+        self.executor = executor
+        self.metrics = metrics
+        # fh -> Handle
+        self.handles = dict()
+        self.next_fh = 1
+        # inode -> (offset, size) to read ahead
+        self.pending = OrderedDict()
+        self.wakeup = None
+
+    def open(self, inode, flags):
+        handle = Handle(self.next_fh, inode, flags)
+        self.next_fh += 1
+        self.handles[handle.fh] = handle
+        self.__gauge()
+        return handle
+
+    def get(self, fh):
+        return self.handles.get(fh)
+
+    def release(self, fh):
+        """ Removes and returns the handle fh or None.
+
+        """
+        handle = self.handles.pop(fh, None)
+        self.__gauge()
+        return handle
+
+    def read(self, handle, inode, off, size, node):
+        """ Records a read of handle and queues the range read ahead, if the content of node, the node of inode,
+        is slow to read.
+
+        """
+        ahead = handle.record(off, size)
+        self.__increment("handles.sequential_reads" if handle.is_sequential() else "handles.random_reads")
+        if ahead is None or not (self.data.bodies.is_spilled(node) or self.data.compression.is_compressed(node)):
+            return
+        if inode in self.pending:
+            # The range queued before hasn't been read ahead yet.
+            off, size = self.pending[inode]
+            end = max(off + size, ahead[0] + ahead[1])
+            ahead = min(off, ahead[0]), end - min(off, ahead[0])
+        self.pending[inode] = ahead
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    async def prefetch(self, inode, off, size):
+        node = self.data.nodes.get(inode)
+        if node is None:
+            return
+        if self.data.bodies.is_spilled(node):
+            await self.data.bodies.fault(inode, node, self.executor)
+        if self.data.compression.is_compressed(node):
+            await self.data.compression.prefetch(inode, node, off, size)
+        self.__increment("handles.read_ahead")
+
+    async def run(self):
+        """ Reads ahead the queued ranges, until cancelled.
+
+        """
+        while True:
+            while len(self.pending) > 0:
+                inode, (off, size) = self.pending.popitem(last=False)
+                try:
+                    await self.prefetch(inode, off, size)
+                except Exception as e:
+                    # Reads fall back to reading the content themselves.
+                    self.log.warning("Read ahead of inode %d failed: %s", inode, e)
+            self.wakeup = trio.Event()
+            await self.wakeup.wait()
+
+    def __gauge(self):
+        if self.metrics is not None:
+            self.metrics.set("handles.open", len(self.handles))
+
+    def __increment(self, name):
+        if self.metrics is not None:
+            self.metrics.increment(name)
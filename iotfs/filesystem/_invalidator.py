@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+
+import pyfuse3
+import trio
+
+DEFAULT_INTERVAL = 0.05
+
+
+class Invalidator():
+
+    """
+    Invalidator tells the kernel to drop cached attributes, pages and directory entries, which changed without
+    a kernel request, e.g. by updates of adapters. Changes are collected while the filesystem is mounted and sent
+    in batches by a background task. Sending blocks until the kernel has processed the notification, so batches
+    are sent by a worker of the executor.
+
+    ...
+
+    Attributes
+    ----------
+    executor : iotfs.filesystem._executor.Executor
+        the executor running the batches
+    metrics : iotfs.utils._metrics.Metrics
+        metrics, in which sent notifications are counted
+    logger : logging.logger
+        an already initialized logger instance
+    interval : float, optional
+        seconds between two batches
+
+    """
+
+    def __init__(self, executor, metrics, logger, interval=DEFAULT_INTERVAL):
+        """
+        Parameters
+        ----------
+        executor : iotfs.filesystem._executor.Executor
+            the executor running the batches
+        metrics : iotfs.utils._metrics.Metrics
+            metrics, in which sent notifications are counted
+        logger : logging.logger
+            an already initialized logger instance
+        interval : float, optional
+            seconds between two batches
+        """
+
+        self.executor = executor
+        self.metrics = metrics
+        self.log = logger
+        self.interval = interval
+        # Nothing is cached by the kernel, while the filesystem isn't mounted.
+        self.running = False
+        # Both are used as ordered sets.
+        self.inodes = OrderedDict()
+        self.entries = OrderedDict()
+
+    def inode(self, inode):
+        """ Invalidates the attributes and the content of inode.
+
+        """
+        if self.running:
+            self.inodes[inode] = None
+
+    def entry(self, parent_inode, name):
+        """ Invalidates the entry name in the directory parent_inode, e.g. after it was added or removed.
+
+        """
+        if self.running:
+            self.entries[(parent_inode, name)] = None
+
+    async def run(self):
+        """ Sends the collected changes every interval, until cancelled.
+
+        """
+        self.running = True
+        try:
+            while True:
+                await trio.sleep(self.interval)
+                await self.flush()
+        finally:
+            self.running = False
+            self.inodes.clear()
+            self.entries.clear()
+
+    async def flush(self):
+        if len(self.inodes) == 0 and len(self.entries) == 0:
+            return
+        inodes, self.inodes = list(self.inodes), OrderedDict()
+        entries, self.entries = list(self.entries), OrderedDict()
+        sent = await self.executor.run(_send, inodes, entries)
+        self.metrics.increment("invalidations", sent)
+        self.log.debug("Invalidated %d of %d inodes and entries.", sent, len(inodes) + len(entries))
+
+
+def _send(inodes, entries):
+    sent = 0
+    for parent_inode, name in entries:
+        try:
+            pyfuse3.invalidate_entry(parent_inode, name)
+            sent += 1
+        except OSError:
+            # The kernel doesn't know the entry.
+            pass
+    for inode in inodes:
+        try:
+            pyfuse3.invalidate_inode(inode)
+            sent += 1
+        except OSError:
+            pass
+    return sent
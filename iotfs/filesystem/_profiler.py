@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import threading
+import time
+
+import trio
+
+try:
+    from trio.lowlevel import add_instrument, remove_instrument
+except ImportError:
+    # trio < 0.15
+    from trio.hazmat import add_instrument, remove_instrument
+
+DEFAULT_RATE = 100
+MAX_RATE = 1000
+
+# CPU time of task steps outside of handlers, e.g. of adapters.
+OTHER = "<other>"
+# CPU time of the loop between task steps.
+LOOP = "<loop>"
+
+# time.thread_time is available since Python 3.7.
+_cpu_time = getattr(time, "thread_time", time.perf_counter)
+
+
+def _label(code):
+    return "{}:{}".format(os.path.basename(code.co_filename), code.co_name)
+
+
+def sample_stack(frame, operation_code):
+    """ Returns the functions of a stack from its root to frame and the running handler.
+    The handler is the function called by the innermost frame running operation_code.
+
+    """
+    stack = []
+    handler = None
+    callee = None
+    while frame is not None:
+        code = frame.f_code
+        if handler is None and code is operation_code and callee is not None:
+            handler = callee.co_name
+        stack.append(_label(code))
+        callee = code
+        frame = frame.f_back
+    stack.reverse()
+    return stack, handler
+
+
+class Profiler():
+
+    """
+    Profiler samples the stack of the thread running the trio loop at a fixed rate.
+    Samples are aggregated as collapsed stacks ("root;...;leaf count" per line), which tools like
+    flamegraph.pl read directly. Samples are biased towards points, where the loop releases the GIL.
+    So the CPU time of handlers is measured exactly instead: a trio instrument charges the CPU time of every
+    task step to the handler the task is running, see enter and exit.
+    It's started and stopped with the commands "start [rate]" and "stop". "reset" drops all results.
+
+    ...
+
+    Attributes
+    ----------
+    operation_code : code
+        the code object wrapping every handler, see iotfs.filesystem._fs.wrapper
+    logger : logging.logger
+        an already initialized logger instance
+
+    """
+
+    def __init__(self, operation_code, logger):
+        """
+        Parameters
+        ----------
+        operation_code : code
+            the code object wrapping every handler, see iotfs.filesystem._fs.wrapper
+        logger : logging.logger
+            an already initialized logger instance
+        """
+
+        self.operation_code = operation_code
+        self.log = logger
+        self.lock = threading.Lock()
+        self.stacks = dict()
+        self.samples = 0
+        self.thread = None
+        self.stopped = threading.Event()
+        # handler -> CPU seconds
+        self.cpu = dict()
+        self.instrument = None
+
+    def is_running(self):
+        return self.thread is not None
+
+    def start(self, rate=DEFAULT_RATE, thread_id=None):
+        """ Starts sampling thread_id rate times per second. By default the calling thread is sampled.
+        Called inside of trio.run, the CPU time of handlers is measured, too.
+
+        """
+        if rate <= 0 or rate > MAX_RATE:
+            raise ValueError("Rate needs to be between 1 and {} samples per second.".format(MAX_RATE))
+        self.stop()
+        if thread_id is None:
+            thread_id = threading.get_ident()
+            try:
+                self.instrument = _CPUInstrument(self.cpu)
+                add_instrument(self.instrument)
+            except RuntimeError:
+                # Not called inside of trio.run.
+                self.instrument = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.__sample, args=(thread_id, 1.0 / rate, self.stopped),
+                                       name="Profiler", daemon=True)
+        self.thread.start()
+        self.log.info("Profiling thread %d with %d samples per second.", thread_id, rate)
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stopped.set()
+        self.thread.join()
+        self.thread = None
+        if self.instrument is not None:
+            remove_instrument(self.instrument)
+            self.instrument = None
+        self.log.info("Profiled %d samples.\n%s", self.samples, self.attribution())
+
+    def reset(self):
+        with self.lock:
+            self.stacks = dict()
+            self.samples = 0
+        self.cpu.clear()
+
+    def enter(self, handler):
+        """ Marks the start of a handler in the running task. Returns a token to pass to exit.
+
+        """
+        if self.instrument is None:
+            return None
+        return self.instrument.switch(handler)
+
+    def exit(self, token):
+        if token is not None and self.instrument is not None:
+            self.instrument.switch(token)
+
+    def control(self, command):
+        """ Runs a command written to the control file or set as extended attribute.
+
+        """
+        if isinstance(command, bytes):
+            command = command.decode("utf-8")
+        parts = command.split()
+        if len(parts) == 0:
+            return
+        if parts[0] == "start" and len(parts) <= 2:
+            self.start(rate=int(parts[1]) if len(parts) == 2 else DEFAULT_RATE)
+        elif parts == ["stop"]:
+            self.stop()
+        elif parts == ["reset"]:
+            self.reset()
+        else:
+            raise ValueError("Unknown profiler command: {}".format(command))
+
+    def collapsed(self):
+        """ Returns the sampled stacks in collapsed format.
+
+        """
+        with self.lock:
+            stacks = sorted(self.stacks.items())
+        return "".join("{} {}\n".format(stack, count) for stack, count in stacks)
+
+    def attribution(self):
+        """ Returns a line with the CPU seconds and their share for every handler, most expensive first.
+
+        """
+        handlers = sorted(self.cpu.items(), key=lambda item: (-item[1], item[0]))
+        total = sum(self.cpu.values())
+        return "".join("{} {:.6f} {:.1%}\n".format(handler, seconds, seconds / total) for handler, seconds in handlers
+                       if total > 0)
+
+    def __sample(self, thread_id, interval, stopped):
+        while not stopped.wait(interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                self.log.warning("Profiled thread %d has ended.", thread_id)
+                return
+            stack, _ = sample_stack(frame, self.operation_code)
+            del frame
+            collapsed = ";".join(stack)
+            with self.lock:
+                self.stacks[collapsed] = self.stacks.get(collapsed, 0) + 1
+                self.samples += 1
+
+
+class _CPUInstrument(trio.abc.Instrument):
+
+    """
+    _CPUInstrument charges the CPU time of the trio thread to the handler running at that time.
+    A task suspended inside of a handler continues to be charged to it in its next step.
+
+    """
+
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.handler = LOOP
+        self.started = _cpu_time()
+        # task -> handler, for tasks suspended inside of a handler
+        self.suspended = dict()
+
+    def switch(self, handler):
+        """ Charges the CPU time since the last switch to the current handler and makes handler the current one.
+        Returns the previous handler.
+
+        """
+        now = _cpu_time()
+        self.cpu[self.handler] = self.cpu.get(self.handler, 0.0) + now - self.started
+        self.started = now
+        previous = self.handler
+        self.handler = handler
+        return previous
+
+    def before_task_step(self, task):
+        self.switch(self.suspended.pop(task, OTHER))
+
+    def after_task_step(self, task):
+        handler = self.switch(LOOP)
+        if handler != OTHER:
+            self.suspended[task] = handler
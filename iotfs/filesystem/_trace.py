@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import struct
+import time
+from enum import Enum
+
+import pyfuse3
+
+MAGIC = b"IOTFSTR1"
+
+# Operations are stored by their index, new operations need to be appended.
+OPERATIONS = ("getattr", "setattr", "setxattr", "getxattr", "lookup", "open", "read", "create", "write", "access",
+              "release", "unlink", "flush", "forget", "fsync", "rename", "symlink", "readlink", "link", "mknod",
+              "mkdir", "opendir", "readdir", "rmdir", "releasedir", "fsyncdir", "statfs", "listxattr",
+              "removexattr", "apply_updates")
+OPERATION_CODES = dict((operation, code) for code, operation in enumerate(OPERATIONS))
+
+# Index of the argument of an operation, whose content is not recorded, only its length.
+PAYLOADS = {"write": 2, "setxattr": 2}
+
+# Index of the argument of an operation, which is only valid during the call.
+TOKENS = {"readdir": 2}
+
+# operation, start, duration in ns, errno, inode of the result, amount of arguments
+_RECORD = struct.Struct("!BdqHqB")
+_INT = struct.Struct("!q")
+_LENGTH = struct.Struct("!I")
+_ATTRIBUTES = struct.Struct("!6q")
+ATTRIBUTE_NAMES = ("st_mode", "st_size", "st_uid", "st_gid", "st_atime_ns", "st_mtime_ns")
+FIELD_NAMES = ("update_size", "update_mode", "update_uid", "update_gid", "update_atime", "update_mtime")
+
+# errno of exceptions, which aren't a FUSEError
+UNKNOWN_ERROR = 0xFFFF
+
+
+class Payload():
+
+    """
+    Payload stands for recorded data, of which only the length is known.
+
+    """
+
+    def __init__(self, length):
+        self.length = length
+
+    def __eq__(self, other):
+        return isinstance(other, Payload) and other.length == self.length
+
+    def __repr__(self):
+        return "Payload({})".format(self.length)
+
+
+class Fields():
+
+    """
+    Fields replaces pyfuse3.SetattrFields in a replay, as the attributes of the latter are read-only.
+
+    """
+
+    def __init__(self, **fields):
+        for name in FIELD_NAMES:
+            setattr(self, name, fields.get(name, False))
+
+
+def hash_name(name):
+    return hashlib.sha1(name).hexdigest()[:16].encode()
+
+
+def hash_path(path):
+    return b"/".join(hash_name(part) if part else part for part in path.split(b"/"))
+
+
+def result_inode(result):
+    """ Returns the inode of an entry returned by a handler or 0.
+
+    """
+    if isinstance(result, tuple) and len(result) == 2:
+        result = result[1]
+    return getattr(result, "st_ino", 0) if isinstance(result, pyfuse3.EntryAttributes) else 0
+
+
+def result_handle(result):
+    """ Returns the file handle returned by open or create or None.
+
+    """
+    if isinstance(result, pyfuse3.FileInfo):
+        return result.fh
+    if isinstance(result, tuple) and len(result) == 2 and isinstance(result[1], pyfuse3.EntryAttributes):
+        return result[0]
+    return None
+
+
+class TraceWriter():
+
+    """
+    TraceWriter records operations of a filesystem into a compact binary file.
+    The trace starts with the mountpoint, as symbolic links refer to it. Every record contains the operation, its
+    start relative to the start of the trace, its duration, the errno of a failed operation, the inode of a returned
+    entry and the arguments.
+    Integers, names, entry attributes and setattr fields are recorded. Written data and payloads of applied updates
+    are recorded by their length only.
+    Request contexts and readdir tokens are recorded as None.
+
+    ...
+
+    Attributes
+    ----------
+    path : str
+        a path of the trace file
+    mount_point : str
+        the mountpoint of the traced filesystem
+    hash_names : bool, optional
+        whether names and paths are replaced by hashes. Equal names keep equal hashes.
+
+    """
+
+    def __init__(self, path, mount_point, hash_names=False):
+        """
+        Parameters
+        ----------
+        path : str
+            a path of the trace file
+        mount_point : str
+            the mountpoint of the traced filesystem
+        hash_names : bool, optional
+            whether names and paths are replaced by hashes. Equal names keep equal hashes.
+        """
+
+        self.path = path
+        self.hash_names = hash_names
+        self.file = open(path, "wb", buffering=1 << 20)
+        self.file.write(MAGIC)
+        encoded = []
+        self.__encode(mount_point, encoded)
+        self.file.write(b"".join(encoded))
+        self.started = time.perf_counter()
+        self.records = 0
+
+    def now(self):
+        return time.perf_counter() - self.started
+
+    def record(self, operation, args, start, duration, error=0, inode=0, handle=None):
+        """ Records an operation. start and duration are seconds, start relative to the start of the trace.
+        A file handle returned by open or create is recorded as an additional last argument.
+
+        """
+        if self.file.closed:
+            return
+        if handle is not None:
+            args = list(args) + [handle]
+        payload = PAYLOADS.get(operation)
+        if operation == "apply_updates":
+            updates = [(update, path, Payload(len(data) if data is not None else 0)) for update, path, data in args[0]]
+            args = [updates] + list(args[1:])
+        encoded = [_RECORD.pack(OPERATION_CODES[operation], start, int(duration * 1e9), error, inode, len(args))]
+        token = TOKENS.get(operation)
+        for idx, arg in enumerate(args):
+            if idx == token:
+                encoded.append(b"N")
+            elif idx == payload:
+                encoded.append(b"z" + _LENGTH.pack(len(arg)))
+            else:
+                self.__encode(arg, encoded)
+        self.file.write(b"".join(encoded))
+        self.records += 1
+
+    def __encode(self, arg, encoded):
+        if isinstance(arg, Enum):
+            arg = arg.value
+        if isinstance(arg, int):
+            encoded.append(b"i" + _INT.pack(arg))
+        elif isinstance(arg, Payload):
+            encoded.append(b"z" + _LENGTH.pack(arg.length))
+        elif isinstance(arg, (bytes, str)):
+            tag = b"b"
+            if isinstance(arg, str):
+                tag = b"u"
+                arg = os.fsencode(arg)
+            if self.hash_names:
+                arg = hash_path(arg)
+            encoded.append(tag + _LENGTH.pack(len(arg)) + arg)
+        elif isinstance(arg, (list, tuple)):
+            encoded.append(b"l" + _LENGTH.pack(len(arg)))
+            for item in arg:
+                self.__encode(item, encoded)
+        elif isinstance(arg, pyfuse3.EntryAttributes):
+            encoded.append(b"a" + _ATTRIBUTES.pack(*[getattr(arg, name, 0) or 0 for name in ATTRIBUTE_NAMES]))
+        elif isinstance(arg, (pyfuse3.SetattrFields, Fields)):
+            flags = 0
+            for bit, name in enumerate(FIELD_NAMES):
+                if getattr(arg, name):
+                    flags |= 1 << bit
+            encoded.append(b"s" + bytes([flags]))
+        else:
+            encoded.append(b"N")
+
+    def close(self):
+        self.file.close()
+
+
+def _decode(buffer, offset):
+    tag = buffer[offset:offset + 1]
+    offset += 1
+    if tag == b"N":
+        return None, offset
+    if tag == b"i":
+        return _INT.unpack_from(buffer, offset)[0], offset + _INT.size
+    if tag in (b"b", b"u", b"z", b"l"):
+        (length,) = _LENGTH.unpack_from(buffer, offset)
+        offset += _LENGTH.size
+        if tag == b"z":
+            return Payload(length), offset
+        if tag == b"l":
+            items = []
+            for _ in range(length):
+                item, offset = _decode(buffer, offset)
+                items.append(item)
+            return items, offset
+        value = bytes(buffer[offset:offset + length])
+        return value if tag == b"b" else os.fsdecode(value), offset + length
+    if tag == b"a":
+        attr = pyfuse3.EntryAttributes()
+        for name, value in zip(ATTRIBUTE_NAMES, _ATTRIBUTES.unpack_from(buffer, offset)):
+            setattr(attr, name, value)
+        return attr, offset + _ATTRIBUTES.size
+    if tag == b"s":
+        flags = buffer[offset]
+        fields = dict((name, bool(flags & (1 << bit))) for bit, name in enumerate(FIELD_NAMES))
+        return Fields(**fields), offset + 1
+    raise ValueError("Unknown tag {} at {}.".format(tag, offset - 1))
+
+
+def read_trace(path):
+    """ Reads the records of a trace file.
+
+    Returns
+    -------
+    tuple
+        the mountpoint and a list of records. Records are tuples of operation, start, duration in seconds, errno,
+        inode of the result and a list of arguments.
+    """
+    with open(path, "rb") as f:
+        buffer = f.read()
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError("{} is no trace file.".format(path))
+    records = []
+    mount_point, offset = _decode(buffer, len(MAGIC))
+    while offset < len(buffer):
+        code, start, duration, error, inode, count = _RECORD.unpack_from(buffer, offset)
+        offset += _RECORD.size
+        args = []
+        for _ in range(count):
+            arg, offset = _decode(buffer, offset)
+            args.append(arg)
+        records.append((OPERATIONS[code], start, duration / 1e9, error, inode, args))
+    return mount_point, records
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import threading
+import time
+import traceback
+
+import trio
+
+DEFAULT_THRESHOLD = 1.0
+
+
+def find_operation(frame, operation_code):
+    """ Returns the name and the arguments of the innermost handler on the stack of frame or None.
+
+    """
+    callee = None
+    while frame is not None:
+        if frame.f_code is operation_code and callee is not None:
+            return callee.co_name, frame.f_locals.get("args", ())
+        callee = frame.f_code
+        frame = frame.f_back
+    return None
+
+
+class Watchdog():
+
+    """
+    Watchdog detects stalls of the trio loop, e.g. a handler running for seconds without giving control back.
+    A task of the loop updates a heartbeat. A thread checks it and reports a stall, when the heartbeat is older
+    than threshold: the running handler and its inode, the stack of the loop and the duration, once the loop
+    progresses again. Stalls are counted in total and by handler as metrics.
+
+    ...
+
+    Attributes
+    ----------
+    operation_code : code
+        the code object wrapping every handler, see iotfs.filesystem._fs.wrapper
+    metrics : iotfs.utils._metrics.Metrics
+        metrics, in which stalls are counted
+    logger : logging.logger
+        an already initialized logger instance
+    threshold : float, optional
+        seconds without progress of the loop, which are reported as stall
+
+    """
+
+    def __init__(self, operation_code, metrics, logger, threshold=DEFAULT_THRESHOLD):
+        """
+        Parameters
+        ----------
+        operation_code : code
+            the code object wrapping every handler, see iotfs.filesystem._fs.wrapper
+        metrics : iotfs.utils._metrics.Metrics
+            metrics, in which stalls are counted
+        logger : logging.logger
+            an already initialized logger instance
+        threshold : float, optional
+            seconds without progress of the loop, which are reported as stall
+        """
+
+        self.operation_code = operation_code
+        self.metrics = metrics
+        self.log = logger
+        self.threshold = threshold
+        self.beat = time.monotonic()
+        # (handler, inode) of the last stall
+        self.last_stall = None
+
+    async def run(self):
+        """ Beats and watches the loop, until cancelled.
+
+        """
+        thread_id = threading.get_ident()
+        stopped = threading.Event()
+        thread = threading.Thread(target=self.__watch, args=(thread_id, stopped), name="Watchdog", daemon=True)
+        self.beat = time.monotonic()
+        thread.start()
+        try:
+            while True:
+                self.beat = time.monotonic()
+                await trio.sleep(self.threshold / 4)
+        finally:
+            stopped.set()
+            thread.join()
+
+    def __watch(self, thread_id, stopped):
+        stalled = None
+        while not stopped.wait(self.threshold / 4):
+            beat = self.beat
+            if stalled is not None:
+                if beat != stalled:
+                    self.__resolved(time.monotonic() - stalled)
+                    stalled = None
+                continue
+            if time.monotonic() - beat > self.threshold:
+                stalled = beat
+                self.__stalled(thread_id, time.monotonic() - beat)
+
+    def __stalled(self, thread_id, duration):
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            return
+        operation = find_operation(frame, self.operation_code)
+        stack = "".join(traceback.format_stack(frame))
+        del frame
+        handler, inode = "<other>", None
+        if operation is not None:
+            handler = operation[0]
+            args = operation[1]
+            if len(args) > 1 and isinstance(args[1], int):
+                inode = args[1]
+        self.last_stall = (handler, inode)
+        self.metrics.increment("stalls")
+        self.metrics.increment("stalls." + handler)
+        self.log.error("Loop stalled for %.3f seconds in %s of inode %s:\n%s", duration, handler, inode, stack)
+
+    def __resolved(self, duration):
+        self.metrics.increment("stall_seconds", duration)
+        self.log.warning("Loop progressed after a stall of %.3f seconds in %s of inode %s.", duration,
+                         *self.last_stall)
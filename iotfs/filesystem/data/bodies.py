@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+from collections import OrderedDict
+
+import trio
+
+from iotfs.filesystem.data.node import has_body
+from iotfs.utils import _logging
+
+
+class BodyCache():
+
+    """
+    BodyCache keeps the bodies of regular files within a memory budget.
+    Files report written, compressed, spilled and restored bodies, so the cache knows the resident bytes and their
+    LRU order.
+    Once the budget is exceeded, the least recently used bodies are spilled into files of directory and dropped
+    from memory. Metadata stays in memory. With an executor, run writes the spilled bodies in its workers, so the
+    budget may be exceeded until they're written. Without one, bodies are spilled right away.
+    A spilled body is read back on its next access, reads do so in a worker of the executor. A body keeps its copy on
+    disk until it's written again, so spilling it once more is free.
+    The most recently used body is never spilled, even if it exceeds the budget on its own.
+    Bodies shared through store are charged once: when their first reference becomes resident and when their last
+    one is spilled or dropped, as spilling any other reference frees no memory.
+    Hits and misses of reads, spills and the resident bytes are counted in metrics.
+
+    ...
+
+    Attributes
+    ----------
+    budget : int, optional
+        maximum amount of resident bytes of all bodies, None is unlimited
+    directory : str, optional
+        directory of the spilled bodies, a temporary directory is created on the first spill by default
+    metrics : iotfs.utils._metrics.Metrics, optional
+        metrics, in which hits, misses and spills are counted
+    executor : iotfs.filesystem._executor.Executor, optional
+        runs the writes of spilled bodies, see run
+    store : iotfs.filesystem.data.dedup.BodyStore, optional
+        the store sharing equal bodies, which has to be told about changes first
+    logger : logging.logger, optional
+        an already initialized logger instance
+
+    """
+
+    def __init__(self, budget=None, directory=None, metrics=None, executor=None, store=None, logger=None):
+        """
+        Parameters
+        ----------
+        budget : int, optional
+            maximum amount of resident bytes of all bodies, None is unlimited
+        directory : str, optional
+            directory of the spilled bodies, a temporary directory is created on the first spill by default
+        metrics : iotfs.utils._metrics.Metrics, optional
+            metrics, in which hits, misses and spills are counted
+        executor : iotfs.filesystem._executor.Executor, optional
+            runs the writes of spilled bodies, see run
+        store : iotfs.filesystem.data.dedup.BodyStore, optional
+            the store sharing equal bodies, which has to be told about changes first
+        logger : logging.logger, optional
+            an already initialized logger instance
+        """
+
+        if logger is not None:
+            self.log = logger
+        else:
+            self.log = _logging.create_logger("BodyCache", debug=True)
+        self.budget = budget
+        self.directory = directory
+        self.metrics = metrics
+        self.executor = executor
+        self.store = store
+        # inode -> (node, length of its resident body, key of its charge), least recently used first
+        self.resident = OrderedDict()
+        # key -> amount of resident bodies charged once, keys are digests of shared bodies or inodes
+        self.charges = dict()
+        self.size = 0
+        # inode -> path, to which its body is written by a worker. Writes and removals of the body drop it.
+        self.writing = dict()
+        # Set, when run waits for the budget to be exceeded.
+        self.exceeded = None
+
+    def configure(self, budget, directory=None):
+        """ Sets the budget and spills bodies until it's kept.
+
+        """
+        if budget is not None and budget < 0:
+            raise ValueError("Invalid memory budget: {}".format(budget))
+        self.budget = budget
+        if directory is not None:
+            self.directory = directory
+        self.__enforce()
+
+    def added(self, inode, node):
+        if has_body(node) and node.is_resident():
+            self.__account(inode, node, node.get_body_size())
+            self.__enforce()
+
+    def changed(self, inode, node, attribute, previous, value):
+        """ Accounts the bodies of nodes, which were written (data), compressed or spilled and restored (resident).
+
+        """
+        if not has_body(node):
+            return
+        if attribute == "data":
+            # The copy on disk is outdated.
+            self.writing.pop(inode, None)
+            self.__remove_spilled(node)
+            self.__account(inode, node, value)
+        elif attribute == "compressed":
+            # Compressing doesn't use a body, it keeps its place in the LRU order.
+            self.__account(inode, node, value, touch=False)
+        elif value:
+            self.__increment("misses")
+            self.__account(inode, node, node.get_body_size())
+        else:
+            self.__release(inode)
+            return
+        self.__enforce()
+
+    def removed_node(self, inode, node):
+        if not has_body(node):
+            return
+        self.writing.pop(inode, None)
+        self.__release(inode)
+        self.__remove_spilled(node)
+
+    def is_spilled(self, node):
+        return has_body(node) and not node.is_resident()
+
+    async def fault(self, inode, node, executor):
+        """ Makes sure the body of node is resident before a read. Spilled bodies are read by a worker of executor.
+
+        """
+        if not self.is_spilled(node):
+            if inode in self.resident:
+                self.__increment("hits")
+                self.resident.move_to_end(inode)
+            return
+        path = node.spill_path
+        try:
+            data = await executor.run(_read, path)
+        except OSError as e:
+            # The body has been written or removed meanwhile.
+            self.log.debug("Spilled body of inode %d is gone: %s", inode, e)
+            return
+        if not node.is_resident() and node.spill_path == path:
+            node.restore(data)
+
+    def __account(self, inode, node, length, touch=True):
+        key = self.__key(inode)
+        if not touch and inode in self.resident:
+            self.__uncharge(*self.resident[inode][1:])
+            self.resident[inode] = (node, length, key)
+            self.__charge(length, key)
+            return
+        self.__release(inode)
+        if length > 0:
+            self.resident[inode] = (node, length, key)
+            self.__charge(length, key)
+
+    def __key(self, inode):
+        digest = self.store.digests.get(inode) if self.store is not None else None
+        return inode if digest is None else digest
+
+    def __charge(self, length, key):
+        count = self.charges.get(key, 0)
+        if count == 0:
+            self.size += length
+        self.charges[key] = count + 1
+        self.__gauge()
+
+    def __uncharge(self, length, key):
+        count = self.charges.pop(key) - 1
+        if count > 0:
+            self.charges[key] = count
+        else:
+            self.size -= length
+        self.__gauge()
+
+    def __release(self, inode):
+        item = self.resident.pop(inode, None)
+        if item is not None:
+            self.__uncharge(item[1], item[2])
+
+    async def run(self):
+        """ Spills the least recently used bodies, whenever the budget is exceeded, until cancelled.
+        Bodies are written by workers of the executor.
+
+        """
+        while True:
+            self.exceeded = trio.Event()
+            if not self.__is_exceeded():
+                await self.exceeded.wait()
+            while self.__is_exceeded():
+                inode, (node, _, _) = next(iter(self.resident.items()))
+                if node.spill_path is None:
+                    path = self.__spill_path(inode)
+                    self.writing[inode] = path
+                    try:
+                        await self.executor.run(_write, path, node.get_data())
+                    except OSError as e:
+                        self.log.error("Spilling body of inode %d failed: %s", inode, e)
+                        self.writing.pop(inode, None)
+                        await trio.sleep(1)
+                        break
+                    if self.writing.pop(inode, None) != path:
+                        # The body was written or removed meanwhile.
+                        await self.executor.run(_remove, path)
+                        continue
+                    node.spill_path = path
+                # Bodies used meanwhile keep their copy on disk for their next spill.
+                if inode in self.resident and next(iter(self.resident)) == inode:
+                    self.__spill(inode, node)
+
+    def __is_exceeded(self):
+        return self.budget is not None and self.size > self.budget and len(self.resident) > 1
+
+    def __enforce(self):
+        if not self.__is_exceeded():
+            return
+        if self.executor is not None:
+            if self.exceeded is not None:
+                self.exceeded.set()
+            return
+        while self.__is_exceeded():
+            inode, (node, _, _) = next(iter(self.resident.items()))
+            try:
+                if node.spill_path is None:
+                    path = self.__spill_path(inode)
+                    _write(path, node.get_data())
+                    node.spill_path = path
+            except OSError as e:
+                self.log.error("Spilling body of inode %d failed: %s", inode, e)
+                return
+            self.__spill(inode, node)
+
+    def __spill_path(self, inode):
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix="iotfs-bodies-")
+        return os.path.join(self.directory, str(inode))
+
+    def __spill(self, inode, node):
+        self.log.debug("Spill body of inode %d.", inode)
+        node.spill()
+        self.__release(inode)
+        self.__increment("spills")
+
+    def __remove_spilled(self, node):
+        if node.spill_path is None:
+            return
+        try:
+            os.remove(node.spill_path)
+        except OSError as e:
+            self.log.warning("Removing spilled body %s failed: %s", node.spill_path, e)
+        node.spill_path = None
+
+    def __increment(self, name):
+        if self.metrics is not None:
+            self.metrics.increment("bodies." + name)
+
+    def __gauge(self):
+        if self.metrics is not None:
+            self.metrics.set("bodies.resident", self.size)
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,486 @@
+# -*- coding: utf-8 -*-
+
+import lzma
+import time
+import zlib
+from collections import OrderedDict
+
+import trio
+
+from iotfs.filesystem.data.metadata_index import parse_size
+from iotfs.filesystem.data.node import has_body
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+DEFAULT_CACHE_SIZE = 4 * 1024 * 1024
+DEFAULT_INTERVAL = 1.0
+DEFAULT_BATCH = 100
+
+# Bodies are kept raw, unless compressing saves at least a tenth.
+_MIN_SAVING = 0.1
+
+CODECS = {
+    "zlib": (lambda block, level: zlib.compress(block, level), zlib.decompress),
+    "lzma": (lambda block, level: lzma.compress(block, preset=level), lzma.decompress),
+}
+
+_DEFAULT_LEVELS = {"zlib": 6, "lzma": 6}
+_OPTIONS = ("codec", "level", "min_age", "min_size")
+
+
+class CompressedBody():
+
+    """
+    CompressedBody is the body of a file as independently compressed blocks of block_size raw bytes.
+    Reads of a range decompress only the blocks they touch.
+
+    ...
+
+    Attributes
+    ----------
+    codec : str
+        name of the codec of CODECS
+    blocks : list
+        compressed blocks
+    length : int
+        raw bytes of the body
+    block_size : int
+        raw bytes of every block, except the last one
+
+    """
+
+    def __init__(self, codec, blocks, length, block_size):
+        """
+        Parameters
+        ----------
+        codec : str
+            name of the codec of CODECS
+        blocks : list
+            compressed blocks
+        length : int
+            raw bytes of the body
+        block_size : int
+            raw bytes of every block, except the last one
+        """
+
+        self.codec = codec
+        self.blocks = blocks
+        self.length = length
+        self.block_size = block_size
+        self.size = sum(len(block) for block in blocks)
+
+    @classmethod
+    def compress(cls, data, codec="zlib", level=None, block_size=DEFAULT_BLOCK_SIZE):
+        compress = CODECS[codec][0]
+        if level is None:
+            level = _DEFAULT_LEVELS[codec]
+        blocks = [compress(data[off:off + block_size], level) for off in range(0, len(data), block_size)]
+        return cls(codec, blocks, len(data), block_size)
+
+    def decompress_block(self, idx):
+        return CODECS[self.codec][1](self.blocks[idx])
+
+    def decompress(self):
+        return b"".join(self.decompress_block(idx) for idx in range(len(self.blocks)))
+
+    def block_range(self, off, size):
+        """ Returns the indexes of the blocks holding size bytes from off.
+
+        """
+        end = min(off + size, self.length)
+        if off >= end:
+            return range(0)
+        return range(off // self.block_size, (end - 1) // self.block_size + 1)
+
+
+class CompressionRule():
+
+    """
+    CompressionRule compresses the files below a directory, which were not written for min_age seconds
+    or have at least min_size bytes. Without both limits, every file is compressed right away.
+
+    ...
+
+    Attributes
+    ----------
+    path : str
+        a path of the directory relative to the root entry
+    codec : str, optional
+        name of the codec, zlib or lzma
+    level : int, optional
+        compression level of the codec
+    min_age : float, optional
+        seconds since the last write, after which files are compressed
+    min_size : int, optional
+        bytes, from which on files are compressed right away
+
+    """
+
+    def __init__(self, path, codec="zlib", level=None, min_age=None, min_size=None):
+        """
+        Parameters
+        ----------
+        path : str
+            a path of the directory relative to the root entry
+        codec : str, optional
+            name of the codec, zlib or lzma
+        level : int, optional
+            compression level of the codec
+        min_age : float, optional
+            seconds since the last write, after which files are compressed
+        min_size : int, optional
+            bytes, from which on files are compressed right away
+
+        Raises
+        ------
+        ValueError
+            If the codec is unknown.
+        """
+
+        if codec not in CODECS:
+            raise ValueError("Unknown codec: {}".format(codec))
+        self.path = path.strip("/")
+        self.codec = codec
+        self.level = level if level is not None else _DEFAULT_LEVELS[codec]
+        self.min_age = min_age
+        self.min_size = min_size
+        self.inode = None
+        # inode -> time of the last write, oldest first
+        self.pending = OrderedDict()
+
+    def is_large(self, node):
+        return self.min_size is not None and node.size is not None and node.size >= self.min_size
+
+    def is_due(self, age):
+        """ Whether a file, which was not written for age seconds, is compressed.
+
+        """
+        if self.min_age is not None:
+            return age >= self.min_age
+        return self.min_size is None
+
+    def __str__(self):
+        options = "".join(" {}={}".format(name, getattr(self, name)) for name in _OPTIONS
+                          if getattr(self, name) is not None)
+        return "{}{}".format(self.path or ".", options)
+
+
+def parse_rules(text):
+    """ Parses a line "path [codec=zlib|lzma] [level=n] [min_age=seconds] [min_size=size]" per rule.
+    Sizes may have a unit k, M or G. A path with codec=none drops its rule.
+
+    Raises
+    ------
+    ValueError
+        If a line is invalid.
+    """
+    if isinstance(text, bytes):
+        text = text.decode("utf-8")
+    rules = []
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) == 0:
+            continue
+        options = dict()
+        for part in parts[1:]:
+            name, _, value = part.partition("=")
+            if name not in _OPTIONS or value == "":
+                raise ValueError("Invalid option: {}".format(part))
+            if name == "min_age":
+                options[name] = float(value)
+            elif name == "min_size":
+                options[name] = parse_size(value)
+            elif name == "level":
+                options[name] = int(value)
+            else:
+                options[name] = value
+        if options.get("codec") == "none":
+            rules.append((parts[0], None))
+        else:
+            rules.append((parts[0], CompressionRule(parts[0], **options)))
+    return rules
+
+
+class Compression():
+
+    """
+    Compression compresses the bodies of files below directories with compression rules inside of
+    iotfs.filesystem.data.data.Data. Written files are queued in the order of their last write, so the files due
+    for compression are taken from the front of the queue. Bodies are compressed block-wise by a background task,
+    by a worker of executor. A write replaces the compressed body with the raw one again.
+    Every rule has its own queue, large files are queued apart, as they are due right away.
+    Reads decompress only the blocks they touch, recently read blocks are kept decompressed up to cache_size bytes.
+
+    ...
+
+    Attributes
+    ----------
+    data : iotfs.filesystem.data.data.Data
+        the data, whose files are compressed
+    block_size : int, optional
+        raw bytes of a compressed block
+    cache_size : int, optional
+        maximum amount of bytes of all decompressed blocks
+    executor : iotfs.filesystem._executor.Executor, optional
+        the executor compressing the bodies, without one bodies are compressed by the loop
+    metrics : iotfs.utils._metrics.Metrics, optional
+        metrics, in which compressed bytes and block reads are counted
+
+    """
+
+    def __init__(self, data, block_size=DEFAULT_BLOCK_SIZE, cache_size=DEFAULT_CACHE_SIZE, executor=None,
+                 metrics=None):
+        """
+        Parameters
+        ----------
+        data : iotfs.filesystem.data.data.Data
+            the data, whose files are compressed
+        block_size : int, optional
+            raw bytes of a compressed block
+        cache_size : int, optional
+            maximum amount of bytes of all decompressed blocks
+        executor : iotfs.filesystem._executor.Executor, optional
+            the executor compressing the bodies, without one bodies are compressed by the loop
+        metrics : iotfs.utils._metrics.Metrics, optional
+            metrics, in which compressed bytes and block reads are counted
+        """
+
+        self.data = data
+        self.block_size = block_size
+        self.cache_size = cache_size
+        self.executor = executor
+        self.metrics = metrics
+        # directory inode -> CompressionRule
+        self.rules = dict()
+        # Large files below any rule, used as ordered set
+        self.large = OrderedDict()
+        # (inode, block index) -> decompressed block, least recently used first
+        self.blocks = OrderedDict()
+        self.blocks_size = 0
+        # inode -> indexes of its decompressed blocks
+        self.cached = dict()
+
+    def add_rule(self, rule):
+        """ Adds rule and replaces the rule of the same directory. Missing directories are created.
+        Files below the directory are queued.
+
+        """
+        rule.inode = self.data.make_dirs(rule.path).inode
+        self.rules[rule.inode] = rule
+        pending = [rule.inode]
+        while len(pending) > 0:
+            inode = pending.pop()
+            self.__queue(inode, self.data.nodes[inode])
+            pending.extend(self.data.children.get(inode, ()))
+        return rule
+
+    def remove_rule(self, path):
+        entry = self.data.get_entry_by_relative_path(path)
+        if entry is not None:
+            self.rules.pop(entry.inode, None)
+
+    def rule_of(self, inode):
+        """ Returns the rule of the nearest directory above inode or None.
+
+        """
+        if len(self.rules) == 0:
+            return None
+        parent = self.data.nodes[inode].parent
+        while parent is not None:
+            if parent in self.rules:
+                return self.rules[parent]
+            parent = self.data.nodes[parent].parent
+        return None
+
+    def added(self, inode, node):
+        self.__queue(inode, node)
+
+    def changed(self, inode, node, attribute, previous, value):
+        """ Queues written and restored bodies for compression again, their cached blocks are outdated.
+
+        """
+        if attribute == "data" or (attribute == "resident" and value):
+            self.__drop_blocks(inode)
+            self.__queue(inode, node)
+
+    def removed_node(self, inode, node):
+        self.rules.pop(inode, None)
+        self.large.pop(inode, None)
+        for rule in self.rules.values():
+            rule.pending.pop(inode, None)
+        self.__drop_blocks(inode)
+
+    def __queue(self, inode, node):
+        if not has_body(node) or node.compressed is not None:
+            return
+        rule = self.rule_of(inode)
+        if rule is None:
+            return
+        rule.pending.pop(inode, None)
+        self.large.pop(inode, None)
+        if rule.is_large(node):
+            self.large[inode] = None
+        elif rule.min_age is not None or rule.min_size is None:
+            rule.pending[inode] = time.monotonic()
+
+    def due(self, now=None, limit=DEFAULT_BATCH):
+        """ Removes at most limit of the files due for compression from the queues.
+
+        Returns
+        -------
+        list
+            inodes, nodes, raw bodies and rules of the files
+        """
+        if now is None:
+            now = time.monotonic()
+        files = []
+        while len(files) < limit and len(self.large) > 0:
+            inode, _ = self.large.popitem(last=False)
+            self.__take(inode, None, files)
+        for rule in list(self.rules.values()):
+            while len(files) < limit and len(rule.pending) > 0:
+                inode, stamp = next(iter(rule.pending.items()))
+                if not rule.is_due(now - stamp):
+                    break
+                del rule.pending[inode]
+                self.__take(inode, rule, files)
+        return files
+
+    def __take(self, inode, rule, files):
+        node = self.data.nodes.get(inode)
+        # Spilled files are queued again once they are read back.
+        if node is None or not node.is_resident() or node.compressed is not None or node.size == 0:
+            return
+        current = self.rule_of(inode)
+        if current is None:
+            return
+        if rule is not None and current is not rule:
+            # Moved below another rule.
+            self.__queue(inode, node)
+            return
+        files.append((inode, node, node.get_data(), current))
+
+    def apply(self, files, bodies):
+        """ Replaces the raw bodies of files by their compressed bodies, unless they were written meanwhile.
+
+        """
+        compressed = 0
+        for (inode, node, data, rule), body in zip(files, bodies):
+            if self.data.nodes.get(inode) is not node or node.compressed is not None or not node.is_resident() or\
+                    node.data is not data:
+                continue
+            if body.size > len(data) * (1 - _MIN_SAVING):
+                continue
+            node.compress(body)
+            compressed += 1
+            self.__increment("compression.files")
+            self.__increment("compression.raw_bytes", len(data))
+            self.__increment("compression.compressed_bytes", body.size)
+        return compressed
+
+    async def compress(self, now=None, limit=DEFAULT_BATCH):
+        """ Compresses at most limit of the files due for compression.
+
+        """
+        files = self.due(now=now, limit=limit)
+        if len(files) == 0:
+            return 0
+        jobs = [(data, rule.codec, rule.level, self.block_size) for _, _, data, rule in files]
+        if self.executor is not None:
+            bodies = await self.executor.run(_compress_all, jobs)
+        else:
+            bodies = _compress_all(jobs)
+        return self.apply(files, bodies)
+
+    async def run(self, interval=DEFAULT_INTERVAL, batch=DEFAULT_BATCH):
+        """ Compresses the files due for compression every interval, until cancelled.
+
+        """
+        while True:
+            compressed = await self.compress(limit=batch)
+            if compressed >= batch:
+                await trio.sleep(0)
+            else:
+                await trio.sleep(interval)
+
+    def is_compressed(self, node):
+        return has_body(node) and node.compressed is not None
+
+    def read(self, inode, node, off, size):
+        """ Returns size bytes from off of the compressed body of node.
+
+        """
+        body = node.compressed
+        chunks = []
+        for idx in body.block_range(off, size):
+            chunks.append(self.__block(inode, body, idx))
+        if len(chunks) == 0:
+            return b""
+        skip = off - off // body.block_size * body.block_size
+        return b"".join(chunks)[skip:skip + size]
+
+    async def prefetch(self, inode, node, off, size):
+        """ Decompresses the blocks holding size bytes from off into the cache, e.g. to read them ahead.
+        Blocks are decompressed by a worker of executor.
+
+        """
+        body = node.compressed
+        missing = [idx for idx in body.block_range(off, size) if (inode, idx) not in self.blocks]
+        if len(missing) == 0:
+            return 0
+        if self.executor is not None:
+            blocks = await self.executor.run(_decompress_blocks, body, missing)
+        else:
+            blocks = _decompress_blocks(body, missing)
+        if self.data.nodes.get(inode) is not node or node.compressed is not body:
+            # Written meanwhile.
+            return 0
+        for idx, block in zip(missing, blocks):
+            if (inode, idx) not in self.blocks:
+                self.__cache(inode, idx, block)
+        self.__increment("compression.prefetched_blocks", len(missing))
+        return len(missing)
+
+    def __block(self, inode, body, idx):
+        key = (inode, idx)
+        block = self.blocks.get(key)
+        if block is not None:
+            self.blocks.move_to_end(key)
+            self.__increment("compression.block_hits")
+            return block
+        self.__increment("compression.block_misses")
+        block = body.decompress_block(idx)
+        self.__cache(inode, idx, block)
+        return block
+
+    def __cache(self, inode, idx, block):
+        key = (inode, idx)
+        if len(block) <= self.cache_size:
+            self.blocks[key] = block
+            self.blocks_size += len(block)
+            self.cached.setdefault(inode, set()).add(idx)
+            while self.blocks_size > self.cache_size:
+                (evicted, evicted_idx), evicted_block = self.blocks.popitem(last=False)
+                self.blocks_size -= len(evicted_block)
+                self.__uncache(evicted, evicted_idx)
+
+    def __uncache(self, inode, idx):
+        indexes = self.cached[inode]
+        indexes.discard(idx)
+        if len(indexes) == 0:
+            del self.cached[inode]
+
+    def __drop_blocks(self, inode):
+        for idx in self.cached.pop(inode, ()):
+            self.blocks_size -= len(self.blocks.pop((inode, idx)))
+
+    def __increment(self, name, amount=1):
+        if self.metrics is not None:
+            self.metrics.increment(name, amount)
+
+
+def _decompress_blocks(body, indexes):
+    return [body.decompress_block(idx) for idx in indexes]
+
+
+def _compress_all(jobs):
+    return [CompressedBody.compress(data, codec, level, block_size) for data, codec, level, block_size in jobs]
@@ -1,13 +1,30 @@
 # -*- coding: utf-8 -*-
 
+import errno
+import functools
 import os
+import time
+from collections import OrderedDict
 
-from iotfs.filesystem.data.node import File, Directory
+from iotfs.filesystem.data.node import File, Directory, VirtualFile, StreamFile
+from iotfs.filesystem.data.bodies import BodyCache
+from iotfs.filesystem.data.compression import Compression
+from iotfs.filesystem.data.dedup import BodyStore
 from iotfs.filesystem.data.entry import Entry, SymbolicEntry, HardlinkEntry
 
 from iotfs.filesystem.data.entry_dict import EntryDict
-
-from iotfs.utils._fs_utils import Types, Encodings, LinkTypes, ROOT_INODE, STANDARD_MODE, LINK_MODE
+from iotfs.filesystem.data.links import LinkCache
+from iotfs.filesystem.data.locks import LockTable
+from iotfs.filesystem.data.metadata_index import MetadataIndex, ATTRIBUTES
+from iotfs.filesystem.data.page_cache import PageCache
+from iotfs.filesystem.data.provider import ProviderCache, DEFAULT_CACHE_SIZE
+from iotfs.filesystem.data.retention import Retention
+from iotfs.filesystem.data.series import TimeSeries
+from iotfs.filesystem.data.snapshots import Snapshots
+from iotfs.filesystem.data.xattr_index import XattrIndex
+
+from iotfs.utils._fs_utils import Types, Encodings, LinkTypes, Updates, ROOT_INODE, STANDARD_MODE, LINK_MODE,\
+    VIRTUAL_MODE, SERIES_AGGREGATES, split_path
 from iotfs.utils import _logging
 
 
@@ -23,15 +40,19 @@ class Data():
     ----------
     logger : logging.logger
         an already initialized logger instance
+    cache_size : int, optional
+        maximum amount of bytes cached for virtual files
 
     """
 
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, cache_size=DEFAULT_CACHE_SIZE):
         """
         Parameters
         ----------
         logger : logging.logger
             an already initialized logger instance
+        cache_size : int, optional
+            maximum amount of bytes cached for virtual files
         """
 
         super().__init__()
@@ -42,17 +63,51 @@ class Data():
         self.entries = EntryDict(logger=self.log)
         self.nodes = dict()
         self.inode_entries_map = dict()
+        # parent inode -> child inodes, used as ordered set
+        self.children = dict()
+        # (inode of directory, name) -> entry
+        self.names = dict()
+        # Inodes of removed entries, whose nodes are freed once the kernel forgot them and released their handles.
+        self.removed = set()
+        # Sum of the sizes of all nodes, kept up to date by their observers.
+        self.total_size = 0
         self.inode_unique_count = 0
-
-    def add_entry(self, name, parent_inode, node_type=Types.FILE, data="", mode=STANDARD_MODE):
-        """ Adds a new entry and a new node.
+        self.providers = ProviderCache(max_size=cache_size, logger=self.log)
+        # directory inode -> iotfs.filesystem.data.series.TimeSeries
+        self.series = dict()
+        # Handlers lock the inodes they change, bulk updates lock everything.
+        self.locks = LockTable()
+        # Extended attributes of the nodes, browsable as query directories.
+        self.xattrs = XattrIndex()
+        # Sizes and modification times of the nodes, searched by find.
+        self.metadata = MetadataIndex()
+        # Told about changes, which the kernel didn't request, see iotfs.filesystem._invalidator.Invalidator.
+        self.invalidator = None
+        # Removes the oldest files of directories with retention rules.
+        self.retention = Retention(self)
+        # Files with equal bodies share them.
+        self.store = BodyStore()
+        # Spills bodies of files to disk beyond a memory budget, unlimited by default.
+        self.bodies = BodyCache(store=self.store, logger=self.log)
+        # Compresses the bodies of files below directories with compression rules.
+        self.compression = Compression(self)
+        # Frozen subtrees, which keep the state of nodes before their first change.
+        self.snapshots = Snapshots(self)
+        # Resolved targets of symbolic links.
+        self.links = LinkCache(self)
+        # Policies of the page cache of opened files.
+        self.page_cache = PageCache(self)
+
+    def add_entry(self, name, parent_inode, node_type=Types.FILE, data="", mode=STANDARD_MODE, node=None):
+        """ Adds a new entry and a new node. An already created node can be provided.
 
         """
         parent_entry = self.get_entry(parent_inode)
         path = parent_entry.get_full_path()
+        self.snapshots.preserve(parent_inode, children=True)
         entry = None
         try:
-            inode = self.__add_inode(parent_inode, node_type, data, mode)
+            inode = self.__add_inode(parent_inode, node_type, data, mode, node=node)
             self.log.debug(
                 "Create entry: inode %d, with path: %s, and name: %s", inode, path, name)
             entry = Entry(inode, name, path, parent=parent_entry)
@@ -62,6 +117,50 @@ class Data():
             self.entries[path] = []
         self.entries[path].append(entry)
         self.inode_entries_map[inode].append(entry)
+        self.names[(parent_inode, entry.name)] = entry
+        self.links.changed(parent_inode, entry.name)
+        return entry
+
+    def add_virtual_entry(self, name, parent_inode, provider, ttl=1.0, mode=VIRTUAL_MODE, writer=None, appends=True,
+                          lines=False, version=None, session=False):
+        """ Adds a new entry and a virtual file node, whose content is produced by provider.
+
+        """
+        node = VirtualFile(mode, provider, ttl=ttl, version=version, writer=writer, appends=appends, lines=lines,
+                           session=session, parent=parent_inode)
+        return self.add_entry(name, parent_inode, mode=mode, node=node)
+
+    def add_stream_entry(self, name, parent_inode, stream, mode=VIRTUAL_MODE):
+        """ Adds a new entry and a stream file node, which is read from stream.
+
+        """
+        node = StreamFile(mode, stream, parent=parent_inode)
+        return self.add_entry(name, parent_inode, mode=mode, node=node)
+
+    def add_series_entry(self, name, parent_inode, series=None, buckets=(), mode=STANDARD_MODE):
+        """ Adds a directory that represents a time series.
+
+        It contains the virtual files data (every sample as csv, writing to it appends samples),
+        count, min, max, mean and last. For each bucket width in seconds, buckets contains a csv file
+        with the rows: bucket start, min, max, mean, count.
+
+        """
+        if series is None:
+            series = TimeSeries()
+        entry = self.add_entry(name, parent_inode, node_type=Types.DIR, mode=mode)
+        self.series[entry.inode] = series
+        # Views are rendered once per version of the series, not on every read.
+        version = _version_provider(series)
+        self.add_virtual_entry("data", entry.inode, series.to_csv, ttl=None, version=version, mode=STANDARD_MODE,
+                               writer=series.parse, lines=True)
+        for aggregate in SERIES_AGGREGATES:
+            self.add_virtual_entry(aggregate, entry.inode, _aggregate_provider(series, aggregate), ttl=None,
+                                   version=version)
+        if len(buckets) > 0:
+            buckets_inode = self.add_entry("buckets", entry.inode, node_type=Types.DIR, mode=mode).inode
+            for bucket in buckets:
+                self.add_virtual_entry(str(bucket), buckets_inode, _bucket_provider(series, bucket), ttl=None,
+                                       version=version)
         return entry
 
     def add_link_entry(self, name, parent_inode, link_type, mode=STANDARD_MODE, link_path=None, target_inode=None):
@@ -73,6 +172,7 @@ class Data():
         self.log.debug(parent_entry)
         path = parent_entry.get_full_path()
         self.log.debug(path)
+        self.snapshots.preserve(parent_inode, children=True)
 
         entry = None
         if link_type == LinkTypes.SYMBOLIC:
@@ -87,30 +187,16 @@ class Data():
             self.log.debug(
                 "Add symbolic link to %s with name %s", name, link_path)
             link_path = os.fsdecode(link_path)
-            if os.sep in link_path:
-                parts = link_path.split(os.sep)
-                source_path = os.sep + os.path.join(*parts[:-1])
-                source_name = parts[-1]
-            else:
-                source_path = os.sep
-                source_name = link_path
-            self.log.debug(source_path)
-            self.log.debug(source_name)
-            source_entry = self.get_entry_by_name_path(
-                source_name, source_path)
-            if source_entry is None:
+            source_inode = self.links.lookup(link_path, parent_inode)
+            if source_inode is None:
                 raise Exception("No source entry found in current filesystem.")
 
-            # Restructure path
-            common_path = os.path.commonpath([source_path, link_path])
-            self.log.debug("common path: %s", common_path)
-            if link_path.startswith(common_path):
-                link_path = link_path[len(common_path):]
+            # The link path is relative to the directory of the link.
             if link_path.startswith(os.sep):
-                link_path = link_path[1:]
+                link_path = os.path.relpath(link_path, path)
             self.log.debug("final link path: %s", link_path)
             inode = self.__add_inode(
-                parent_inode, node_type=self.nodes[source_entry.inode].type, mode=LINK_MODE, is_link=True)
+                parent_inode, node_type=self.nodes[source_inode].type, mode=LINK_MODE, is_link=True)
             entry = SymbolicEntry(
                 inode, name, path, parent=parent_entry, link_path=link_path)
             self.log.debug(entry)
@@ -133,6 +219,8 @@ class Data():
                 "Type of link not implemented: {}".format(link_type))
 
         self.inode_entries_map[inode].append(entry)
+        self.names[(parent_inode, entry.name)] = entry
+        self.links.changed(parent_inode, entry.name)
         return entry
 
     def add_root_entry(self, name, mode=STANDARD_MODE):
@@ -154,12 +242,14 @@ class Data():
         self.log.debug(name)
         self.log.debug(path)
         self.nodes[ROOT_INODE] = Directory(mode, root=True)
+        self.__observe(ROOT_INODE)
         entry = Entry(ROOT_INODE, name, path, Types.DIR)
         self.entries[path] = [entry]
         self.inode_entries_map[ROOT_INODE] = [entry]
+        self.children[ROOT_INODE] = OrderedDict()
         self.inode_unique_count += 1
 
-    def __add_inode(self, parent_inode, node_type=Types.FILE, data="", mode=STANDARD_MODE, is_link=False):
+    def __add_inode(self, parent_inode, node_type=Types.FILE, data="", mode=STANDARD_MODE, is_link=False, node=None):
         """ Adding an inode.
 
         """
@@ -172,7 +262,9 @@ class Data():
 
         self.log.debug("Create inode %d: %s", inode, node_type.name)
 
-        if node_type == Types.FILE or node_type == Types.SWAP:
+        if node is not None:
+            self.nodes[inode] = node
+        elif node_type == Types.FILE or node_type == Types.SWAP:
             self.nodes[inode] = File(mode, parent=parent_inode, data=data, is_link=is_link)
         elif node_type == Types.DIR:
             self.nodes[inode] = Directory(mode, parent=parent_inode, is_link=is_link)
@@ -181,21 +273,54 @@ class Data():
             raise NotImplementedError("Symlink")
         else:
             raise Exception("Found no node_type called: {0}".format(node_type))
+        self.__observe(inode)
         self.nodes[inode].inc_open_count()
         self.inode_entries_map[inode] = []
+        self.children.setdefault(parent_inode, OrderedDict())[inode] = None
+        if self.nodes[inode].type == Types.DIR:
+            self.children[inode] = OrderedDict()
         return inode
 
+    def __observe(self, inode):
+        node = self.nodes[inode]
+        self.total_size += node.size or 0
+        self.metadata.add(inode, node)
+        self.retention.added(inode, node)
+        # The store shares bodies first, so they're accounted by their digest.
+        self.store.added(inode, node)
+        self.bodies.added(inode, node)
+        self.compression.added(inode, node)
+        node.observe(functools.partial(self.__changed, inode))
+
+    def __changed(self, inode, attribute, previous, value):
+        if attribute == "size":
+            self.total_size += (value or 0) - (previous or 0)
+        if attribute in ATTRIBUTES:
+            if inode in self.removed:
+                return
+            self.metadata.update(inode, attribute, previous, value)
+            self.retention.changed(inode, attribute, previous, value)
+        elif attribute == "invisible":
+            self.links.hidden(inode)
+        else:
+            self.store.changed(inode, self.nodes[inode], attribute, previous, value)
+            self.bodies.changed(inode, self.nodes[inode], attribute, previous, value)
+            self.compression.changed(inode, self.nodes[inode], attribute, previous, value)
+
     def get_symbolic_target(self, entry):
-        """ Getting the target of a pointer by a SymbolicEntry.
+        """ Getting the target of a pointer by a SymbolicEntry. Chains of links are followed.
+        Returns None for missing targets and loops.
 
         """
         if type(entry) == SymbolicEntry:
-            parts = entry.link_path.split(os.sep)
-            name = parts[-1]
-            path = os.path.join(*parts[:-1])
-            if entry.link_path[0] == os.sep:
-                path = os.sep + path
-            result = self.get_entry_by_name_path(name, path)
+            try:
+                inode = self.links.resolve(entry.inode)
+            except OSError as e:
+                self.log.warning("Can't resolve %s: %s", entry, e)
+                return None
+            if inode is None:
+                return None
+            result = self.get_entry(inode)
             self.log.debug(result)
             return result
         return None
@@ -233,11 +358,91 @@ class Data():
         """ Search for entry by parent_inode and the childs entry name.
 
         """
-        entries = self.get_children(parent_inode)
-        for entry in entries:
-            if entry.name == name:
-                return entry
-        return None
+        return self.names.get((parent_inode, name))
+
+    def get_entry_by_relative_path(self, path):
+        """ Search for entry by a path relative to the root entry. Returns None, if a part doesn't exist.
+        Paths with ".." parts never exist.
+
+        """
+        try:
+            parts = split_path(path)
+        except ValueError:
+            return None
+        entry = self.get_entry(ROOT_INODE)
+        for part in parts:
+            entry = self.get_entry_by_parent_name(entry.inode, os.fsencode(part))
+            if entry is None or self.nodes[entry.inode].is_invisible():
+                return None
+        return entry
+
+    def get_relative_path(self, inode):
+        """ Returns the path of an inode relative to the root entry.
+
+        """
+        root = self.get_entry(ROOT_INODE).get_full_path()
+        return os.path.relpath(self.get_entry(inode).get_full_path(), root)
+
+    def find(self, query):
+        """ Returns the sorted paths relative to the root entry of the visible nodes matching a query.
+        Candidates are read from the smallest range of the metadata index. Queries without ranges walk the
+        directories below the path prefix only.
+
+        Parameters
+        ----------
+        query : iotfs.filesystem.data.metadata_index.Query
+            a parsed query
+        """
+        if len(query.ranges) > 0:
+            scans = [(self.metadata.indexes[attribute], bounds) for attribute, bounds in query.ranges.items()]
+            index, bounds = min(scans, key=lambda scan: scan[0].count(*scan[1]))
+            candidates = index.range(*bounds)
+        else:
+            candidates = self.__walk(query.path)
+        paths = []
+        for inode in candidates:
+            node = self.nodes[inode]
+            if inode == ROOT_INODE or node.is_invisible() or not query.matches(node):
+                continue
+            path = self.get_relative_path(inode)
+            if path.startswith(query.path):
+                paths.append(path)
+        return sorted(paths)
+
+    def __walk(self, prefix):
+        # The directories are a trie of the path components: only the subtrees below prefix are walked.
+        dir_path, name = os.path.split(prefix)
+        directory = self.get_entry_by_relative_path(dir_path)
+        if directory is None or directory.inode not in self.children:
+            return []
+        name = os.fsencode(name)
+        pending = [inode for inode in self.children[directory.inode]
+                   if self.get_entry(inode).name.startswith(name)]
+        inodes = []
+        while len(pending) > 0:
+            inode = pending.pop()
+            inodes.append(inode)
+            pending.extend(self.children.get(inode, ()))
+        return inodes
+
+    def make_dirs(self, path, mode=STANDARD_MODE):
+        """ Creates every missing directory of a path relative to the root entry and returns the last entry.
+
+        Raises
+        ------
+        ValueError
+            If a part of path is "..", which is never created.
+        """
+        entry = self.get_entry(ROOT_INODE)
+        for part in split_path(path):
+            child = self.get_entry_by_parent_name(entry.inode, os.fsencode(part))
+            if child is None or self.nodes[child.inode].is_invisible():
+                child = self.add_entry(part, entry.inode, node_type=Types.DIR, mode=mode)
+                self.__invalidate_entry(child)
+            elif self.nodes[child.inode].type != Types.DIR:
+                raise NotADirectoryError("{} is no directory.".format(child.get_full_path()))
+            entry = child
+        return entry
 
     def get_entry(self, inode):
         """ Get the normal Entry of an inode. If there is none, return the Symbolic one.
@@ -274,8 +479,8 @@ class Data():
             if entry.parent is None:
                 self.log.debug("Is root.")
                 return [entry]
-        inode_children = [
-            idx for idx in self.nodes if self.nodes[idx].parent == inode]
+        # Sorted, because readdir continues listing at the last inode.
+        inode_children = sorted(self.children.get(inode, ()))
         entries = []
         for child in inode_children:
             items = self.inode_entries_map[child]
@@ -304,14 +509,24 @@ class Data():
         """
         self.log.debug(
             "Remove entries: {0} of inode: {1}".format(entries, inode))
-        for path in self.entries:
-            for idx in range(len(self.entries[path])):
-                try:
-                    if self.entries[path][idx] in entries:
-                        del self.entries[path][idx]
-                        idx -= 1
-                except IndexError:
-                    self.log.debug("Last item was deleted.")
+        for entry in entries:
+            if isinstance(entry.parent, Entry):
+                key = (entry.parent.inode, entry.name)
+                if self.names.get(key) is entry:
+                    del self.names[key]
+                    self.links.changed(*key)
+            # Entries are listed by their path. Only an outdated path requires searching all paths.
+            if not self.__remove_listed(self.entries.get(entry.path, ()), entry):
+                for listed in self.entries.values():
+                    if self.__remove_listed(listed, entry):
+                        break
+
+    def __remove_listed(self, listed, entry):
+        for idx, item in enumerate(listed):
+            if item is entry:
+                del listed[idx]
+                return True
+        return False
 
     def try_remove_inode(self, inode):
         """ Trying to remove an inode.
@@ -321,6 +536,7 @@ class Data():
         After that it checks, if the open count of the provided inode is smaller than one.
         If that is the case, it will delete all entries of this inode
         and then itself.
+        Nodes of removed entries are deleted, once only the count of their creation is left.
 
         """
         self.log.info("Trying to remove inode %d.", inode)
@@ -328,16 +544,287 @@ class Data():
             return
         try:
             self.log.debug("Open count: %d", self.nodes[inode].open_count)
-            if self.nodes[inode].open_count < 1:
-                entries = self.inode_entries_map[inode]
-                self.remove_entries(inode, entries)
-                del self.nodes[inode]
-                del self.inode_entries_map[inode]
+            if self.nodes[inode].open_count < 1 or self.__is_released(inode):
+                self.__remove_inode(inode)
             else:
                 self.log.debug("Didn't remove inode %d", inode)
         except KeyError:
             self.log.warning("Inode %d doesn't exist.", inode)
 
+    def __is_released(self, inode):
+        return inode in self.removed and self.nodes[inode].open_count <= 1
+
+    def __detach_inode(self, inode):
+        # Unlinks the node from the tree and the indexes, which find it by its name or its attributes.
+        node = self.nodes[inode]
+        self.snapshots.preserve(inode)
+        self.snapshots.preserve(node.parent, children=True)
+        self.remove_entries(inode, self.inode_entries_map[inode])
+        self.xattrs.discard_node(inode, node.xattr)
+        self.metadata.discard(inode, node)
+        self.retention.removed_node(inode, node)
+        parent_children = self.children.get(node.parent)
+        if parent_children is not None:
+            parent_children.pop(inode, None)
+
+    def __remove_inode(self, inode):
+        if inode in self.removed:
+            self.removed.discard(inode)
+        else:
+            self.__detach_inode(inode)
+        self.providers.discard(inode)
+        self.series.pop(inode, None)
+        self.store.removed_node(inode, self.nodes[inode])
+        self.bodies.removed_node(inode, self.nodes[inode])
+        self.compression.removed_node(inode, self.nodes[inode])
+        self.links.removed_node(inode)
+        self.page_cache.removed_node(inode)
+        self.total_size -= self.nodes[inode].size or 0
+        self.nodes[inode].observe(None)
+        self.children.pop(inode, None)
+        del self.nodes[inode]
+        del self.inode_entries_map[inode]
+
+    def remove_entry(self, entry):
+        """ Removes an entry. Its node is deleted immediately, unless the kernel still knows its inode.
+        Like unlinked files, these nodes stay readable through their inode and are deleted by forget or release,
+        see try_remove_inode.
+
+        Raises
+        ------
+        OSError
+            If entry is the root or a directory with children.
+        """
+        inode = entry.inode
+        if inode == ROOT_INODE:
+            raise OSError(errno.EPERM, "Root entry can't be removed.")
+        if inode in self.removed:
+            return
+        if len(self.children.get(inode, ())) > 0:
+            raise OSError(errno.ENOTEMPTY, "Directory {} is not empty.".format(entry.get_full_path()))
+        self.log.debug("Remove entry %s", entry)
+        # The count of the creation of the node is left, once the kernel forgot it.
+        if self.nodes[inode].open_count > 1:
+            self.__detach_inode(inode)
+            self.removed.add(inode)
+            self.nodes[inode].set_invisible()
+        else:
+            self.__remove_inode(inode)
+        self.__invalidate_entry(entry)
+
+    def __invalidate_entry(self, entry):
+        if self.invalidator is not None:
+            self.invalidator.entry(entry.parent.inode, entry.name)
+
+    def rename_entry(self, entry, parent_inode, name):
+        """ Moves an entry into the directory parent_inode with a new name.
+
+        """
+        key = (entry.parent.inode, entry.name)
+        if self.names.get(key) is entry:
+            del self.names[key]
+            self.links.changed(*key)
+        self.move_inode(entry.inode, parent_inode)
+        parent_entry = self.get_entry(parent_inode)
+        entry = self.entries.move(entry, entry.path, parent_entry.get_full_path())
+        entry.name = name
+        entry.path = parent_entry.get_full_path()
+        entry.parent = parent_entry
+        self.names[(parent_inode, entry.name)] = entry
+        self.links.changed(parent_inode, entry.name)
+        return entry
+
+    def move_inode(self, inode, parent_inode):
+        """ Changes the parent of an inode.
+
+        """
+        node = self.nodes[inode]
+        self.snapshots.preserve(inode)
+        self.snapshots.preserve(node.parent, children=True)
+        self.snapshots.preserve(parent_inode, children=True)
+        self.children[node.parent].pop(inode, None)
+        previous = node.parent
+        node.parent = parent_inode
+        self.children[parent_inode][inode] = None
+        self.retention.moved(inode, previous)
+
+    def apply_updates(self, updates, atomic=False, changes=None):
+        """ Applies a batch of (operation, path, payload) updates with paths relative to the root entry.
+
+        Consecutive writes and appends to a path are coalesced, so only their result is written.
+        Missing directories are created, but never a ".." part of a path, so updates of such paths fail.
+        Failing updates are logged and skipped, unless the batch is atomic.
+        Atomic batches are checked by check_updates first and applied only, if every update succeeds.
+        Returns the amount of applied updates, coalesced writes count as applied with their result.
+        The (operation, path) of every applied update is appended to changes, if it's a list. Coalesced writes
+        are appended once, with the operation of their first update.
+
+        Raises
+        ------
+        OSError
+            If the batch is atomic and an update fails. Nothing is changed then.
+        """
+        if atomic:
+            self.check_updates(updates)
+        # path -> operation, payload and amount of coalesced updates
+        pending = OrderedDict()
+        changed = OrderedDict()
+        dirs = dict()
+        applied = 0
+        for operation, path, payload in updates:
+            try:
+                path = os.sep.join(split_path(path))
+            except ValueError as e:
+                self.log.warning("Update %s of %s failed: %s", operation, path, e)
+                continue
+            if operation == Updates.WRITE or operation == Updates.APPEND:
+                payload = os.fsencode(payload)
+                if path in pending and operation == Updates.APPEND:
+                    pending[path][1] += payload
+                    pending[path][2] += 1
+                else:
+                    previous = pending.pop(path, None)
+                    pending[path] = [operation, payload, 1 if previous is None else previous[2] + 1]
+                continue
+            # Every other operation depends on the pending writes.
+            applied += self.__apply_writes(pending, dirs, changed, changes)
+            try:
+                if operation == Updates.MKDIR:
+                    changed[self.make_dirs(path).inode] = None
+                elif operation == Updates.REMOVE:
+                    entry = self.get_entry_by_relative_path(path)
+                    if entry is None:
+                        raise FileNotFoundError("No entry found for path: {}".format(path))
+                    changed[entry.parent.inode] = None
+                    self.remove_entry(entry)
+                    changed.pop(entry.inode, None)
+                    dirs.clear()
+                else:
+                    raise NotImplementedError("Update operation not implemented: {}".format(operation))
+                applied += 1
+                if changes is not None:
+                    changes.append((operation, path))
+            except Exception as e:
+                self.log.warning("Update %s of %s failed: %s", operation, path, e)
+        applied += self.__apply_writes(pending, dirs, changed, changes)
+        for inode in changed:
+            if inode in self.nodes and self.nodes[inode].type == Types.FILE:
+                self.page_cache.changed(inode)
+        if self.invalidator is not None:
+            for inode in changed:
+                self.invalidator.inode(inode)
+        return applied
+
+    def check_updates(self, updates):
+        """ Checks, whether every update of a batch succeeds, without changing anything.
+        Every update is checked against the tree as changed by the updates before it.
+
+        Raises
+        ------
+        OSError
+            With the errno of the first failing update.
+        """
+        # path -> type of the node after the checked updates, None for removed paths
+        staged = dict()
+        for number, (operation, path, _) in enumerate(updates, 1):
+            try:
+                path = os.sep.join(split_path(path))
+            except ValueError as e:
+                raise OSError(errno.EINVAL, "Update {} ({} of {}) fails: {}".format(number, operation.name, path, e))
+            try:
+                if operation == Updates.WRITE or operation == Updates.APPEND:
+                    self.__stage_dirs(staged, os.path.dirname(path))
+                    if self.__staged_type(staged, path) not in (None, Types.FILE):
+                        raise OSError(errno.EISDIR, "Is no regular file")
+                    staged[path] = Types.FILE
+                elif operation == Updates.MKDIR:
+                    self.__stage_dirs(staged, path)
+                elif operation == Updates.REMOVE:
+                    self.__stage_removal(staged, path)
+                else:
+                    raise OSError(errno.EINVAL, "Operation not implemented")
+            except OSError as e:
+                raise OSError(e.errno, "Update {} ({} of {}) fails: {}".format(
+                    number, operation.name, path, e.strerror))
+
+    def __staged_type(self, staged, path):
+        # Changes of a batch are staged for every path they touch, removed directories were emptied before.
+        if path in staged:
+            return staged[path]
+        entry = self.get_entry_by_relative_path(path)
+        if entry is None:
+            return None
+        node = self.nodes[entry.inode]
+        if isinstance(node, VirtualFile):
+            # Virtual files are never written by updates.
+            return Types.SWAP
+        return node.type
+
+    def __stage_dirs(self, staged, path):
+        parts = split_path(path)
+        for idx in range(1, len(parts) + 1):
+            prefix = os.sep.join(parts[:idx])
+            node_type = self.__staged_type(staged, prefix)
+            if node_type is None:
+                staged[prefix] = Types.DIR
+            elif node_type != Types.DIR:
+                raise OSError(errno.ENOTDIR, "{} is no directory".format(prefix))
+
+    def __stage_removal(self, staged, path):
+        if path == "":
+            raise OSError(errno.EPERM, "Root entry can't be removed")
+        node_type = self.__staged_type(staged, path)
+        if node_type is None:
+            raise OSError(errno.ENOENT, "No entry found")
+        if node_type == Types.DIR:
+            entry = self.get_entry_by_relative_path(path)
+            children = self.children.get(entry.inode, ()) if entry is not None else ()
+            for inode in children:
+                # Like remove_entry, unlinked children keep their directory.
+                if self.nodes[inode].is_invisible():
+                    raise OSError(errno.ENOTEMPTY, "Directory not empty")
+                name = os.fsdecode(self.get_entry(inode).name)
+                if self.__staged_type(staged, os.path.join(path, name)) is not None:
+                    raise OSError(errno.ENOTEMPTY, "Directory not empty")
+            prefix = path + os.sep
+            if any(key.startswith(prefix) and value is not None for key, value in staged.items()):
+                raise OSError(errno.ENOTEMPTY, "Directory not empty")
+        staged[path] = None
+
+    def __apply_writes(self, pending, dirs, changed, changes):
+        stamp = int(time.time() * 1e9)
+        applied = 0
+        for path, (operation, payload, count) in pending.items():
+            try:
+                dir_path, name = os.path.split(path)
+                if dir_path not in dirs:
+                    dirs[dir_path] = self.make_dirs(dir_path).inode
+                parent_inode = dirs[dir_path]
+                entry = self.get_entry_by_parent_name(parent_inode, os.fsencode(name))
+                if entry is None or self.nodes[entry.inode].is_invisible():
+                    entry = self.add_entry(name, parent_inode, data=payload)
+                    self.__invalidate_entry(entry)
+                    changed[parent_inode] = None
+                else:
+                    node = self.nodes[entry.inode]
+                    if node.type != Types.FILE or isinstance(node, VirtualFile):
+                        raise IsADirectoryError("{} is no regular file.".format(path))
+                    self.snapshots.preserve(entry.inode)
+                    if operation == Updates.APPEND:
+                        node.data = node.get_data() + payload
+                    else:
+                        node.data = payload
+                    node.mtime = stamp
+                    node.ctime = stamp
+                changed[entry.inode] = None
+                applied += count
+                if changes is not None:
+                    changes.append((operation, path))
+            except Exception as e:
+                self.log.warning("Update %s of %s failed: %s", operation, path, e)
+        pending.clear()
+        return applied
+
     def try_decrease_op_count(self, inode):
         """ Trying to decrease open count.
 
@@ -358,6 +845,8 @@ class Data():
                 self.nodes[inode].lock()
             self.log.debug("New op count: %d",
                            self.nodes[inode].open_count)
+            if self.__is_released(inode):
+                self.__remove_inode(inode)
         except KeyError:
             self.log.error("No inode with key %d.", inode)
         except Exception as e:
@@ -380,3 +869,22 @@ class Data():
             self.warning("Inode %d does not exist.", inode)
         except Exception as e:
             self.log.error(e)
+
+
+def _aggregate_provider(series, aggregate):
+    def provider():
+        value = getattr(series, aggregate)
+        if callable(value):
+            value = value()
+        if value is None:
+            return ""
+        return "{!r}\n".format(value)
+    return provider
+
+
+def _bucket_provider(series, bucket):
+    return lambda: series.downsample_to_csv(bucket)
+
+
+def _version_provider(series):
+    return lambda: series.version
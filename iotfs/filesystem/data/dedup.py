@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+
+from iotfs.filesystem.data.node import has_body
+
+# Smaller bodies cost less than their entry in the store.
+DEFAULT_MIN_SIZE = 64
+
+
+class BodyStore():
+
+    """
+    BodyStore is a content addressed store of the raw bodies of files, keyed by their hash and counting their
+    references. Files with equal bodies share a single bytes object. Files report written, compressed, spilled
+    and restored bodies, so every written body is looked up and shared, if it's known already.
+    Bodies are immutable, a write of a shared body stores a new body and drops a reference of the shared one,
+    which is copy-on-write. A hit is compared byte by byte, so colliding hashes are never shared.
+
+    ...
+
+    Attributes
+    ----------
+    min_size : int, optional
+        bodies smaller than min_size bytes are not shared
+    metrics : iotfs.utils._metrics.Metrics, optional
+        metrics, in which the logical and the stored bytes are set
+
+    """
+
+    def __init__(self, min_size=DEFAULT_MIN_SIZE, metrics=None):
+        """
+        Parameters
+        ----------
+        min_size : int, optional
+            bodies smaller than min_size bytes are not shared
+        metrics : iotfs.utils._metrics.Metrics, optional
+            metrics, in which the logical and the stored bytes are set
+        """
+
+        self.min_size = min_size
+        self.metrics = metrics
+        # digest -> [body, references]
+        self.bodies = dict()
+        # inode -> digest of its body
+        self.digests = dict()
+        self.logical_bytes = 0
+        self.stored_bytes = 0
+
+    def added(self, inode, node):
+        if has_body(node) and node.is_resident() and node.compressed is None:
+            self.__share(inode, node)
+
+    def changed(self, inode, node, attribute, previous, value):
+        """ Shares written and restored bodies anew, compressed and spilled ones are released.
+
+        """
+        if not has_body(node):
+            return
+        self.release(inode)
+        if attribute == "data" or (attribute == "resident" and value):
+            self.__share(inode, node)
+
+    def removed_node(self, inode, node):
+        self.release(inode)
+
+    def __share(self, inode, node):
+        data = node.get_data()
+        if len(data) < self.min_size:
+            return
+        digest = hashlib.sha1(data).digest()
+        item = self.bodies.get(digest)
+        if item is None:
+            item = self.bodies[digest] = [data, 0]
+            self.stored_bytes += len(data)
+        elif item[0] != data:
+            # A collision of hashes, the body stays private.
+            return
+        else:
+            node.share(item[0])
+        item[1] += 1
+        self.digests[inode] = digest
+        self.logical_bytes += len(data)
+        self.__gauge()
+
+    def release(self, inode):
+        """ Drops the reference of inode. Bodies without references are removed.
+
+        """
+        digest = self.digests.pop(inode, None)
+        if digest is None:
+            return
+        item = self.bodies[digest]
+        item[1] -= 1
+        self.logical_bytes -= len(item[0])
+        if item[1] == 0:
+            del self.bodies[digest]
+            self.stored_bytes -= len(item[0])
+        self.__gauge()
+
+    def ratio(self):
+        """ Returns the logical bytes per stored byte of all shared bodies.
+
+        """
+        if self.stored_bytes == 0:
+            return 1.0
+        return self.logical_bytes / self.stored_bytes
+
+    def stats(self):
+        return {
+            "bodies": len(self.bodies),
+            "references": len(self.digests),
+            "logical_bytes": self.logical_bytes,
+            "stored_bytes": self.stored_bytes,
+            "ratio": round(self.ratio(), 3)
+        }
+
+    def __gauge(self):
+        if self.metrics is not None:
+            self.metrics.set("dedup.logical_bytes", self.logical_bytes)
+            self.metrics.set("dedup.stored_bytes", self.stored_bytes)
@@ -44,5 +44,5 @@ class EntryDict(dict):
                 self.log.debug(entry)
                 del self[old_path][idx]
                 break
-        self[new_path].append(entry)
+        self.setdefault(new_path, []).append(entry)
         return self[new_path][-1]
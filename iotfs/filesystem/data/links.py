@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+import errno
+import os
+
+from iotfs.filesystem.data.entry import SymbolicEntry
+from iotfs.utils._fs_utils import LinkTypes, ROOT_INODE
+
+# Maximum number of symbolic links followed by a single resolution, as SYMLOOP_MAX of Linux.
+MAX_HOPS = 40
+
+
+class LinkCache():
+
+    """
+    LinkCache caches the resolved targets of symbolic links of iotfs.filesystem.data.data.Data by the inode of
+    the link. Following a link is a dict hit, once it has been resolved.
+    A link is resolved component by component via the names of Data. Relative link paths start at the directory
+    of the link, absolute ones at the mountpoint. Links within the path are followed, chains of links reuse the
+    targets cached for their links. Loops and chains of more than MAX_HOPS links fail with ELOOP.
+    Every resolution remembers the (parent inode, name) keys it looked up, including missing ones. Data reports
+    created, removed, renamed and hidden names by their key, which drops exactly the targets depending on them.
+    Missing targets are cached as well, until a missing component is created.
+
+    ...
+
+    Attributes
+    ----------
+    data : iotfs.filesystem.data.data.Data
+        the data, whose links are resolved
+    metrics : iotfs.utils._metrics.Metrics, optional
+        metrics, in which hits and misses are counted
+
+    """
+
+    def __init__(self, data, metrics=None):
+        """
+        Parameters
+        ----------
+        data : iotfs.filesystem.data.data.Data
+            the data, whose links are resolved
+        metrics : iotfs.utils._metrics.Metrics, optional
+            metrics, in which hits and misses are counted
+        """
+
+        self.data = data
+        self.metrics = metrics
+        # inode of a link -> inode of its target or None
+        self.targets = dict()
+        # inode of a link -> keys looked up by its resolution
+        self.keys = dict()
+        # (parent inode, name) -> inodes of links, whose targets depend on the key
+        self.dependents = dict()
+        # Links currently resolved, to detect loops.
+        self.resolving = []
+
+    def resolve(self, inode):
+        """ Returns the inode of the target of the link inode or None, if it doesn't exist.
+
+        Raises
+        ------
+        OSError
+            ELOOP, if the link is part of a loop or a chain of more than MAX_HOPS links.
+        """
+        if inode in self.targets:
+            self.__count("hits")
+            return self.targets[inode]
+        if inode in self.resolving or len(self.resolving) >= MAX_HOPS:
+            raise OSError(errno.ELOOP, "Too many levels of symbolic links.")
+        self.__count("misses")
+        keys = set()
+        self.resolving.append(inode)
+        try:
+            target = self.__walk(inode, keys)
+        finally:
+            self.resolving.pop()
+        self.targets[inode] = target
+        self.keys[inode] = keys
+        for key in keys:
+            self.dependents.setdefault(key, set()).add(inode)
+        return target
+
+    def changed(self, parent_inode, name):
+        """ Called whenever the name in parent_inode is created, removed, renamed or hidden.
+
+        """
+        for inode in self.dependents.pop((parent_inode, name), ()):
+            self.__drop(inode)
+
+    def hidden(self, inode):
+        """ Called, if inode became invisible or visible again.
+
+        """
+        for entry in self.data.inode_entries_map.get(inode, ()):
+            if entry.parent is not None:
+                self.changed(entry.parent.inode, entry.name)
+
+    def removed_node(self, inode):
+        self.__drop(inode)
+
+    def __drop(self, inode):
+        self.targets.pop(inode, None)
+        for key in self.keys.pop(inode, ()):
+            dependents = self.dependents.get(key)
+            if dependents is not None:
+                dependents.discard(inode)
+                if len(dependents) == 0:
+                    del self.dependents[key]
+
+    def lookup(self, path, inode=ROOT_INODE):
+        """ Returns the inode at path or None. Relative paths start at the directory inode.
+        Links within the path are followed, the path itself isn't cached.
+
+        Raises
+        ------
+        OSError
+            ELOOP, if a link of the path is part of a loop or a chain of more than MAX_HOPS links.
+        """
+        return self.__follow(path, inode, set())
+
+    def __walk(self, inode, keys):
+        entry = self.data.get_link_entry(inode, LinkTypes.SYMBOLIC)
+        if entry is None:
+            return None
+        # Renaming or removing the link itself drops its target.
+        keys.add((entry.parent.inode, entry.name))
+        return self.__follow(entry.link_path, entry.parent.inode, keys)
+
+    def __follow(self, path, current, keys):
+        if path.startswith(os.sep):
+            root = self.data.get_entry(ROOT_INODE).get_full_path()
+            if path != root and not path.startswith(root.rstrip(os.sep) + os.sep):
+                # Targets outside of the filesystem aren't resolved.
+                return None
+            path = path[len(root):]
+            current = ROOT_INODE
+        for part in path.split(os.sep):
+            if part == "" or part == ".":
+                continue
+            if part == "..":
+                if current != ROOT_INODE:
+                    parent = self.data.get_entry(current).parent
+                    keys.add((parent.inode, self.data.get_entry(current).name))
+                    current = parent.inode
+                continue
+            if current not in self.data.children:
+                return None
+            key = (current, os.fsencode(part))
+            keys.add(key)
+            child = self.data.names.get(key)
+            if child is None or self.data.nodes[child.inode].is_invisible():
+                return None
+            current = child.inode
+            if type(child) is SymbolicEntry:
+                current = self.resolve(current)
+                keys.update(self.keys[child.inode])
+                if current is None:
+                    return None
+        return current
+
+    def __count(self, name):
+        if self.metrics is not None:
+            self.metrics.increment("links." + name)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+import trio
+
+
+class _InodeLock():
+
+    """
+    _InodeLock is a trio.Lock with the amount of tasks holding or waiting for it.
+
+    """
+
+    def __init__(self):
+        self.lock = trio.Lock()
+        self.users = 0
+
+
+class _Locked():
+
+    """
+    _Locked is the async context manager returned by LockTable.
+
+    """
+
+    def __init__(self, table, inodes, exclusive):
+        self.table = table
+        self.inodes = inodes
+        self.exclusive = exclusive
+
+    async def __aenter__(self):
+        if self.exclusive:
+            await self.table.acquire_exclusive()
+        else:
+            await self.table.acquire(self.inodes)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self.exclusive:
+            self.table.release_exclusive()
+        else:
+            self.table.release(self.inodes)
+        return False
+
+
+class LockTable():
+
+    """
+    LockTable holds fine-grained locks of inodes. Handlers lock the inode of a file to change its data or attributes
+    and the inode of a directory to change its entries. Locks are created on demand and dropped when unused.
+    Bulk updates lock the whole table exclusively. They wait for every inode lock to be released
+    and block new ones until they are done.
+
+    """
+
+    def __init__(self):
+        self.locks = dict()
+        # Amount of tasks holding inode locks.
+        self.holders = 0
+        self.exclusive = False
+        self.waiting_exclusive = 0
+        self.changed = trio.Event()
+
+    def inodes(self, *inodes):
+        """ Returns an async context manager locking the provided inodes.
+        Inodes are locked in ascending order, so tasks locking overlapping inodes can't deadlock.
+
+        """
+        return _Locked(self, sorted(set(inodes)), False)
+
+    def all(self):
+        """ Returns an async context manager locking the whole table.
+
+        """
+        return _Locked(self, [], True)
+
+    def is_locked(self, inode):
+        return inode in self.locks and self.locks[inode].lock.locked()
+
+    async def acquire(self, inodes):
+        while self.exclusive or self.waiting_exclusive > 0:
+            await self.__wait()
+        self.holders += 1
+        acquired = []
+        try:
+            for inode in inodes:
+                inode_lock = self.locks.setdefault(inode, _InodeLock())
+                inode_lock.users += 1
+                try:
+                    await inode_lock.lock.acquire()
+                except BaseException:
+                    self.__drop(inode)
+                    raise
+                acquired.append(inode)
+        except BaseException:
+            self.release(acquired)
+            raise
+
+    def release(self, inodes):
+        for inode in reversed(inodes):
+            self.locks[inode].lock.release()
+            self.__drop(inode)
+        self.holders -= 1
+        self.__notify()
+
+    async def acquire_exclusive(self):
+        self.waiting_exclusive += 1
+        try:
+            while self.exclusive or self.holders > 0:
+                await self.__wait()
+        finally:
+            self.waiting_exclusive -= 1
+            # Waiting inode locks recheck, whether they still need to wait.
+            self.__notify()
+        self.exclusive = True
+
+    def release_exclusive(self):
+        self.exclusive = False
+        self.__notify()
+
+    def __drop(self, inode):
+        inode_lock = self.locks[inode]
+        inode_lock.users -= 1
+        if inode_lock.users == 0:
+            del self.locks[inode]
+
+    async def __wait(self):
+        await self.changed.wait()
+
+    def __notify(self):
+        self.changed.set()
+        self.changed = trio.Event()
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import re
+import time
+
+from iotfs.utils._fs_utils import Types
+
+# Attributes of nodes, which are indexed.
+ATTRIBUTES = ("size", "mtime")
+
+_TERM = re.compile(r"^(size|mtime)(<=|>=|<|>|=)(.+)$")
+_UNITS = {"": 1, "k": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+_TYPES = {"f": Types.FILE, "d": Types.DIR}
+
+# Larger than every inode, for bisecting behind all pairs of a value.
+_LAST = float("inf")
+# Pairs per half of a bucket of SortedIndex, full buckets are split in halves.
+BUCKET_SIZE = 512
+
+
+def parse_size(value):
+    """ Returns the bytes of a size with an optional unit k, M or G, e.g. 2M.
+
+    """
+    unit = value[-1] if len(value) > 0 and value[-1] in _UNITS else ""
+    return int(value[:len(value) - len(unit)]) * _UNITS[unit]
+
+
+class SortedIndex():
+
+    """
+    SortedIndex keeps (value, inode) pairs in sorted order, split into sorted buckets of up to 2 * BUCKET_SIZE pairs.
+    Inserts and removals cost binary searches and a move of the following pairs of one bucket, ranges are found by
+    binary search and read in O(buckets + results).
+
+    """
+
+    def __init__(self):
+        self.buckets = []
+        # the last pair of every bucket
+        self.maxes = []
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def add(self, value, inode):
+        pair = (value, inode)
+        if len(self.buckets) == 0:
+            self.buckets.append([pair])
+            self.maxes.append(pair)
+        else:
+            idx = min(bisect.bisect_left(self.maxes, pair), len(self.buckets) - 1)
+            bucket = self.buckets[idx]
+            bisect.insort(bucket, pair)
+            self.maxes[idx] = bucket[-1]
+            if len(bucket) > 2 * BUCKET_SIZE:
+                self.buckets[idx:idx + 1] = [bucket[:BUCKET_SIZE], bucket[BUCKET_SIZE:]]
+                self.maxes[idx:idx + 1] = [bucket[BUCKET_SIZE - 1], bucket[-1]]
+        self.length += 1
+
+    def discard(self, value, inode):
+        pair = (value, inode)
+        idx, pos = self.__locate(pair)
+        if idx == len(self.buckets) or self.buckets[idx][pos] != pair:
+            return
+        bucket = self.buckets[idx]
+        del bucket[pos]
+        self.length -= 1
+        if len(bucket) == 0:
+            del self.buckets[idx]
+            del self.maxes[idx]
+        else:
+            self.maxes[idx] = bucket[-1]
+
+    def __locate(self, pair):
+        # Returns the bucket and the position in it of the first pair not less than pair.
+        idx = bisect.bisect_left(self.maxes, pair)
+        if idx == len(self.buckets):
+            return idx, 0
+        return idx, bisect.bisect_left(self.buckets[idx], pair)
+
+    def bounds(self, low=None, high=None, low_inclusive=True, high_inclusive=True):
+        """ Returns the locations of the first pair with a value between low and high and of the pair behind the last
+        one as (bucket, position in bucket) tuples. None is unbounded.
+
+        """
+        start = (0, 0)
+        end = (len(self.buckets), 0)
+        if low is not None:
+            start = self.__locate((low, 0) if low_inclusive else (low, _LAST))
+        if high is not None:
+            end = self.__locate((high, _LAST) if high_inclusive else (high, 0))
+        return start, max(start, end)
+
+    def count(self, *bounds):
+        (first, start), (last, end) = self.bounds(*bounds)
+        if first == last:
+            return end - start
+        return sum(len(bucket) for bucket in self.buckets[first:last]) - start + end
+
+    def range(self, *bounds):
+        """ Returns the inodes with values between low and high, see bounds.
+
+        """
+        (first, start), (last, end) = self.bounds(*bounds)
+        if first == last:
+            return [inode for _, inode in self.buckets[first][start:end]] if first < len(self.buckets) else []
+        inodes = [inode for _, inode in self.buckets[first][start:]]
+        for bucket in self.buckets[first + 1:last]:
+            inodes.extend(inode for _, inode in bucket)
+        if last < len(self.buckets):
+            inodes.extend(inode for _, inode in self.buckets[last][:end])
+        return inodes
+
+
+class MetadataIndex():
+
+    """
+    MetadataIndex keeps a SortedIndex for each attribute of ATTRIBUTES over all nodes.
+    Nodes report changes of these attributes themselves, see iotfs.filesystem.data.node.Node.observe.
+
+    """
+
+    def __init__(self):
+        self.indexes = dict((attribute, SortedIndex()) for attribute in ATTRIBUTES)
+
+    def add(self, inode, node):
+        for attribute in ATTRIBUTES:
+            value = getattr(node, attribute)
+            if value is not None:
+                self.indexes[attribute].add(value, inode)
+
+    def discard(self, inode, node):
+        for attribute in ATTRIBUTES:
+            value = getattr(node, attribute)
+            if value is not None:
+                self.indexes[attribute].discard(value, inode)
+
+    def update(self, inode, attribute, previous, value):
+        index = self.indexes[attribute]
+        if previous is not None:
+            index.discard(previous, inode)
+        if value is not None:
+            index.add(value, inode)
+
+
+class Query():
+
+    """
+    Query is a find-like search over paths, sizes and modification times.
+    It's parsed from whitespace separated terms, which all need to match:
+
+        path=<prefix>       paths relative to the root starting with prefix, e.g. path=site/dev
+        type=f or type=d    files or directories only
+        size<op><bytes>     with op one of <, <=, =, >=, >, and an optional unit k, M or G, e.g. size>1M
+        mtime<op><seconds>  seconds since the epoch, negative seconds are relative to now, e.g. mtime>-300
+
+    ...
+
+    Attributes
+    ----------
+    text : str or bytes
+        the terms of the query
+
+    """
+
+    def __init__(self, text):
+        """
+        Parameters
+        ----------
+        text : str or bytes
+            the terms of the query
+
+        Raises
+        ------
+        ValueError
+            If a term is invalid.
+        """
+
+        if isinstance(text, bytes):
+            text = text.decode("utf-8")
+        self.text = text.strip()
+        self.path = ""
+        self.type = None
+        # attribute -> [low, high, low inclusive, high inclusive]
+        self.ranges = dict()
+        now = time.time()
+        for term in self.text.split():
+            if term.startswith("path="):
+                self.path = term[len("path="):].lstrip("/")
+            elif term.startswith("type="):
+                if term[len("type="):] not in _TYPES:
+                    raise ValueError("Unknown type in {}, use f or d.".format(term))
+                self.type = _TYPES[term[len("type="):]]
+            else:
+                match = _TERM.match(term)
+                if match is None:
+                    raise ValueError("Invalid term: {}".format(term))
+                attribute, operator, value = match.groups()
+                self.__restrict(attribute, operator, self.__value(attribute, value, now))
+
+    def __value(self, attribute, value, now):
+        try:
+            if attribute == "size":
+                return parse_size(value)
+            seconds = float(value)
+        except ValueError:
+            raise ValueError("Invalid {}: {}".format(attribute, value))
+        if seconds < 0:
+            seconds += now
+        return int(seconds * 1e9)
+
+    def __restrict(self, attribute, operator, value):
+        bounds = self.ranges.setdefault(attribute, [None, None, True, True])
+        if operator in ("=", ">", ">="):
+            bounds[0] = value
+            bounds[2] = operator != ">"
+        if operator in ("=", "<", "<="):
+            bounds[1] = value
+            bounds[3] = operator != "<"
+
+    def matches(self, node):
+        """ Whether node matches type and ranges. Paths are matched by the caller.
+
+        """
+        if self.type is not None and node.type != self.type:
+            return False
+        for attribute, (low, high, low_inclusive, high_inclusive) in self.ranges.items():
+            value = getattr(node, attribute)
+            if value is None:
+                return False
+            if low is not None and (value < low or (value == low and not low_inclusive)):
+                return False
+            if high is not None and (value > high or (value == high and not high_inclusive)):
+                return False
+        return True
@@ -42,6 +42,9 @@ class Node():
             starting open_count, which will be incremented, when file is opened
         """
 
+        # Called with the name, the previous and the new value of a changed size or mtime, see observe.
+        # Files report changes of their body as well, see File.
+        self.observer = None
         self.parent = parent
         self.type = node_type
 
@@ -67,6 +70,35 @@ class Node():
 
         self.xattr = dict()
 
+    @property
+    def size(self):
+        return self._size
+
+    @size.setter
+    def size(self, size):
+        previous = getattr(self, "_size", None)
+        self._size = size
+        if self.observer is not None and previous != size:
+            self.observer("size", previous, size)
+
+    @property
+    def mtime(self):
+        return self._mtime
+
+    @mtime.setter
+    def mtime(self, mtime):
+        previous = getattr(self, "_mtime", None)
+        self._mtime = mtime
+        if self.observer is not None and previous != mtime:
+            self.observer("mtime", previous, mtime)
+
+    def observe(self, observer):
+        """ Sets a function called on every change of size, mtime or visibility, e.g. to keep an index up to date.
+        Files report changes of their body as well, see File.
+
+        """
+        self.observer = observer
+
     def get_permissions(self):
         return stat.S_IMODE(self.mode)
 
@@ -77,7 +109,10 @@ class Node():
         return self.invisible
 
     def set_invisible(self, invisible=True):
+        previous = self.invisible
         self.invisible = invisible
+        if self.observer is not None and previous != invisible:
+            self.observer("invisible", previous, invisible)
 
     def inc_open_count(self, amount=1):
         self.open_count += amount
@@ -188,20 +223,89 @@ class File(Node):
             starting open_count, which will be incremented, when file is opened
         """
         super().__init__(mode, parent, Types.FILE, open_count=open_count)
+        # Path of a copy of the body on disk, see iotfs.filesystem.data.bodies.BodyCache.
+        # A spilled body is None in memory and read back on access.
+        self.spill_path = None
+        # Compressed blocks of the body, see iotfs.filesystem.data.compression. The raw body is None then.
+        self.compressed = None
+        self._data = None
         self.data = data
         if not is_link:
             self.mode = self.mode | stat.S_IFREG
 
     @property
     def data(self):
+        if self.compressed is not None:
+            return self.compressed.decompress()
+        if self._data is None and self.spill_path is not None:
+            # Handlers read spilled bodies back in a worker first, see BodyCache.fault. Other accesses, e.g. appends
+            # of adapters, read them on the loop.
+            with open(self.spill_path, "rb") as f:
+                data = f.read()
+            self.restore(data)
+            return data
         return self._data
 
     @data.setter
     def data(self, data):
         if data is None:
             data = ""
+        previous = self.get_body_size() if self.is_resident() else None
+        self.compressed = None
         self._data = os.fsencode(data)
         self.size = self.get_data_size()
+        # The observer is told about the size of the body in memory. None is a spilled body.
+        if self.observer is not None:
+            self.observer("data", previous, len(self._data))
+
+    def is_resident(self):
+        return self._data is not None or self.compressed is not None
+
+    def get_body_size(self):
+        """ Returns the bytes of the body held in memory.
+
+        """
+        if self.compressed is not None:
+            return self.compressed.size
+        return len(self._data) if self._data is not None else 0
+
+    def share(self, data):
+        """ Replaces the raw body by an equal one, which is shared with other files.
+
+        """
+        if data != self._data:
+            raise ValueError("Shared body differs.")
+        self._data = data
+
+    def compress(self, compressed):
+        """ Replaces the raw body by its compressed blocks.
+
+        """
+        previous = self.get_body_size()
+        self.compressed = compressed
+        self._data = None
+        if self.observer is not None:
+            self.observer("compressed", previous, compressed.size)
+
+    def spill(self):
+        """ Drops the body from memory. It's read from spill_path on the next access.
+
+        """
+        if self.spill_path is None:
+            raise ValueError("Body has no copy on disk.")
+        resident = self.is_resident()
+        self.compressed = None
+        self._data = None
+        if self.observer is not None and resident:
+            self.observer("resident", True, False)
+
+    def restore(self, data):
+        """ Puts the body read from spill_path back into memory.
+
+        """
+        self._data = data
+        if self.observer is not None:
+            self.observer("resident", False, True)
 
     def get_data(self, encoding=Encodings.BYTE_ENCODING):
         if encoding == Encodings.BYTE_ENCODING:
@@ -292,3 +396,171 @@ class Directory(Node):
             "open_count: {0}, ".format(self.open_count) +\
             "invisible: {0}, ".format(self.invisible) +\
             "lock: {0})".format(self.locked)
+
+
+class VirtualFile(File):
+
+    """
+    This VirtualFile object is a representation of a computed file.
+    Its content is not written by anyone but produced by a provider, which is called on read or getattr.
+    The results of the provider are cached by iotfs.filesystem.data.provider.ProviderCache.
+    ...
+
+    Attributes
+    ----------
+    mode : int
+        an integer representation of a node mode containing type of node and permissions
+    provider : callable
+        a function or coroutine function without parameters returning the content of the file
+    ttl : float
+        seconds a provided content is valid before the provider is called again, None keeps it until eviction
+    version : callable, optional
+        a function without parameters returning a value, which changes with the content. A provided content is
+        stale, once the value changed
+    writer : callable, optional
+        a function or coroutine function called with every written buffer. Without a writer the file is read only
+    appends : bool, optional
+        whether writes may continue at an offset other than 0. Otherwise every write is a whole buffer
+    lines : bool, optional
+        whether the writer is handed complete lines only. The rest of a write is kept by its file handle
+    session : bool, optional
+        whether writer and provider take the iotfs.filesystem._handles.Handle of the open file as first argument,
+        so every open file keeps its own state. Their contents aren't cached
+    parent : int, optional
+        represents parent inode
+    open_count : int, optional
+        starting open_count, which will be incremented, when file is opened
+
+    """
+
+    def __init__(self, mode, provider, ttl=1.0, version=None, writer=None, appends=True, lines=False, session=False,
+                 parent=None, open_count=0):
+        """
+        Parameters
+        ----------
+        mode : int
+            an integer representation of a node mode containing type of node and permissions
+        provider : callable
+            a function or coroutine function without parameters returning the content of the file
+        ttl : float
+            seconds a provided content is valid before the provider is called again, None keeps it until eviction
+        version : callable, optional
+            a function without parameters returning a value, which changes with the content. A provided content is
+            stale, once the value changed
+        writer : callable, optional
+            a function or coroutine function called with every written buffer. Without a writer the file is read only
+        appends : bool, optional
+            whether writes may continue at an offset other than 0. Otherwise every write is a whole buffer
+        lines : bool, optional
+            whether the writer is handed complete lines only. The rest of a write is kept by its file handle
+        session : bool, optional
+            whether writer and provider take the iotfs.filesystem._handles.Handle of the open file as first argument,
+            so every open file keeps its own state. Their contents aren't cached
+        parent : int, optional
+            represents parent inode
+        open_count : int, optional
+            starting open_count, which will be incremented, when file is opened
+        """
+        if not callable(provider):
+            raise ValueError("Provider is not callable.")
+        self.provider = provider
+        self.ttl = ttl
+        self.version = version
+        self.writer = writer
+        self.appends = appends
+        self.lines = lines
+        self.session = session
+        self.content = None
+        super().__init__(mode, parent=parent, open_count=open_count)
+
+    @property
+    def data(self):
+        if self.content is None:
+            return b''
+        return self.content
+
+    @data.setter
+    def data(self, data):
+        # Content is only set by the provider cache.
+        self.size = self.get_data_size()
+
+    def is_writable(self):
+        return self.writer is not None
+
+    def set_content(self, content):
+        """ Sets the provided content. None drops it, but keeps the last known size.
+
+        """
+        self.content = content
+        if content is not None:
+            self.size = len(content)
+
+    def to_dict(self):
+        return {
+            **super().to_dict(),
+            "ttl": self.ttl
+        }
+
+    def __repr__(self):
+        return "VirtualFile(mode: {0}, ".format(oct(self.mode)) +\
+            "ttl: {0}, ".format(self.ttl) +\
+            "open_count: {0}, ".format(self.open_count) +\
+            "invisible: {0}, ".format(self.invisible) +\
+            "lock: {0})".format(self.locked)
+
+
+class StreamFile(VirtualFile):
+
+    """
+    This StreamFile object is a representation of a read only file growing at its end, e.g. a log of changes.
+    Reads are served by the stream and may wait for new content. Its size is the end of the stream.
+    ...
+
+    Attributes
+    ----------
+    mode : int
+        an integer representation of a node mode containing type of node and permissions
+    stream : object
+        an object with an end offset, a coroutine read(off, size) and a snapshot() of its content,
+        e.g. iotfs.filesystem._changes.ChangeLog
+    parent : int, optional
+        represents parent inode
+    open_count : int, optional
+        starting open_count, which will be incremented, when file is opened
+
+    """
+
+    def __init__(self, mode, stream, parent=None, open_count=0):
+        """
+        Parameters
+        ----------
+        mode : int
+            an integer representation of a node mode containing type of node and permissions
+        stream : object
+            an object with an end offset, a coroutine read(off, size) and a snapshot() of its content,
+            e.g. iotfs.filesystem._changes.ChangeLog
+        parent : int, optional
+            represents parent inode
+        open_count : int, optional
+            starting open_count, which will be incremented, when file is opened
+        """
+        self.stream = stream
+        super().__init__(mode, stream.snapshot, ttl=0, parent=parent, open_count=open_count)
+
+    async def read(self, off, size):
+        self.size = self.stream.end
+        return await self.stream.read(off, size)
+
+    def __repr__(self):
+        return "StreamFile(mode: {0}, ".format(oct(self.mode)) +\
+            "open_count: {0}, ".format(self.open_count) +\
+            "invisible: {0}, ".format(self.invisible) +\
+            "lock: {0})".format(self.locked)
+
+
+def has_body(node):
+    """ Returns whether node is a regular file, whose body is written into memory, unlike directories and virtual
+    files, whose content is provided.
+
+    """
+    return isinstance(node, File) and not isinstance(node, VirtualFile)
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+from iotfs.filesystem.data.node import VirtualFile, StreamFile
+from iotfs.utils._fs_utils import CachePolicies
+
+
+class PageCache():
+
+    """
+    PageCache decides, whether the kernel keeps the cached pages of a file, when it's opened (keep_cache), or
+    bypasses its page cache (direct_io). Directories of iotfs.filesystem.data.data.Data declare a policy for
+    their subtree, the nearest one applies. Node types may declare a policy, which applies regardless of
+    directories. Virtual files are live, as their content changes without writes. Stream files are always read
+    directly, regardless of policies, since reads behind their size wait for new content, which the page cache
+    would clip at the size.
+    Immutable files always keep their pages. Live files are read directly and their attributes aren't cached.
+    Default files keep their pages, unless their content changed without a write of the kernel since their last
+    open, e.g. by updates of adapters. Such changes are invalidated in the background as well, see
+    iotfs.filesystem._invalidator.Invalidator, but opening the file doesn't wait for it.
+    Opens are counted by their outcome in metrics.
+
+    ...
+
+    Attributes
+    ----------
+    data : iotfs.filesystem.data.data.Data
+        the data, whose files are opened
+    metrics : iotfs.utils._metrics.Metrics, optional
+        metrics, in which opens are counted
+
+    """
+
+    def __init__(self, data, metrics=None):
+        """
+        Parameters
+        ----------
+        data : iotfs.filesystem.data.data.Data
+            the data, whose files are opened
+        metrics : iotfs.utils._metrics.Metrics, optional
+            metrics, in which opens are counted
+        """
+
+        self.data = data
+        self.metrics = metrics
+        # inode of a directory -> policy of its subtree
+        self.rules = dict()
+        # (node class, policy), the first matching class applies
+        self.types = [(VirtualFile, CachePolicies.LIVE)]
+        # Inodes, whose content changed without the kernel since their last open.
+        self.stale = set()
+
+    def add_rule(self, path, policy):
+        """ Declares policy for the subtree at path, relative to the root entry. Missing directories are created.
+
+        """
+        inode = self.data.make_dirs(path).inode
+        self.rules[inode] = policy
+        return inode
+
+    def remove_rule(self, path):
+        entry = self.data.get_entry_by_relative_path(path)
+        if entry is not None:
+            self.rules.pop(entry.inode, None)
+
+    def set_type(self, node_type, policy):
+        """ Declares policy for nodes of the class node_type, e.g. iotfs.filesystem.data.node.VirtualFile.
+
+        """
+        self.types = [item for item in self.types if item[0] is not node_type]
+        self.types.insert(0, (node_type, policy))
+
+    def policy_of(self, inode, node):
+        for node_type, policy in self.types:
+            if isinstance(node, node_type):
+                return policy
+        if len(self.rules) == 0:
+            return CachePolicies.DEFAULT
+        while inode is not None:
+            if inode in self.rules:
+                return self.rules[inode]
+            inode = self.data.nodes[inode].parent
+        return CachePolicies.DEFAULT
+
+    def open(self, inode, node):
+        """ Returns whether the kernel keeps the cached pages of inode and whether it reads it directly.
+
+        """
+        policy = self.policy_of(inode, node)
+        stale = inode in self.stale
+        self.stale.discard(inode)
+        if policy is CachePolicies.LIVE or isinstance(node, StreamFile):
+            self.__count("direct")
+            return False, True
+        if stale and policy is not CachePolicies.IMMUTABLE:
+            self.__count("drop")
+            return False, False
+        self.__count("keep")
+        return True, False
+
+    def changed(self, inode):
+        """ Called, if the content of inode changed without a write of the kernel.
+
+        """
+        self.stale.add(inode)
+
+    def removed_node(self, inode):
+        self.rules.pop(inode, None)
+        self.stale.discard(inode)
+
+    def __count(self, name):
+        if self.metrics is not None:
+            self.metrics.increment("page_cache." + name)
+
+
+def parse_rules(text):
+    """ Parses a line "path immutable|live|default" per rule. A path with default drops its rule.
+
+    Raises
+    ------
+    ValueError
+        If a line is invalid.
+    """
+    if isinstance(text, bytes):
+        text = text.decode("utf-8")
+    rules = []
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) == 0:
+            continue
+        if len(parts) != 2 or parts[1].upper() not in CachePolicies.__members__:
+            raise ValueError("Invalid rule: {}".format(line))
+        rules.append((parts[0], CachePolicies[parts[1].upper()]))
+    return rules
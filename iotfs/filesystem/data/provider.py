@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+import inspect
+import os
+import time
+from collections import OrderedDict
+
+import trio
+
+from iotfs.utils import _logging
+
+# Default amount of provided bytes held in memory by all virtual files.
+DEFAULT_CACHE_SIZE = 16 * 1024 * 1024
+
+
+class _ProviderCall():
+
+    """
+    _ProviderCall represents a provider call in flight, which concurrent readers wait for.
+
+    """
+
+    def __init__(self):
+        self.event = trio.Event()
+        self.content = None
+        self.error = None
+
+
+class ProviderCache():
+
+    """
+    ProviderCache calls the providers of iotfs.filesystem.data.node.VirtualFile nodes and memoizes their results.
+    A result is valid for the ttl of its file and, if the file has a version, until the version changes.
+    All results share a size cap and are evicted in LRU order.
+    Concurrent fetches of a stale file wait for a single provider call.
+
+    ...
+
+    Attributes
+    ----------
+    max_size : int, optional
+        maximum amount of bytes of all cached results
+    logger : logging.logger, optional
+        an already initialized logger instance
+
+    """
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE, logger=None):
+        """
+        Parameters
+        ----------
+        max_size : int, optional
+            maximum amount of bytes of all cached results
+        logger : logging.logger, optional
+            an already initialized logger instance
+        """
+
+        if logger is not None:
+            self.log = logger
+        else:
+            self.log = _logging.create_logger("ProviderCache", debug=True)
+        self.max_size = max_size
+        self.size = 0
+        # inode -> (node, time of provider call, version before the call)
+        self.entries = OrderedDict()
+        self.calls = dict()
+
+    async def fetch(self, inode, node):
+        """ Returns the content of a virtual file. Calls its provider, if the content is stale.
+
+        """
+        if inode in self.entries:
+            _, stamp, version = self.entries[inode]
+            if (node.ttl is None or time.monotonic() - stamp < node.ttl) and\
+                    (node.version is None or node.version() == version):
+                self.entries.move_to_end(inode)
+                return node.content
+
+        call = self.calls.get(inode)
+        if call is not None:
+            self.log.debug("Waiting for provider call of inode %d.", inode)
+            await call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.content
+
+        call = _ProviderCall()
+        self.calls[inode] = call
+        # Changes during the call make the content stale.
+        version = node.version() if node.version is not None else None
+        try:
+            call.content = await self.provide(node)
+            self.__store(inode, node, call.content, version)
+        except Exception as e:
+            self.log.error("Provider of inode %d failed: %s", inode, e)
+            call.error = e
+            raise
+        finally:
+            del self.calls[inode]
+            call.event.set()
+        return call.content
+
+    async def provide(self, node, *args):
+        """ Calls the provider of a virtual file with args and returns its content, which is not cached.
+
+        """
+        content = node.provider(*args)
+        if inspect.isawaitable(content):
+            content = await content
+        if content is None:
+            return b''
+        if isinstance(content, (bytes, str)):
+            return os.fsencode(content)
+        return os.fsencode(str(content))
+
+    def __store(self, inode, node, content, version):
+        self.discard(inode)
+        node.set_content(content)
+        if len(content) > self.max_size:
+            self.log.warning("Content of inode %d exceeds cache size. It will not be cached.", inode)
+            node.set_content(None)
+            return
+        self.entries[inode] = (node, time.monotonic(), version)
+        self.size += len(content)
+        while self.size > self.max_size:
+            evicted_inode, (evicted_node, _, _) = self.entries.popitem(last=False)
+            self.log.debug("Evict content of inode %d.", evicted_inode)
+            self.size -= len(evicted_node.content)
+            evicted_node.set_content(None)
+
+    def discard(self, inode):
+        """ Drops the cached content of an inode.
+
+        """
+        if inode in self.entries:
+            node = self.entries.pop(inode)[0]
+            self.size -= len(node.content)
+            node.set_content(None)
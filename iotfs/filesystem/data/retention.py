@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+import time
+
+import trio
+
+from iotfs.filesystem.data.metadata_index import parse_size
+from iotfs.filesystem.data.node import VirtualFile
+from iotfs.utils._fs_utils import Types
+
+DEFAULT_INTERVAL = 1.0
+DEFAULT_BATCH = 100
+
+_LIMITS = ("max_age", "max_bytes", "max_files")
+
+
+class RetentionRule():
+
+    """
+    RetentionRule limits the files below a directory. The oldest files by mtime are removed first,
+    until no limit is exceeded. A limit of None is unlimited.
+
+    ...
+
+    Attributes
+    ----------
+    path : str
+        a path of the directory relative to the root entry
+    max_age : float, optional
+        seconds since the last modification, after which files are removed
+    max_bytes : int, optional
+        maximum size of all files
+    max_files : int, optional
+        maximum amount of files
+
+    """
+
+    def __init__(self, path, max_age=None, max_bytes=None, max_files=None):
+        """
+        Parameters
+        ----------
+        path : str
+            a path of the directory relative to the root entry
+        max_age : float, optional
+            seconds since the last modification, after which files are removed
+        max_bytes : int, optional
+            maximum size of all files
+        max_files : int, optional
+            maximum amount of files
+        """
+
+        self.path = path.strip("/")
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.inode = None
+        # (mtime, inode) of the files. Entries of changed or removed files are dropped when they are popped.
+        self.heap = []
+        self.bytes = 0
+        self.files = 0
+
+    def is_exceeded(self, now):
+        """ Whether the oldest file needs to be removed. now is in nanoseconds.
+
+        """
+        if self.max_files is not None and self.files > self.max_files:
+            return True
+        if self.max_bytes is not None and self.bytes > self.max_bytes:
+            return True
+        return self.max_age is not None and len(self.heap) > 0 and self.heap[0][0] < now - self.max_age * 1e9
+
+    def __str__(self):
+        limits = "".join(" {}={}".format(name, getattr(self, name)) for name in _LIMITS
+                         if getattr(self, name) is not None)
+        return "{}{} files={} bytes={}".format(self.path or ".", limits, self.files, self.bytes)
+
+
+def parse_rules(text):
+    """ Parses a line "path [max_age=seconds] [max_bytes=size] [max_files=count]" per rule.
+    Sizes may have a unit k, M or G. A path without limits drops its rule.
+
+    Raises
+    ------
+    ValueError
+        If a line is invalid.
+    """
+    if isinstance(text, bytes):
+        text = text.decode("utf-8")
+    rules = []
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) == 0:
+            continue
+        limits = dict()
+        for part in parts[1:]:
+            name, _, value = part.partition("=")
+            if name not in _LIMITS or value == "":
+                raise ValueError("Invalid limit: {}".format(part))
+            if name == "max_age":
+                limits[name] = float(value)
+            elif name == "max_bytes":
+                limits[name] = parse_size(value)
+            else:
+                limits[name] = int(value)
+        rules.append(RetentionRule(parts[0], **limits))
+    return rules
+
+
+class Retention():
+
+    """
+    Retention enforces retention rules inside of iotfs.filesystem.data.data.Data.
+    Data reports added, changed, moved and removed nodes, so every rule knows the size and the amount of its files
+    and keeps them in a heap ordered by mtime. Removing the oldest file costs O(log n).
+    Files are removed by a background task in batches, which yields to the loop in between.
+    Virtual files are never removed.
+
+    ...
+
+    Attributes
+    ----------
+    data : iotfs.filesystem.data.data.Data
+        the data, whose files are removed
+    removed : callable, optional
+        a function called with the path and the size of every removed file
+
+    """
+
+    def __init__(self, data, removed=None):
+        """
+        Parameters
+        ----------
+        data : iotfs.filesystem.data.data.Data
+            the data, whose files are removed
+        removed : callable, optional
+            a function called with the path and the size of every removed file
+        """
+
+        self.data = data
+        self.removed = removed
+        # directory inode -> RetentionRule
+        self.rules = dict()
+
+    def add_rule(self, rule):
+        """ Adds rule and replaces the rule of the same directory. Missing directories are created.
+
+        """
+        rule.inode = self.data.make_dirs(rule.path).inode
+        self.rules[rule.inode] = rule
+        self.__rebuild(rule)
+        return rule
+
+    def remove_rule(self, path):
+        entry = self.data.get_entry_by_relative_path(path)
+        if entry is not None:
+            self.rules.pop(entry.inode, None)
+
+    def __rebuild(self, rule):
+        rule.heap = []
+        rule.bytes = 0
+        rule.files = 0
+        pending = [rule.inode]
+        while len(pending) > 0:
+            inode = pending.pop()
+            node = self.data.nodes[inode]
+            if _is_retained(node):
+                rule.heap.append((node.mtime, inode))
+                rule.bytes += node.size or 0
+                rule.files += 1
+            pending.extend(self.data.children.get(inode, ()))
+        heapq.heapify(rule.heap)
+
+    def rules_of(self, inode):
+        """ Returns the rules of the directories above inode.
+
+        """
+        return self.rules_above(self.data.nodes[inode].parent)
+
+    def rules_above(self, parent):
+        """ Returns the rules of the directory parent and the directories above it.
+
+        """
+        if len(self.rules) == 0:
+            return []
+        rules = []
+        while parent is not None:
+            if parent in self.rules:
+                rules.append(self.rules[parent])
+            parent = self.data.nodes[parent].parent
+        return rules
+
+    def added(self, inode, node):
+        if not _is_retained(node):
+            return
+        for rule in self.rules_of(inode):
+            heapq.heappush(rule.heap, (node.mtime, inode))
+            rule.bytes += node.size or 0
+            rule.files += 1
+
+    def changed(self, inode, attribute, previous, value):
+        node = self.data.nodes.get(inode)
+        if node is None or not _is_retained(node):
+            return
+        for rule in self.rules_of(inode):
+            if attribute == "size":
+                rule.bytes += (value or 0) - (previous or 0)
+            else:
+                heapq.heappush(rule.heap, (value, inode))
+                self.__compact(rule)
+
+    def moved(self, inode, parent):
+        """ Called after inode was moved from the directory parent.
+
+        """
+        if len(self.rules) == 0:
+            return
+        node = self.data.nodes[inode]
+        if node.type == Types.DIR:
+            # Only rules above exactly one of both parents gain or lose the subtree.
+            previous = self.rules_above(parent)
+            current = self.rules_of(inode)
+            for rule in previous + current:
+                if (rule in previous) != (rule in current):
+                    self.__rebuild(rule)
+            return
+        if not _is_retained(node):
+            return
+        for rule in self.rules_above(parent):
+            rule.bytes -= node.size or 0
+            rule.files -= 1
+        self.added(inode, node)
+
+    def removed_node(self, inode, node):
+        self.rules.pop(inode, None)
+        if not _is_retained(node):
+            return
+        for rule in self.rules_of(inode):
+            rule.bytes -= node.size or 0
+            rule.files -= 1
+
+    def __compact(self, rule):
+        # Changed files leave stale entries in the heap, which are dropped once they outnumber the files.
+        if len(rule.heap) > 2 * rule.files + 64:
+            self.__rebuild(rule)
+
+    def __is_current(self, rule, mtime, inode):
+        # Removed files, which are still open, stay in data.nodes until they are released.
+        if inode in self.data.removed:
+            return False
+        node = self.data.nodes.get(inode)
+        return node is not None and node.mtime == mtime and _is_retained(node) and rule in self.rules_of(inode)
+
+    def expire(self, now=None, limit=DEFAULT_BATCH):
+        """ Removes at most limit of the oldest files of rules, whose limits are exceeded.
+
+        Returns
+        -------
+        list
+            paths and sizes of the removed files
+        """
+        if now is None:
+            now = int(time.time() * 1e9)
+        removed = []
+        for rule in list(self.rules.values()):
+            while len(removed) < limit and len(rule.heap) > 0:
+                mtime, inode = rule.heap[0]
+                if not self.__is_current(rule, mtime, inode):
+                    heapq.heappop(rule.heap)
+                    continue
+                if not rule.is_exceeded(now):
+                    break
+                heapq.heappop(rule.heap)
+                node = self.data.nodes[inode]
+                path = self.data.get_relative_path(inode)
+                self.data.remove_entry(self.data.get_entry(inode))
+                removed.append((path, node.size))
+                if self.removed is not None:
+                    self.removed(path, node.size)
+        return removed
+
+    async def run(self, interval=DEFAULT_INTERVAL, batch=DEFAULT_BATCH):
+        """ Removes expired files every interval, until cancelled.
+        Each batch holds the locks of all inodes. Full batches are followed by the next one right after other
+        tasks had their turn.
+
+        """
+        while True:
+            async with self.data.locks.all():
+                removed = self.expire(limit=batch)
+            if len(removed) >= batch:
+                await trio.sleep(0)
+            else:
+                await trio.sleep(interval)
+
+
+def _is_retained(node):
+    return node.type == Types.FILE and not isinstance(node, VirtualFile)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import math
+import os
+import time
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class TimeSeries():
+
+    """
+    TimeSeries holds numeric (timestamp, value) samples in typed arrays.
+    Aggregates (count, min, max, mean, last) are maintained on every append.
+    Downsampled views per time bucket are computed in one batch, vectorized with numpy if it is installed.
+    Samples are kept in time order, late samples are inserted at their timestamp.
+    The version of a series changes with every sample, so views of it are rendered once per version.
+
+    ...
+
+    Attributes
+    ----------
+    typecode : str, optional
+        array typecode of the stored values
+
+    """
+
+    def __init__(self, typecode='d'):
+        """
+        Parameters
+        ----------
+        typecode : str, optional
+            array typecode of the stored values
+        """
+
+        self.timestamps = array('d')
+        self.values = array(typecode)
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+        self.last = None
+        self.version = 0
+
+    def append(self, value, timestamp=None):
+        """ Appends a sample or inserts it, if it is older than the last one. The timestamp defaults to now in seconds.
+
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        if len(self.timestamps) > 0 and timestamp < self.timestamps[-1]:
+            # downsample relies on the time order.
+            idx = bisect.bisect_right(self.timestamps, timestamp)
+            self.timestamps.insert(idx, timestamp)
+            self.values.insert(idx, value)
+        else:
+            idx = len(self.values)
+            self.timestamps.append(timestamp)
+            self.values.append(value)
+        # Read back the stored value to aggregate the same precision.
+        value = self.values[idx]
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        self.last = self.values[-1]
+        self.version += 1
+
+    def extend(self, samples):
+        """ Appends an iterable of (timestamp, value) tuples.
+
+        """
+        for timestamp, value in samples:
+            self.append(value, timestamp=timestamp)
+
+    def mean(self):
+        if self.count == 0:
+            return None
+        return self.sum / self.count
+
+    def parse(self, buf):
+        """ Appends samples of written lines. A line is either "value" or "timestamp,value".
+        Lines end with a newline or the buffer, splitting them across writes is up to the caller.
+
+        Raises
+        ------
+        ValueError
+            If a line is no sample.
+        """
+        samples = []
+        for line in os.fsdecode(buf).split("\n"):
+            line = line.strip()
+            if line == "":
+                continue
+            parts = line.split(",")
+            if len(parts) == 1:
+                samples.append((None, float(parts[0])))
+            elif len(parts) == 2:
+                samples.append((float(parts[0]), float(parts[1])))
+            else:
+                raise ValueError("No sample: {}".format(line))
+        # Parse everything before appending to not store a partial write.
+        self.extend(samples)
+        return len(samples)
+
+    def downsample(self, bucket):
+        """ Returns a list of (bucket start, min, max, mean, count) tuples of buckets with a width of bucket seconds.
+
+        """
+        if self.count == 0:
+            return []
+        if numpy is not None:
+            return self.__downsample_numpy(bucket)
+        buckets = []
+        current = None
+        for timestamp, value in zip(self.timestamps, self.values):
+            start = float(math.floor(timestamp / bucket) * bucket)
+            if current is None or current[0] != start:
+                current = [start, value, value, 0, 0]
+                buckets.append(current)
+            current[1] = min(current[1], value)
+            current[2] = max(current[2], value)
+            current[3] += value
+            current[4] += 1
+        return [(start, low, high, total / count, count) for start, low, high, total, count in buckets]
+
+    def __downsample_numpy(self, bucket):
+        timestamps = numpy.frombuffer(self.timestamps, dtype=numpy.float64)
+        values = numpy.asarray(self.values, dtype=numpy.float64)
+        starts = numpy.floor(timestamps / bucket) * bucket
+        # Samples are kept in time order, so a bucket begins where its start changes.
+        indices = numpy.flatnonzero(numpy.concatenate(([True], starts[1:] != starts[:-1])))
+        counts = numpy.diff(numpy.append(indices, len(values)))
+        lows = numpy.minimum.reduceat(values, indices)
+        highs = numpy.maximum.reduceat(values, indices)
+        means = numpy.add.reduceat(values, indices) / counts
+        return list(zip(starts[indices].tolist(), lows.tolist(), highs.tolist(), means.tolist(), counts.tolist()))
+
+    def to_csv(self):
+        lines = ["{!r},{!r}\n".format(timestamp, value) for timestamp, value in zip(self.timestamps, self.values)]
+        return "".join(lines)
+
+    def downsample_to_csv(self, bucket):
+        lines = ["{!r},{!r},{!r},{!r},{}\n".format(*row) for row in self.downsample(bucket)]
+        return "".join(lines)
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        return "TimeSeries(count: {0}, min: {1}, max: {2}, last: {3})".format(
+            self.count, self.min, self.max, self.last)
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+
+import copy
+import os
+import stat
+import time
+
+from iotfs.filesystem.data.node import File, VirtualFile
+from iotfs.utils._fs_utils import ROOT_INODE
+
+# Inodes of snapshot views are numbered from here on, above the inodes of query views.
+SNAPSHOT_INODE_BASE = 1 << 52
+# Bits of the inode of a node in the inode of its view.
+_INODE_BITS = 32
+
+_WRITE_BITS = stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH
+
+
+class Snapshot():
+
+    """
+    Snapshot is a frozen state of a subtree. It holds the nodes, entries and child lists, which changed since it
+    was taken, as they were before their first change. Everything else is read from the live tree, so a snapshot
+    shares the unchanged nodes and every body with it.
+
+    ...
+
+    Attributes
+    ----------
+    name : str
+        the name of the snapshot
+    inode : int
+        the inode of the directory in the live tree, whose subtree is frozen
+    number : int
+        a number unique for all snapshots of a filesystem, part of the inodes of its views
+    last_inode : int
+        the last inode of the live tree when it was taken, later inodes are not part of it
+
+    """
+
+    def __init__(self, name, inode, number, last_inode):
+        """
+        Parameters
+        ----------
+        name : str
+            the name of the snapshot
+        inode : int
+            the inode of the directory in the live tree, whose subtree is frozen
+        number : int
+            a number unique for all snapshots of a filesystem, part of the inodes of its views
+        last_inode : int
+            the last inode of the live tree when it was taken, later inodes are not part of it
+        """
+
+        self.name = name
+        self.inode = inode
+        self.number = number
+        self.last_inode = last_inode
+        self.created = int(time.time() * 1e9)
+        # inode -> node, entry and child inodes before their first change
+        self.nodes = dict()
+        self.entries = dict()
+        self.children = dict()
+
+
+class Snapshots():
+
+    """
+    Snapshots takes snapshots of subtrees of iotfs.filesystem.data.data.Data in O(1).
+    Data preserves the state of a node, its entry or its child list before they change, see preserve. Only the
+    first change after a snapshot copies anything, and only what it touches. Copies are shallow: bodies are
+    immutable and shared.
+    Snapshots are browsed read only below root, a directory of the filesystem: root/<name>/ is the frozen subtree.
+    Directories and files of a snapshot are views without nodes of their own. The inode of a view encodes the
+    number of the snapshot and the inode in the live tree, so live inodes need to stay below 2^32.
+
+    ...
+
+    Attributes
+    ----------
+    data : iotfs.filesystem.data.data.Data
+        the data, whose subtrees are frozen
+    root : int
+        inode of the directory listing the snapshots, None while snapshots aren't browsable
+
+    """
+
+    def __init__(self, data):
+        """
+        Parameters
+        ----------
+        data : iotfs.filesystem.data.data.Data
+            the data, whose subtrees are frozen
+        """
+
+        self.data = data
+        self.root = None
+        # name -> Snapshot
+        self.snapshots = dict()
+        # number -> Snapshot
+        self.numbers = dict()
+        self.next_number = 1
+        # Inodes of directories, which are hidden in snapshots, e.g. the control directory.
+        self.excluded = set()
+
+    def create(self, name, path="."):
+        """ Takes a snapshot of the directory at path, relative to the root entry.
+
+        Raises
+        ------
+        FileExistsError
+            If a snapshot of the same name exists.
+        NotADirectoryError
+            If path is no directory.
+        """
+        if name in self.snapshots:
+            raise FileExistsError("Snapshot {} exists.".format(name))
+        if len(name) == 0 or os.sep in name or name in (".", ".."):
+            raise ValueError("Invalid snapshot name: {}".format(name))
+        entry = self.data.get_entry_by_relative_path(path)
+        if entry is None:
+            raise FileNotFoundError("No entry found for path: {}".format(path))
+        if entry.inode not in self.data.children:
+            raise NotADirectoryError("{} is no directory.".format(path))
+        snapshot = Snapshot(name, entry.inode, self.next_number, self.data.inode_unique_count)
+        self.next_number += 1
+        self.snapshots[name] = snapshot
+        self.numbers[snapshot.number] = snapshot
+        return snapshot
+
+    def remove(self, name):
+        snapshot = self.snapshots.pop(name)
+        del self.numbers[snapshot.number]
+        return snapshot
+
+    def preserve(self, inode, children=False):
+        """ Called before the node or the entry of inode changes, with children before its child list changes.
+
+        """
+        if len(self.snapshots) == 0:
+            return
+        for snapshot in self.snapshots.values():
+            if not self.contains(snapshot, inode):
+                continue
+            if inode not in snapshot.nodes:
+                node = self.data.nodes[inode]
+                if isinstance(node, VirtualFile):
+                    continue
+                snapshot.nodes[inode] = _freeze(node)
+                if inode != snapshot.inode:
+                    snapshot.entries[inode] = copy.copy(self.data.get_entry(inode))
+            if children and inode not in snapshot.children:
+                snapshot.children[inode] = list(self.data.children.get(inode, ()))
+
+    def contains(self, snapshot, inode):
+        """ Whether inode was part of the subtree of snapshot, when it was taken.
+
+        """
+        if inode > snapshot.last_inode:
+            return False
+        while inode != snapshot.inode:
+            if inode == ROOT_INODE:
+                return False
+            node = snapshot.nodes.get(inode) or self.data.nodes.get(inode)
+            if node is None or node.parent is None:
+                return False
+            inode = node.parent
+        return True
+
+    def is_view(self, inode):
+        return inode >= SNAPSHOT_INODE_BASE
+
+    def view(self, snapshot, inode):
+        """ Returns the inode of the view of inode in snapshot.
+
+        """
+        return SNAPSHOT_INODE_BASE + (snapshot.number << _INODE_BITS) + inode
+
+    def resolve(self, view):
+        """ Returns the snapshot and the live inode of a view. The snapshot is None, if it has been removed.
+
+        """
+        number, inode = divmod(view - SNAPSHOT_INODE_BASE, 1 << _INODE_BITS)
+        return self.numbers.get(number), inode
+
+    def node(self, snapshot, inode):
+        """ Returns the node of inode as it was, when snapshot was taken, or None.
+
+        """
+        node = snapshot.nodes.get(inode)
+        if node is None:
+            node = self.data.nodes.get(inode)
+        return node
+
+    def entry(self, snapshot, inode):
+        entry = snapshot.entries.get(inode)
+        if entry is None:
+            entry = self.data.get_entry(inode)
+        return entry
+
+    def name(self, snapshot, inode):
+        if inode == snapshot.inode:
+            return os.fsencode(snapshot.name)
+        return self.entry(snapshot, inode).name
+
+    def children(self, snapshot, inode):
+        """ Returns the inodes of the visible children of a directory in snapshot.
+
+        """
+        if inode in snapshot.children:
+            children = snapshot.children[inode]
+        else:
+            children = self.data.children.get(inode, ())
+        visible = []
+        for child in children:
+            node = self.node(snapshot, child)
+            if child <= snapshot.last_inode and child not in self.excluded and node is not None and\
+                    not node.is_invisible() and not isinstance(node, VirtualFile):
+                visible.append(child)
+        return visible
+
+    def lookup(self, snapshot, inode, name):
+        """ Returns the inode of the child name of a directory in snapshot or None.
+
+        """
+        for child in self.children(snapshot, inode):
+            if self.entry(snapshot, child).name == name:
+                return child
+        return None
+
+    def is_live(self, snapshot, inode):
+        """ Whether inode didn't change since snapshot was taken, so the live node is read.
+
+        """
+        return inode not in snapshot.nodes
+
+    def read_only(self, mode):
+        return mode & ~_WRITE_BITS
+
+
+def _freeze(node):
+    frozen = copy.copy(node)
+    frozen.observer = None
+    frozen.xattr = dict(node.xattr)
+    if isinstance(node, File) and not node.is_resident() and node.spill_path is not None:
+        # The spilled copy is removed with the next write of the live node.
+        with open(node.spill_path, "rb") as f:
+            frozen.spill_path = None
+            frozen.restore(f.read())
+    return frozen
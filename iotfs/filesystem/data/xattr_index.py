@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+
+from iotfs.filesystem.data.snapshots import SNAPSHOT_INODE_BASE
+
+# Inodes of query views are numbered from here on, far above the inodes of nodes.
+VIEW_INODE_BASE = 1 << 48
+
+
+def link_name(inode, name):
+    """ Returns the name of the symbolic link to inode in a value directory, e.g. b"12-temp".
+
+    """
+    return str(inode).encode() + b"-" + name
+
+
+def _is_name(value):
+    return len(value) > 0 and b"/" not in value and b"\0" not in value and value not in (b".", b"..")
+
+
+class XattrIndex():
+
+    """
+    XattrIndex is an inverted index of extended attributes: name -> value -> inodes.
+    It is kept up to date by the handlers changing extended attributes and by the removal of inodes, so files
+    with an attribute value are found in O(results) instead of walking the tree.
+    The index is browsed as virtual directories below root, a directory of the filesystem:
+    root/<name>/<value>/ contains a symbolic link for every matching inode. Directories and links are views.
+    They have no nodes, their inodes are numbered from VIEW_INODE_BASE on and are dropped with their index entry.
+    The kernel may still refer to dropped views, these are empty or don't exist anymore.
+
+    ...
+
+    Attributes
+    ----------
+    root : int
+        inode of the directory listing the attribute names, None while the index isn't browsable
+
+    """
+
+    def __init__(self):
+        self.root = None
+        # name -> value -> inodes, used as ordered set
+        self.index = dict()
+        # (name,), (name, value) or (name, value, inode) -> inode of the view
+        self.views = dict()
+        # inode of a view -> its key
+        self.keys = dict()
+        self.next_inode = VIEW_INODE_BASE
+
+    def add(self, inode, name, value):
+        self.index.setdefault(name, dict()).setdefault(value, OrderedDict())[inode] = None
+
+    def discard(self, inode, name, value):
+        """ Removes inode from the index of name and value and drops the views of emptied entries.
+
+        """
+        values = self.index.get(name)
+        if values is None or inode not in values.get(value, ()):
+            return
+        del values[value][inode]
+        self.__drop_view((name, value, inode))
+        if len(values[value]) == 0:
+            del values[value]
+            self.__drop_view((name, value))
+        if len(values) == 0:
+            del self.index[name]
+            self.__drop_view((name,))
+
+    def discard_node(self, inode, xattr):
+        """ Removes every attribute of xattr, the attributes of inode, from the index.
+
+        """
+        for name, value in xattr.items():
+            self.discard(inode, name, value)
+
+    def find(self, name, value):
+        """ Returns the inodes with the attribute name set to value.
+
+        """
+        return list(self.index.get(name, dict()).get(value, ()))
+
+    def is_view(self, inode):
+        return VIEW_INODE_BASE <= inode < SNAPSHOT_INODE_BASE
+
+    def is_browsable(self, inode):
+        """ Whether inode is the root or a directory view of the index, which may have been dropped.
+
+        """
+        return inode == self.root or (self.is_view(inode) and len(self.keys.get(inode, ())) != 3)
+
+    def key(self, inode):
+        """ Returns the key of a view or None, if it has been dropped.
+
+        """
+        return self.keys.get(inode)
+
+    def view(self, *key):
+        """ Returns the inode of the view of key. It's numbered on first use.
+
+        """
+        inode = self.views.get(key)
+        if inode is None:
+            inode = self.next_inode
+            self.next_inode += 1
+            self.views[key] = inode
+            self.keys[inode] = key
+        return inode
+
+    def children(self, inode):
+        """ Returns the key of every child of a browsable inode. Keys of links end with the inode of the target.
+
+        """
+        if inode == self.root:
+            return [(name,) for name in self.index if _is_name(name)]
+        key = self.keys.get(inode)
+        if key is None:
+            return []
+        values = self.index.get(key[0], dict())
+        if len(key) == 1:
+            return [key + (value,) for value in values if _is_name(value)]
+        return [key + (target,) for target in values.get(key[1], ())]
+
+    def lookup(self, inode, name, name_of):
+        """ Returns the key of the child name of a browsable inode or None.
+
+        Parameters
+        ----------
+        inode : int
+            the root or the inode of a directory view
+        name : bytes
+            a name of a child
+        name_of : callable
+            a function returning the name of the entry of an inode, names the links
+        """
+        if inode == self.root:
+            return (name,) if name in self.index else None
+        key = self.keys.get(inode)
+        if key is None:
+            return None
+        values = self.index.get(key[0], dict())
+        if len(key) == 1:
+            return key + (name,) if name in values and _is_name(name) else None
+        target = name.split(b"-", 1)[0]
+        if not target.isdigit() or int(target) not in values.get(key[1], ()):
+            return None
+        target = int(target)
+        return key + (target,) if link_name(target, name_of(target)) == name else None
+
+    def __drop_view(self, key):
+        inode = self.views.pop(key, None)
+        if inode is not None:
+            del self.keys[inode]
@@ -1,11 +1,22 @@
 # -*- coding: utf-8 -*-
 
+import errno
+import os
+
 import pyfuse3
 from pyfuse3 import FUSEError
 import trio
 
+from iotfs.filesystem._batch import parse_batch
 from iotfs.filesystem._fs import _FileSystem
-
+from iotfs.filesystem._trace import TraceWriter
+from iotfs.filesystem.data.compression import CompressionRule, parse_rules as parse_compression_rules
+from iotfs.filesystem.data.metadata_index import Query
+from iotfs.filesystem.data.page_cache import parse_rules as parse_page_cache_rules
+from iotfs.filesystem.data.retention import RetentionRule, parse_rules
+
+from iotfs.utils._fs_utils import VIRTUAL_MODE, CONTROL_MODE, CONTROL_DIR, QUERY_XATTR_DIR, QUERY_MODE,\
+    SNAPSHOTS_DIR, RESERVED_DIRS, CachePolicies
 from iotfs.utils import _logging
 
 
@@ -23,6 +34,8 @@ class FileSystem(_FileSystem):
         path of mountpoint
     debug : bool, optional
         this defines whether the logging output should include the debug level
+    tasks : list
+        coroutine functions without parameters, which run in the background while the filesystem is mounted
 
     """
 
@@ -39,6 +52,363 @@ class FileSystem(_FileSystem):
         super().__init__(mount_point, debug)
         self.debug = debug
         self.mount_point = mount_point
+        # Writing "start [rate]" or "stop" to profile controls the profiler, reading returns collapsed stacks.
+        self.add_control_file("profile", self.profiler.collapsed, writer=self.profiler.control)
+        self.add_control_file("profile.handlers", self.profiler.attribution)
+        self.add_control_file("metrics", self.__format_metrics)
+        # Writing a query to find, e.g. "path=site size>1M mtime>-300", and reading it returns the matching paths.
+        # Every open file has its own query.
+        self.add_control_file("find", self.__find, writer=self.__set_query, session=True)
+        # Streams a line per change of the tree, reads at its end wait for new changes.
+        self.data.add_stream_entry("changes", self.data.make_dirs(CONTROL_DIR).inode, self.changes)
+        # Files with an extended attribute are linked in .query/xattr/<name>/<value>.
+        self.data.xattrs.root = self.data.make_dirs(QUERY_XATTR_DIR, mode=QUERY_MODE).inode
+        # mkdir .snapshots/<name> freezes the tree, .snapshots/<name> browses it. Special directories are hidden.
+        self.data.snapshots.root = self.data.make_dirs(SNAPSHOTS_DIR).inode
+        self.data.snapshots.excluded.update(self.data.make_dirs(path).inode for path in RESERVED_DIRS)
+        # Writing "path max_age=seconds max_bytes=size max_files=count" sets a retention rule, reading lists them.
+        self.data.retention.removed = self.__expired
+        self.add_control_file("retention", self.__format_rules, writer=self.__set_rules)
+        # Writing "path codec=zlib|lzma level=n min_age=seconds min_size=size" compresses files below path.
+        self.add_control_file("compression", self.__format_compression, writer=self.__set_compression)
+        # Reports how much memory is saved by sharing equal contents of files.
+        self.add_control_file("dedup", self.__format_dedup)
+        # Writing "path immutable|live|default" sets the page cache policy of files below path.
+        self.add_control_file("page_cache", self.__format_page_cache, writer=self.__set_page_cache)
+        # Writing "write|append path payload", "mkdir path" or "remove path" records, one per line or as JSON,
+        # applies all of them at once or, if one fails, none of them. A batch is a single write at offset 0.
+        self.batches = 0
+        self.add_control_file("batch", self.__format_batches, writer=self.__apply_batch)
+        self.tasks = [self.watchdog.run, self.invalidator.run, self.data.retention.run, self.data.compression.run,
+                      self.data.bodies.run, self.handles.run]
+
+    def __set_query(self, handle, buf):
+        handle.state = Query(buf)
+
+    def __find(self, handle):
+        if handle.state is None or handle.state.text == "":
+            return ""
+        return "".join(path + "\n" for path in self.data.find(handle.state))
+
+    def __set_rules(self, buf):
+        for rule in parse_rules(buf):
+            if rule.max_age is None and rule.max_bytes is None and rule.max_files is None:
+                self.data.retention.remove_rule(rule.path)
+            else:
+                self.data.retention.add_rule(rule)
+
+    def __format_rules(self):
+        return "".join(str(rule) + "\n" for rule in self.data.retention.rules.values())
+
+    def __set_compression(self, buf):
+        for path, rule in parse_compression_rules(buf):
+            if rule is None:
+                self.data.compression.remove_rule(path)
+            else:
+                self.data.compression.add_rule(rule)
+
+    def __format_compression(self):
+        return "".join(str(rule) + "\n" for rule in self.data.compression.rules.values())
+
+    def __set_page_cache(self, buf):
+        for path, policy in parse_page_cache_rules(buf):
+            self.set_cache_policy(path, policy)
+
+    def __format_page_cache(self):
+        rules = self.data.page_cache.rules
+        return "".join("{} {}\n".format(self.data.get_relative_path(inode), rules[inode].name.lower())
+                       for inode in rules)
+
+    async def __apply_batch(self, buf):
+        updates = parse_batch(buf)
+        # Handlers never see a part of the batch applied.
+        async with self.data.locks.all():
+            try:
+                self.apply_updates(updates, atomic=True)
+            except OSError as e:
+                self.log.error("Rejected batch: %s", e)
+                raise FUSEError(errno.EINVAL)
+        self.batches += 1
+        self.metrics.increment("batches")
+
+    def __format_batches(self):
+        return "batches {}\n".format(self.batches)
+
+    def __format_dedup(self):
+        stats = self.data.store.stats()
+        return "".join("{} {}\n".format(name, stats[name]) for name in sorted(stats))
+
+    def __expired(self, path, size):
+        self.metrics.increment("expired")
+        self.changes.append("expire", path, size)
+
+    def __format_metrics(self):
+        metrics = self.metrics.total()
+        return "".join("{} {}\n".format(name, metrics[name]) for name in sorted(metrics))
+
+    def add_virtual_file(self, path, provider, ttl=1.0, mode=VIRTUAL_MODE, writer=None, appends=True, lines=False,
+                         session=False):
+        """Adds a virtual file, whose content is produced by provider on read and getattr.
+        Missing directories of path are created.
+
+        Parameters
+        ----------
+        path : str
+            a path relative to the mountpoint
+        provider : callable
+            a function or coroutine function without parameters returning the content of the file
+        ttl : float, optional
+            seconds a provided content is valid before the provider is called again
+        mode : int, optional
+            permissions of the file
+        writer : callable, optional
+            a function or coroutine function called with the written bytes. A file without writer is read only.
+        appends : bool, optional
+            whether writes may continue at an offset other than 0. Otherwise writes at other offsets are rejected
+        lines : bool, optional
+            whether writer is called with complete lines only. The rest of a write waits for the next write of the
+            same file handle, until the handle is flushed
+        session : bool, optional
+            whether writer and provider take the iotfs.filesystem._handles.Handle of the open file as first
+            argument, whose state attribute keeps state per open file. The content is provided on every read
+
+        Returns
+        -------
+        iotfs.filesystem.data.entry.Entry
+            the entry of the virtual file
+        """
+
+        dir_path, name = os.path.split(path)
+        parent_entry = self.data.make_dirs(dir_path)
+        return self.data.add_virtual_entry(name, parent_entry.inode, provider, ttl=ttl, mode=mode, writer=writer,
+                                           appends=appends, lines=lines, session=session)
+
+    def add_control_file(self, name, provider, writer=None, session=False):
+        """Adds a virtual file to the control directory below the root. Its provider is called on every access.
+
+        Parameters
+        ----------
+        name : str
+            a name of the file
+        provider : callable
+            a function or coroutine function without parameters returning the content of the file
+        writer : callable, optional
+            a function or coroutine function called with the written bytes. A file without writer is read only.
+        session : bool, optional
+            whether writer and provider take the handle of the open file as first argument, see add_virtual_file
+
+        Returns
+        -------
+        iotfs.filesystem.data.entry.Entry
+            the entry of the control file
+        """
+
+        mode = CONTROL_MODE if writer is not None else VIRTUAL_MODE
+        # Writers of control files parse whole buffers.
+        return self.add_virtual_file(os.path.join(CONTROL_DIR, name), provider, ttl=0, mode=mode, writer=writer,
+                                     appends=False, session=session)
+
+    def add_retention(self, path, max_age=None, max_bytes=None, max_files=None):
+        """Limits the files below a directory. The oldest files are removed in the background, until no limit is
+        exceeded. The rule replaces an existing rule of the directory. Missing directories of path are created.
+
+        Parameters
+        ----------
+        path : str
+            a path relative to the mountpoint
+        max_age : float, optional
+            seconds since the last modification, after which files are removed
+        max_bytes : int, optional
+            maximum size of all files
+        max_files : int, optional
+            maximum amount of files
+
+        Returns
+        -------
+        iotfs.filesystem.data.retention.RetentionRule
+            the added rule
+        """
+
+        return self.data.retention.add_rule(RetentionRule(path, max_age=max_age, max_bytes=max_bytes,
+                                                          max_files=max_files))
+
+    def add_compression(self, path, codec="zlib", level=None, min_age=None, min_size=None):
+        """Compresses the contents of files below path, which were not written for min_age seconds or have at
+        least min_size bytes. Reads decompress only the blocks they touch. Missing directories are created.
+
+        Parameters
+        ----------
+        path : str
+            a path relative to the mountpoint
+        codec : str, optional
+            zlib or lzma
+        level : int, optional
+            compression level of the codec
+        min_age : float, optional
+            seconds since the last write, after which files are compressed
+        min_size : int, optional
+            bytes, from which on files are compressed right away
+
+        Returns
+        -------
+        iotfs.filesystem.data.compression.CompressionRule
+            the added rule
+        """
+
+        return self.data.compression.add_rule(CompressionRule(path, codec=codec, level=level, min_age=min_age,
+                                                              min_size=min_size))
+
+    def set_cache_policy(self, path, policy):
+        """Sets the policy of the page cache for files below path. Immutable files keep their cached pages,
+        when they are opened, live files bypass the page cache. Default files keep their pages, unless they
+        changed by updates since they were last opened. Missing directories are created.
+
+        Parameters
+        ----------
+        path : str
+            a path relative to the mountpoint
+        policy : iotfs.utils._fs_utils.CachePolicies
+            the policy, CachePolicies.DEFAULT drops the policy of path
+        """
+
+        if policy is CachePolicies.DEFAULT:
+            self.data.page_cache.remove_rule(path)
+        else:
+            self.data.page_cache.add_rule(path, policy)
+
+    def snapshot(self, name, path="."):
+        """Takes a snapshot of the directory at path in O(1). It is browsed read only in .snapshots/<name>.
+        Later changes copy the nodes they touch before they change them, contents are shared.
+
+        Parameters
+        ----------
+        name : str
+            the name of the snapshot
+        path : str, optional
+            a path of a directory relative to the mountpoint, the whole tree by default
+
+        Returns
+        -------
+        iotfs.filesystem.data.snapshots.Snapshot
+            the taken snapshot
+        """
+
+        return self.data.snapshots.create(name, path)
+
+    def remove_snapshot(self, name):
+        """Drops the snapshot name and the nodes, which only it kept.
+
+        """
+
+        self.data.snapshots.remove(name)
+
+    def add_series(self, path, series=None, buckets=()):
+        """Adds a directory for a time series. Missing directories of path are created.
+        Producers append samples to the returned series, consumers read its virtual files,
+        e.g. temp.series/data, temp.series/mean or temp.series/buckets/60.
+
+        Parameters
+        ----------
+        path : str
+            a path relative to the mountpoint
+        series : iotfs.filesystem.data.series.TimeSeries, optional
+            an existing time series
+        buckets : tuple, optional
+            bucket widths in seconds of downsampled views
+
+        Returns
+        -------
+        iotfs.filesystem.data.series.TimeSeries
+            the time series of the directory
+        """
+
+        dir_path, name = os.path.split(path)
+        parent_entry = self.data.make_dirs(dir_path)
+        entry = self.data.add_series_entry(name, parent_entry.inode, series=series, buckets=buckets)
+        return self.data.series[entry.inode]
+
+    def apply_updates(self, updates, atomic=False):
+        """Applies a batch of (operation, path, payload) updates of an input adapter.
+
+        Parameters
+        ----------
+        updates : list
+            tuples of iotfs.utils._fs_utils.Updates, a path relative to the mountpoint and a payload
+        atomic : bool, optional
+            whether nothing is applied, if an update fails. Otherwise failing updates are skipped
+
+        Returns
+        -------
+        int
+            amount of applied updates
+
+        Raises
+        ------
+        OSError
+            If the batch is atomic and an update fails
+        """
+
+        self.metrics.increment("updates", len(updates))
+        changes = []
+        if self.trace is None:
+            applied = self.data.apply_updates(updates, atomic=atomic, changes=changes)
+        else:
+            start = self.trace.now()
+            error = 0
+            try:
+                applied = self.data.apply_updates(updates, atomic=atomic, changes=changes)
+            except OSError as e:
+                error = e.errno
+                raise
+            finally:
+                self.trace.record("apply_updates", [updates, atomic], start, self.trace.now() - start, error=error)
+        # Skipped updates aren't changes, coalesced writes are a single one.
+        for operation, path in changes:
+            entry = self.data.get_entry_by_relative_path(path)
+            self.changes.append(operation.name.lower(), path, self.data.nodes[entry.inode].size if entry else 0)
+        return applied
+
+    def set_memory_budget(self, budget, directory=None):
+        """Limits the memory used by the contents of files. Beyond budget, the least recently used contents
+        are spilled to disk and read back on access. Hits, misses and spills are counted in metrics.
+
+        Parameters
+        ----------
+        budget : int
+            maximum amount of bytes of contents held in memory, None is unlimited
+        directory : str, optional
+            a directory for spilled contents, a temporary directory by default
+        """
+
+        self.data.bodies.configure(budget, directory=directory)
+        self.log.info("Memory budget of contents: %s bytes", budget)
+
+    def start_trace(self, path, hash_names=False):
+        """Starts recording every operation and applied update into a binary trace file.
+        It can be replayed with iotfs.benchmark.replay.
+
+        Parameters
+        ----------
+        path : str
+            a path of the trace file
+        hash_names : bool, optional
+            whether names and paths are replaced by hashes
+        """
+
+        self.stop_trace()
+        self.trace = TraceWriter(path, self.mount_point, hash_names=hash_names)
+        self.log.info("Tracing operations into %s", path)
+
+    def stop_trace(self):
+        """Stops recording operations and closes the trace file.
+
+        """
+
+        if self.trace is not None:
+            trace = self.trace
+            self.trace = None
+            trace.close()
+            self.log.info("Traced %d operations into %s", trace.records, trace.path)
 
     async def create(self, parent_inode, name, mode, flags, ctx):
         return await super().create(parent_inode, name, mode, flags, ctx)
@@ -49,14 +419,14 @@ class FileSystem(_FileSystem):
     async def mkdir(self, parent_inode, name, mode, ctx):
         return await super().mkdir(parent_inode, name, mode, ctx)
 
-    async def read(self, inode, off, size):
-        return await super().read(inode, off, size)
+    async def read(self, fh, off, size):
+        return await super().read(fh, off, size)
 
     async def readdir(self, inode, start_id, token):
         return await super().readdir(inode, start_id, token)
 
-    async def write(self, inode, off, buf):
-        return await super().write(inode, off, buf)
+    async def write(self, fh, off, buf):
+        return await super().write(fh, off, buf)
 
     async def rename(self, parent_inode_old, name_old, parent_inode_new, name_new, flags, ctx):
         return await super().rename(parent_inode_old, name_old, parent_inode_new, name_new, flags, ctx)
@@ -79,6 +449,16 @@ class FileSystemStarter():
     ----------
     fs : iotfs.filesystem.fs.FileSystem
         a filesystem object inheriting from FileSystem
+    adapters : list, optional
+        input adapters inheriting iotfs.adapters.adapter.Adapter, which run next to the filesystem
+    min_tasks : int, optional
+        minimum amount of worker tasks handling requests of the kernel
+    max_tasks : int, optional
+        maximum amount of worker tasks handling requests of the kernel
+    tasks : list, optional
+        coroutine functions without parameters, which run in the background as long as the filesystem is mounted
+    stall_threshold : float, optional
+        seconds without progress of the trio loop, which the watchdog reports as stall, 1 second by default
 
 
     Methods
@@ -93,18 +473,50 @@ class FileSystemStarter():
 
     """
 
-    def __init__(self, fs):
+    def __init__(self, fs, adapters=[], min_tasks=1, max_tasks=99, tasks=[], stall_threshold=None):
         """
         Parameters
         ----------
         fs : iotfs.filesystem.fs.FileSystem
             a filesystem object inheriting from FileSystem
+        adapters : list, optional
+            input adapters inheriting iotfs.adapters.adapter.Adapter, which run next to the filesystem
+        min_tasks : int, optional
+            minimum amount of worker tasks handling requests of the kernel
+        max_tasks : int, optional
+            maximum amount of worker tasks handling requests of the kernel
+        tasks : list, optional
+            coroutine functions without parameters, which run in the background as long as the filesystem is mounted
+        stall_threshold : float, optional
+            seconds without progress of the trio loop, which the watchdog reports as stall, 1 second by default
         """
 
         self.log = _logging.create_logger(self.__class__.__name__)
         if not isinstance(fs, FileSystem):
             raise Exception("Parameter is no Filesystem.")
         self.fs = fs
+        self.adapters = adapters
+        if min_tasks < 1 or max_tasks < min_tasks:
+            raise ValueError("Invalid amount of worker tasks: {} to {}".format(min_tasks, max_tasks))
+        self.min_tasks = min_tasks
+        self.max_tasks = max_tasks
+        self.tasks = tasks
+        if stall_threshold is not None:
+            if stall_threshold <= 0:
+                raise ValueError("Invalid stall threshold: {}".format(stall_threshold))
+            self.fs.watchdog.threshold = stall_threshold
+
+    async def __main(self):
+        async with trio.open_nursery() as nursery:
+            for adapter in self.adapters:
+                nursery.start_soon(adapter.run, self.fs)
+            for task in self.fs.tasks + self.tasks:
+                nursery.start_soon(task)
+            # Every worker task reads and handles requests of the kernel. pyfuse3 starts additional
+            # workers up to max_tasks, while all others are busy.
+            await pyfuse3.main(min_tasks=self.min_tasks, max_tasks=self.max_tasks)
+            # Adapters and tasks run as long as the filesystem is mounted.
+            nursery.cancel_scope.cancel()
 
     def start(self):
         """Starts a pyfuse3 filesystem with different options.
@@ -122,7 +534,7 @@ class FileSystemStarter():
             fuse_options.add('debug')
         pyfuse3.init(self.fs, self.fs.mount_point, fuse_options)
         try:
-            trio.run(pyfuse3.main)
+            trio.run(self.__main)
         except FUSEError:
             fuse_log.warning("FUSEError occured")
             pyfuse3.close(unmount=False)
@@ -136,3 +548,4 @@ class FileSystemStarter():
             pyfuse3.close(unmount=False)
         finally:
             pyfuse3.close()
+            self.fs.executor.shutdown()
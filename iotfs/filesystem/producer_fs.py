@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 
+from collections import OrderedDict
+import os
+
 from iotfs.listener.objects import CreateObject, ReadObject, RemoveObject, RenameObject, WriteObject, Operations
 
 from iotfs.filesystem.fs import FileSystem
 
-from iotfs.utils._fs_utils import Types
+from iotfs.utils._fs_utils import Types, Updates
 from iotfs.utils import _logging
 
 
@@ -51,7 +54,7 @@ class ProducerFileSystem(FileSystem):
         if self.queue is None:
             raise ValueError("Queue is not provided.")
         result = await super().create(parent_inode, name, mode, flags, ctx)
-        inode = result[0]
+        inode = result[1].st_ino
         node = self.data.nodes[inode]
         entry = self.data.get_entry_by_parent_name(parent_inode, name)
 
@@ -81,10 +84,11 @@ class ProducerFileSystem(FileSystem):
             Operations.CREATE_DIR, {"node": node.to_dict(), "entry": entry.to_dict()}))
         return result
 
-    async def read(self, inode, off, size):
+    async def read(self, fh, off, size):
         if self.queue is None:
             raise ValueError("Queue is not provided.")
-        result = await super().read(inode, off, size)
+        result = await super().read(fh, off, size)
+        inode = self.handles.get(fh).inode
         node = self.data.nodes[inode]
         entry = self.data.get_entry(inode)
 
@@ -96,6 +100,8 @@ class ProducerFileSystem(FileSystem):
         if self.queue is None:
             raise ValueError("Queue is not provided.")
         await super().readdir(inode, start_id, token)
+        if self.data.xattrs.is_view(inode):
+            return
         result = self.data.get_children(inode)
         node = self.data.nodes[inode]
         entry = self.data.get_entry(inode)
@@ -103,10 +109,11 @@ class ProducerFileSystem(FileSystem):
         self.queue.put(ReadObject(
             Operations.READ_DIR, {"node": node.to_dict(), "entry": entry.to_dict()}, result))
 
-    async def write(self, inode, off, buf):
+    async def write(self, fh, off, buf):
         if self.queue is None:
             raise ValueError("Queue is not provided.")
-        result = await super().write(inode, off, buf)
+        result = await super().write(fh, off, buf)
+        inode = self.handles.get(fh).inode
         node = self.data.nodes[inode]
         entry = self.data.get_entry(inode)
 
@@ -153,3 +160,42 @@ class ProducerFileSystem(FileSystem):
 
         self.queue.put(RemoveObject(Operations.REMOVE_DIR,
                                     removed_dir))
+
+    def apply_updates(self, updates, atomic=False):
+        """Applies a batch of updates like FileSystem.apply_updates and emits an event per changed path.
+        Events are coalesced: consecutive writes of a path emit a single event with the result.
+
+        """
+        if self.queue is None:
+            return super().apply_updates(updates, atomic=atomic)
+        # path -> node and entry before the batch or None
+        before = OrderedDict()
+        written = dict()
+        for operation, path, payload in updates:
+            path = path.strip(os.sep)
+            if path not in before:
+                before[path] = self.__describe(self.data.get_entry_by_relative_path(path))
+            if operation == Updates.WRITE:
+                written[path] = len(payload)
+            elif operation == Updates.APPEND:
+                written[path] = written.get(path, 0) + len(payload)
+        applied = super().apply_updates(updates, atomic=atomic)
+        for path, previous in before.items():
+            current = self.__describe(self.data.get_entry_by_relative_path(path))
+            if current is None:
+                if previous is not None:
+                    operation = Operations.REMOVE_FILE if previous["node"]["type"] == Types.FILE.name else\
+                        Operations.REMOVE_DIR
+                    self.queue.put(RemoveObject(operation, previous))
+            elif previous is None or previous["entry"]["inode"] != current["entry"]["inode"]:
+                operation = Operations.CREATE_FILE if current["node"]["type"] == Types.FILE.name else\
+                    Operations.CREATE_DIR
+                self.queue.put(CreateObject(operation, current))
+            elif path in written:
+                self.queue.put(WriteObject(Operations.WRITE_FILE, current, written[path]))
+        return applied
+
+    def __describe(self, entry):
+        if entry is None:
+            return None
+        return {"node": self.data.nodes[entry.inode].to_dict(), "entry": entry.to_dict()}
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+from iotfs.filesystem.fs import FileSystemStarter
+from iotfs.filesystem.standard_fs import StandardFileSystem
+from iotfs.filesystem.producer_fs import ProducerFileSystem
+
+from iotfs.utils import _logging
+
+
+class Shard():
+
+    """
+    Shard describes a top-level subtree of a sharded mount, for example a site or a class of devices.
+    Each shard is served by its own filesystem in its own process and mounted at root/name.
+
+    ...
+
+    Attributes
+    ----------
+    name : str
+        a name of the subtree below the common root
+    fs_class : type, optional
+        a class inheriting iotfs.filesystem.fs.FileSystem, which is created in the process of the shard
+    adapters : list, optional
+        input adapters inheriting iotfs.adapters.adapter.Adapter, which write into this shard
+    max_tasks : int, optional
+        maximum amount of worker tasks handling requests of the kernel
+    stall_threshold : float, optional
+        seconds without progress of the trio loop, which the watchdog reports as stall, 1 second by default
+
+    """
+
+    def __init__(self, name, fs_class=StandardFileSystem, adapters=[], max_tasks=99, stall_threshold=None):
+        """
+        Parameters
+        ----------
+        name : str
+            a name of the subtree below the common root
+        fs_class : type, optional
+            a class inheriting iotfs.filesystem.fs.FileSystem, which is created in the process of the shard
+        adapters : list, optional
+            input adapters inheriting iotfs.adapters.adapter.Adapter, which write into this shard
+        max_tasks : int, optional
+            maximum amount of worker tasks handling requests of the kernel
+        stall_threshold : float, optional
+            seconds without progress of the trio loop, which the watchdog reports as stall, 1 second by default
+        """
+
+        if name == "" or os.sep in name or name in (".", ".."):
+            raise ValueError("Invalid name of shard: {}".format(name))
+        self.name = name
+        self.fs_class = fs_class
+        self.adapters = adapters
+        self.max_tasks = max_tasks
+        self.stall_threshold = stall_threshold
+
+    def mount_point(self, root):
+        return os.path.join(root, self.name)
+
+
+def run_shard(shard, root, queue=None, shared=None, debug=False):
+    """ Creates and mounts the filesystem of a shard. Runs in the process of the shard.
+
+    Parameters
+    ----------
+    shard : iotfs.filesystem.shard.Shard
+        the shard to serve
+    root : str
+        the common root of all shards
+    queue : multiprocessing.JoinableQueue, optional
+        a queue of listener events shared by all shards
+    shared : dict, optional
+        a dict shared by all shards, into which metrics are published
+    debug : bool, optional
+        this defines whether the logging output should include the debug level
+    """
+
+    _logging.restart_loggers()
+    log = _logging.create_logger("Shard." + shard.name, debug=debug)
+    mount_point = shard.mount_point(root)
+    if not os.path.isdir(mount_point):
+        log.warning("Creating mountpoint: %s", mount_point)
+        os.mkdir(mount_point)
+    fs = shard.fs_class(mount_point, debug=debug)
+    if isinstance(fs, ProducerFileSystem):
+        fs.setQueue(queue)
+    tasks = []
+    if shared is not None:
+        fs.metrics.share(shared, shard.name)
+        tasks.append(fs.metrics.run)
+    log.info("Serving shard %s at %s", shard.name, mount_point)
+    try:
+        FileSystemStarter(fs, adapters=shard.adapters, max_tasks=shard.max_tasks, tasks=tasks,
+                          stall_threshold=shard.stall_threshold).start()
+    finally:
+        # Processes of multiprocessing exit without running atexit handlers.
+        _logging.flush_loggers()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+import collections
+import socket
+
+from iotfs.listener import protocol
+
+# Bytes received at once.
+RECEIVE_SIZE = 1 << 16
+
+
+class EventClient():
+
+    """
+    EventClient receives the events of a filesystem from an iotfs.listener.server.EventServer in another process.
+    Events are decoded into the iotfs.listener.objects.ListenerObject instances listeners get from the queue.
+    Processed batches are acknowledged after half of the window of the server and before waiting for more, so the
+    server keeps sending while the client processes.
+
+    ...
+
+    Attributes
+    ----------
+    path : str
+        path of the Unix domain socket of the server
+    dropped : int
+        amount of events the server dropped, as the client didn't keep up
+
+    """
+
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path : str
+            path of the Unix domain socket of the server
+        """
+
+        self.path = path
+        self.sock = None
+        self.window = 1
+        self.dropped = 0
+        self.buffer = bytearray()
+        # Frames received, but not processed yet.
+        self.frames = collections.deque()
+        # Sequence of the last batch received and the last one acknowledged.
+        self.sequence = 0
+        self.acked = 0
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+        kind, payload = next(self.__frames())
+        if kind != protocol.HELLO:
+            raise ValueError("Expected the greeting of the server.")
+        version, self.window = protocol.decode_hello(payload)
+        if version != protocol.VERSION:
+            raise ValueError("Unsupported protocol version: {}".format(version))
+        return self
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, *args):
+        self.close()
+
+    def batches(self):
+        """ Yields lists of events, until the server closes the connection.
+
+        """
+        for kind, payload in self.__frames():
+            if kind != protocol.BATCH:
+                continue
+            self.sequence, dropped, events = protocol.decode_batch(payload)
+            self.dropped += dropped
+            yield events
+            if self.sequence - self.acked >= max(self.window // 2, 1):
+                self.__ack()
+
+    def events(self):
+        """ Yields events, until the server closes the connection.
+
+        """
+        for events in self.batches():
+            for item in events:
+                yield item
+
+    def __ack(self):
+        self.sock.sendall(protocol.encode_ack(self.sequence))
+        self.acked = self.sequence
+
+    def __frames(self):
+        while True:
+            while len(self.frames) > 0:
+                yield self.frames.popleft()
+            if self.sequence > self.acked:
+                # Everything received has been processed, before waiting for more.
+                self.__ack()
+            data = self.sock.recv(RECEIVE_SIZE)
+            if len(data) == 0:
+                return
+            self.buffer += data
+            self.frames.extend(protocol.read_frames(self.buffer))
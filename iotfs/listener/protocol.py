@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+import os
+import struct
+
+from iotfs.listener.objects import Events, Operations, CreateObject, ReadObject, WriteObject, RenameObject,\
+    RemoveObject
+from iotfs.utils._fs_utils import Types
+
+# Binary encoding of listener events, streamed by iotfs.listener.server.EventServer.
+# Every frame starts with its length (without the length itself) and its type:
+# HELLO   server -> client: version, window, the amount of batches a client may receive unacknowledged
+# BATCH   server -> client: sequence, events dropped for the client since the last batch, amount of events, events
+# ACK     client -> server: sequence of the last batch processed
+VERSION = 1
+
+HELLO = 0
+BATCH = 1
+ACK = 2
+
+# length, type
+_FRAME = struct.Struct("!IB")
+_HELLO = struct.Struct("!BI")
+_BATCH = struct.Struct("!III")
+_ACK = struct.Struct("!I")
+# event, operation, node type, flags, inode, parent, mode, value, lengths of name, path, new name and data
+# value is the amount of written bytes of writes and the inode of the new directory of renames, data the content of
+# files or the read bytes of reads.
+_EVENT = struct.Struct("!BBBBQQIQHHHI")
+
+_INVISIBLE = 1
+_LOCKED = 2
+
+_EVENT_TYPES = {event.value: event for event in Events}
+_OPERATIONS = {operation.value: operation for operation in Operations}
+_TYPES = {node_type.value: node_type for node_type in Types}
+
+
+def frame(kind, payload):
+    return _FRAME.pack(len(payload) + 1, kind) + payload
+
+
+def encode_hello(window):
+    return frame(HELLO, _HELLO.pack(VERSION, window))
+
+
+def encode_batch(sequence, dropped, events):
+    """ Returns a BATCH frame of encoded events.
+
+    """
+    return frame(BATCH, _BATCH.pack(sequence, dropped, len(events)) + b"".join(events))
+
+
+def encode_ack(sequence):
+    return frame(ACK, _ACK.pack(sequence))
+
+
+def read_frames(buf):
+    """ Returns the type and the payload of every complete frame of buf, a bytearray, and removes them from it.
+
+    """
+    frames = []
+    offset = 0
+    while len(buf) - offset >= _FRAME.size:
+        length, kind = _FRAME.unpack_from(buf, offset)
+        end = offset + 4 + length
+        if end > len(buf):
+            break
+        frames.append((kind, bytes(buf[offset + _FRAME.size:end])))
+        offset = end
+    del buf[:offset]
+    return frames
+
+
+def decode_hello(payload):
+    """ Returns the version and the window of a HELLO frame.
+
+    """
+    return _HELLO.unpack_from(payload)
+
+
+def decode_ack(payload):
+    return _ACK.unpack_from(payload)[0]
+
+
+def encode_event(item):
+    """ Encodes an iotfs.listener.objects.ListenerObject. Its obj holds the dicts of the node and the entry.
+
+    """
+    node = item.obj.get("node", {})
+    entry = item.obj.get("entry", {})
+    flags = (_INVISIBLE if node.get("invisible") else 0) | (_LOCKED if node.get("lock") else 0)
+    mode = node.get("mode", 0)
+    if isinstance(mode, str):
+        mode = int(mode, 8)
+    node_type = Types[node["type"]].value if "type" in node else 0
+    value = 0
+    new_name = b""
+    data = node.get("data")
+    if item.event == Events.READ:
+        data = item.data
+    elif item.event == Events.WRITE:
+        value = item.buffer_length or 0
+    elif item.event == Events.RENAME:
+        value = item.new_dir.get("entry", {}).get("inode", 0)
+        new_name = os.fsencode(item.new_name)
+    name = os.fsencode(entry.get("name") or b"")
+    path = os.fsencode(entry.get("path") or b"")
+    if isinstance(data, str):
+        data = os.fsencode(data)
+    elif not isinstance(data, (bytes, bytearray)):
+        # Results of readdir aren't sent.
+        data = b""
+    return _EVENT.pack(item.event.value, item.operation.value, node_type, flags, entry.get("inode", 0),
+                       node.get("parent") or 0, mode, value, len(name), len(path), len(new_name),
+                       len(data)) + name + path + new_name + data
+
+
+def decode_batch(payload):
+    """ Returns the sequence, the dropped events and the events of a BATCH frame.
+    Events are decoded into iotfs.listener.objects.ListenerObject instances, whose obj holds the dicts of the node and
+    the entry as sent by iotfs.filesystem.producer_fs.ProducerFileSystem.
+
+    """
+    sequence, dropped, count = _BATCH.unpack_from(payload)
+    offset = _BATCH.size
+    events = []
+    for _ in range(count):
+        item, offset = _decode_event(payload, offset)
+        events.append(item)
+    return sequence, dropped, events
+
+
+def _decode_event(payload, offset):
+    event, operation, node_type, flags, inode, parent, mode, value, name_length, path_length, new_name_length,\
+        data_length = _EVENT.unpack_from(payload, offset)
+    offset += _EVENT.size
+    name = payload[offset:offset + name_length]
+    offset += name_length
+    path = os.fsdecode(payload[offset:offset + path_length])
+    offset += path_length
+    new_name = payload[offset:offset + new_name_length]
+    offset += new_name_length
+    data = payload[offset:offset + data_length]
+    offset += data_length
+
+    event = _EVENT_TYPES[event]
+    operation = _OPERATIONS[operation]
+    node = {
+        "parent": parent if parent != 0 else None,
+        "type": _TYPES[node_type].name,
+        "mode": oct(mode),
+        "invisible": bool(flags & _INVISIBLE),
+        "lock": bool(flags & _LOCKED)
+    }
+    if event != Events.READ and node["type"] == Types.FILE.name:
+        node["data"] = data
+    obj = {"node": node, "entry": {"inode": inode, "name": name, "path": path}}
+    if event == Events.CREATE:
+        item = CreateObject(operation, obj)
+    elif event == Events.READ:
+        item = ReadObject(operation, obj, data)
+    elif event == Events.WRITE:
+        item = WriteObject(operation, obj, value)
+    elif event == Events.RENAME:
+        item = RenameObject(operation, obj, {"entry": {"inode": value}}, new_name)
+    else:
+        item = RemoveObject(operation, obj)
+    return item, offset
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+import collections
+import queue as queues
+import selectors
+import socket
+
+from iotfs.listener.listener import Listener
+from iotfs.listener import protocol
+from iotfs.utils._fs_utils import remove_socket
+
+# Events per BATCH frame.
+DEFAULT_BATCH_SIZE = 512
+# Batches a client may receive, before it has to acknowledge them.
+DEFAULT_WINDOW = 8
+# Events buffered for a slow client, older events are dropped beyond.
+DEFAULT_MAX_PENDING = 65536
+# Seconds waited for new events or for clients, which can't receive events yet.
+POLL_INTERVAL = 0.01
+
+
+class _Client():
+
+    """
+    _Client is the state of a connected client: events not sent yet, the batches it didn't acknowledge yet and the
+    bytes not written to its socket yet.
+
+    """
+
+    def __init__(self, sock, max_pending):
+        self.sock = sock
+        self.pending = collections.deque(maxlen=max_pending)
+        self.dropped = 0
+        self.sequence = 0
+        self.acked = 0
+        self.incoming = bytearray()
+        self.outgoing = bytearray()
+
+    def unacked(self):
+        return self.sequence - self.acked
+
+
+class EventServer(Listener):
+
+    """
+    EventServer streams the events of the filesystem to processes connecting to a Unix domain socket, instead of
+    processing them in the process of the filesystem. Events are encoded once in the compact binary format of
+    iotfs.listener.protocol and sent to every client in batches.
+    Clients acknowledge batches, a client receives at most window batches unacknowledged. Events for a client, which
+    doesn't keep up, are buffered up to max_pending. Beyond, its oldest events are dropped and it is told about the
+    amount with its next batch, so a slow client never blocks the filesystem or other clients.
+    See iotfs.listener.client.EventClient for a client.
+
+    ...
+
+    Attributes
+    ----------
+    path : str
+        path of the Unix domain socket
+    queue : queue.Queue
+        a message queue from the file system
+    batch_size : int, optional
+        maximum amount of events per batch
+    window : int, optional
+        amount of batches a client may receive unacknowledged
+    max_pending : int, optional
+        amount of events buffered per client
+
+    """
+
+    def __init__(self, path, queue=None, batch_size=DEFAULT_BATCH_SIZE, window=DEFAULT_WINDOW,
+                 max_pending=DEFAULT_MAX_PENDING):
+        """
+        Parameters
+        ----------
+        path : str
+            path of the Unix domain socket
+        queue : queue.Queue
+            a message queue from the file system
+        batch_size : int, optional
+            maximum amount of events per batch
+        window : int, optional
+            amount of batches a client may receive unacknowledged
+        max_pending : int, optional
+            amount of events buffered per client
+        """
+
+        super().__init__(queue)
+        self.path = path
+        self.batch_size = batch_size
+        self.window = window
+        self.max_pending = max_pending
+        self.selector = None
+        self.sock = None
+        self.clients = dict()
+        self.running = False
+
+    def start(self):
+        if self.queue is None:
+            raise ValueError("Queue is missing.")
+        self.listen()
+        self.running = True
+        try:
+            while self.running:
+                self.serve()
+        except Exception as e:
+            self.log.error(e)
+        finally:
+            self.close()
+
+    def stop(self):
+        self.running = False
+
+    def listen(self):
+        remove_socket(self.path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        self.sock.listen(16)
+        self.sock.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_READ)
+        self.log.info("Serving events at %s", self.path)
+
+    def close(self):
+        for client in list(self.clients.values()):
+            self.__disconnect(client)
+        if self.sock is not None:
+            self.selector.unregister(self.sock)
+            self.sock.close()
+            self.selector.close()
+            self.sock = None
+            try:
+                remove_socket(self.path)
+            except OSError as e:
+                self.log.warning("Socket %s not removed: %s", self.path, e)
+
+    def serve(self):
+        """ Takes the queued events, serves the sockets and sends batches, as far as clients can receive them.
+        Clients with events left wait for their socket to become writable or for an acknowledgement, so the selector
+        blocks for them. Otherwise the queue blocks for new events.
+
+        """
+        waiting = any(len(client.outgoing) > 0 or len(client.pending) > 0 for client in self.clients.values())
+        taken = self.__take(block=not waiting)
+        for key, mask in self.selector.select(POLL_INTERVAL if waiting and taken == 0 else 0):
+            if key.fileobj is self.sock:
+                self.__accept()
+                continue
+            client = key.data
+            if mask & selectors.EVENT_READ:
+                self.__receive(client)
+            if mask & selectors.EVENT_WRITE and client.sock.fileno() != -1:
+                self.__send(client)
+        for client in list(self.clients.values()):
+            self.__fill(client)
+            if len(client.outgoing) > 0:
+                self.__send(client)
+
+    def process(self, item):
+        """ Encodes item once and buffers it for every client.
+
+        """
+        if len(self.clients) == 0:
+            return
+        event = protocol.encode_event(item)
+        for client in self.clients.values():
+            if len(client.pending) == client.pending.maxlen:
+                client.dropped += 1
+            client.pending.append(event)
+
+    def __take(self, block):
+        try:
+            item = self.queue.get(timeout=POLL_INTERVAL) if block else self.queue.get_nowait()
+        except queues.Empty:
+            return 0
+        taken = 0
+        while True:
+            self.process(item)
+            self.queue.task_done()
+            taken += 1
+            if taken >= self.batch_size * self.window:
+                return taken
+            try:
+                item = self.queue.get_nowait()
+            except queues.Empty:
+                return taken
+
+    def __accept(self):
+        try:
+            sock, _ = self.sock.accept()
+        except OSError:
+            return
+        sock.setblocking(False)
+        client = _Client(sock, self.max_pending)
+        client.outgoing += protocol.encode_hello(self.window)
+        self.clients[sock.fileno()] = client
+        self.selector.register(sock, selectors.EVENT_READ, client)
+        self.log.info("Event client %d connected.", sock.fileno())
+
+    def __receive(self, client):
+        try:
+            data = client.sock.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if len(data) == 0:
+            self.__disconnect(client)
+            return
+        client.incoming += data
+        for kind, payload in protocol.read_frames(client.incoming):
+            if kind == protocol.ACK:
+                sequence = protocol.decode_ack(payload)
+                if client.acked < sequence <= client.sequence:
+                    client.acked = sequence
+
+    def __fill(self, client):
+        while len(client.pending) > 0 and client.unacked() < self.window:
+            count = min(self.batch_size, len(client.pending))
+            events = [client.pending.popleft() for _ in range(count)]
+            client.sequence += 1
+            client.outgoing += protocol.encode_batch(client.sequence, client.dropped, events)
+            client.dropped = 0
+
+    def __send(self, client):
+        try:
+            sent = client.sock.send(client.outgoing)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError:
+            self.__disconnect(client)
+            return
+        del client.outgoing[:sent]
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if len(client.outgoing) > 0 else 0)
+        self.selector.modify(client.sock, events, client)
+
+    def __disconnect(self, client):
+        fileno = client.sock.fileno()
+        if self.clients.pop(fileno, None) is None:
+            return
+        self.selector.unregister(client.sock)
+        client.sock.close()
+        self.log.info("Event client %d disconnected.", fileno)
@@ -3,12 +3,17 @@
 
 from argparse import ArgumentParser
 import concurrent.futures
+import multiprocessing
 import os
 from queue import Queue
 
+from iotfs.adapters.ingest import IngestAdapter
 from iotfs.filesystem.fs import FileSystemStarter, FileSystem
+from iotfs.filesystem.data.metadata_index import parse_size
+from iotfs.filesystem.shard import Shard, run_shard
 from iotfs.filesystem.standard_fs import StandardFileSystem
 from iotfs.filesystem.producer_fs import ProducerFileSystem
+from iotfs.listener.server import EventServer
 
 from iotfs.utils import _logging
 
@@ -24,27 +29,39 @@ class IoTFS():
     ----------
     fs : iotfs.filesystem.fs.FileSystem
         a filesystem object inheriting from FileSystem
-    adapters : list
-        input adapters inheriting iotfs.input._adapter.Adapter that define the way data flows into the filesystem
+    adapters : list, optional
+        input adapters inheriting iotfs.adapters.adapter.Adapter that define the way data flows into the filesystem
     listeners : list
         listeners inheriting iotfs.input._listener.Listener that define listening processes
     debug : bool, optional
         this defines whether the logging output should include the debug level
+    min_tasks : int, optional
+        minimum amount of worker tasks handling requests of the kernel
+    max_tasks : int, optional
+        maximum amount of worker tasks handling requests of the kernel
+    stall_threshold : float, optional
+        seconds without progress of the trio loop, which the watchdog reports as stall, 1 second by default
 
     """
 
-    def __init__(self, fs, listeners=[], debug=False):
+    def __init__(self, fs, listeners=[], debug=False, adapters=[], min_tasks=1, max_tasks=99, stall_threshold=None):
         """
         Parameters
         ----------
         fs : iotfs.filesystem.fs.FileSystem
             a filesystem object inheriting from FileSystem
-        adapters : list
-            input adapters inheriting iotfs.input._adapter.Adapter that define the way data flows into the filesystem
+        adapters : list, optional
+            input adapters inheriting iotfs.adapters.adapter.Adapter that define the way data flows into the filesystem
         listeners : list
             listeners inheriting iotfs.input._listener.Listener that define listening processes
         debug : bool, optional
             this defines whether the logging output should include the debug level
+        min_tasks : int, optional
+            minimum amount of worker tasks handling requests of the kernel
+        max_tasks : int, optional
+            maximum amount of worker tasks handling requests of the kernel
+        stall_threshold : float, optional
+            seconds without progress of the trio loop, which the watchdog reports as stall, 1 second by default
         """
 
         log = _logging.create_logger(debug=debug)
@@ -62,7 +79,9 @@ class IoTFS():
                 log.warning("Creating mountpoint: %s", fs.mount_point)
                 os.mkdir(fs.mount_point)
             with concurrent.futures.ThreadPoolExecutor(max_workers=len(listeners) + 1) as executor:
-                executor.submit(FileSystemStarter(fs).start)
+                starter = FileSystemStarter(fs, adapters=adapters, min_tasks=min_tasks, max_tasks=max_tasks,
+                                            stall_threshold=stall_threshold)
+                executor.submit(starter.start)
                 for listener in listeners:
                     executor.submit(listener.start)
 
@@ -70,6 +89,77 @@ class IoTFS():
             log.error(e)
 
 
+class ShardedIoTFS():
+
+    """
+    ShardedIoTFS serves several filesystems in separate processes to use more than one core.
+    Every shard owns a top-level subtree and is mounted at root/name, so all shards appear below root.
+    Listeners receive the events of all shards through a shared queue and metrics are published into a dict
+    shared by all shards.
+
+    ...
+
+    Attributes
+    ----------
+    root : str
+        a common directory, in which the shards are mounted
+    shards : list
+        iotfs.filesystem.shard.Shard instances
+    listeners : list, optional
+        listeners inheriting iotfs.listener.listener.Listener, which listen to all shards
+    debug : bool, optional
+        this defines whether the logging output should include the debug level
+
+    """
+
+    def __init__(self, root, shards, listeners=[], debug=False):
+        """
+        Parameters
+        ----------
+        root : str
+            a common directory, in which the shards are mounted
+        shards : list
+            iotfs.filesystem.shard.Shard instances
+        listeners : list, optional
+            listeners inheriting iotfs.listener.listener.Listener, which listen to all shards
+        debug : bool, optional
+            this defines whether the logging output should include the debug level
+        """
+
+        log = _logging.create_logger(debug=debug)
+        log.info("Starting %d shards.", len(shards))
+        names = [shard.name for shard in shards]
+        if len(shards) == 0 or len(set(names)) != len(names):
+            raise ValueError("Shards need unique names: {}".format(names))
+        os.environ["MOUNT_POINT"] = os.path.abspath(root)
+        if not os.path.isdir(root):
+            log.warning("Creating root of shards: %s", root)
+            os.mkdir(root)
+        manager = multiprocessing.Manager()
+        self.metrics = manager.dict()
+        queue = multiprocessing.JoinableQueue(0)
+        for listener in listeners:
+            listener.setQueue(queue)
+        processes = [multiprocessing.Process(target=run_shard, name="Shard-" + shard.name,
+                                             args=(shard, root, queue, self.metrics, debug)) for shard in shards]
+        try:
+            for process in processes:
+                process.start()
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(listeners) + 1) as executor:
+                executor.submit(self.__join, processes)
+                for listener in listeners:
+                    executor.submit(listener.start)
+
+        except (BaseException, Exception) as e:
+            log.error(e)
+        finally:
+            manager.shutdown()
+
+    def __join(self, processes):
+        for process in processes:
+            process.join()
+
+
 def parse_args():
     '''Parse command line'''
 
@@ -79,15 +169,59 @@ def parse_args():
                         help='Where to mount the file system')
     parser.add_argument('--debug', action='store_true', default=False,
                         help='Enable debugging output')
+    parser.add_argument('--max-tasks', type=int, default=99,
+                        help='Maximum amount of concurrently handled requests')
+    parser.add_argument('--trace', type=str, default=None,
+                        help='Record all operations into this binary trace file')
+    parser.add_argument('--hash-names', action='store_true', default=False,
+                        help='Record hashes instead of names into the trace')
+    parser.add_argument('--memory-budget', type=str, default=None,
+                        help='Spill file contents beyond this size to disk, e.g. 512M')
+    parser.add_argument('--spill-dir', type=str, default=None,
+                        help='Directory of spilled file contents, a temporary directory by default')
+    parser.add_argument('--shards', type=str, nargs='+', default=[],
+                        help='Serve these top-level directories in separate processes below mountpoint')
+    parser.add_argument('--event-socket', type=str, default=None,
+                        help='Stream the events of the filesystem to clients of this Unix domain socket')
+    parser.add_argument('--ingest-socket', type=str, default=None,
+                        help='Apply batches of updates written to this Unix domain socket, without shards only')
+    parser.add_argument('--stall-threshold', type=float, default=None,
+                        help='Report stalls of the event loop longer than these seconds, 1 by default')
     return parser.parse_args()
 
 
 def main():
     options = parse_args()
 
-    fs = StandardFileSystem(options.mountpoint, debug=options.debug)
-
-    IoTFS(fs, debug=options.debug)
+    listeners = []
+    if options.event_socket is not None:
+        listeners.append(EventServer(options.event_socket))
+
+    if len(options.shards) > 0:
+        fs_class = ProducerFileSystem if len(listeners) > 0 else StandardFileSystem
+        shards = [Shard(name, fs_class=fs_class, max_tasks=options.max_tasks, stall_threshold=options.stall_threshold)
+                  for name in options.shards]
+        ShardedIoTFS(options.mountpoint, shards, listeners=listeners, debug=options.debug)
+        return
+
+    if len(listeners) > 0:
+        fs = ProducerFileSystem(options.mountpoint, debug=options.debug)
+    else:
+        fs = StandardFileSystem(options.mountpoint, debug=options.debug)
+    if options.memory_budget is not None:
+        fs.set_memory_budget(parse_size(options.memory_budget), directory=options.spill_dir)
+    if options.trace is not None:
+        fs.start_trace(options.trace, hash_names=options.hash_names)
+
+    adapters = []
+    if options.ingest_socket is not None:
+        adapters.append(IngestAdapter(options.ingest_socket))
+
+    try:
+        IoTFS(fs, listeners=listeners, debug=options.debug, adapters=adapters, max_tasks=options.max_tasks,
+              stall_threshold=options.stall_threshold)
+    finally:
+        fs.stop_trace()
 
 
 if __name__ == "__main__":
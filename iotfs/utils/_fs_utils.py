@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 
+import errno
+import os
+import stat
 from enum import Enum
 
 
@@ -31,11 +34,109 @@ class LinkTypes(Enum):
     SYMBOLIC = 1
 
 
+class Updates(Enum):
+    """ Differs between WRITE, APPEND, MKDIR and REMOVE operations of bulk updates.
+
+    """
+
+    WRITE = 0
+    APPEND = 1
+    MKDIR = 2
+    REMOVE = 3
+
+
+class CachePolicies(Enum):
+    """ Differs between DEFAULT, IMMUTABLE and LIVE policies of the page cache of files.
+
+    """
+
+    DEFAULT = 0
+    IMMUTABLE = 1
+    LIVE = 2
+
+
 # Root inode is 1 on every start up.
 ROOT_INODE = 1
 
 # Standard mode is rwx-rw-rw
 STANDARD_MODE = 0o766
 
+# Virtual files are read only: r--r--r--
+VIRTUAL_MODE = 0o444
+
+# Writable control files: rw-r--r--
+CONTROL_MODE = 0o644
+
+# Directory below the root containing control files of the filesystem.
+CONTROL_DIR = ".iotfs"
+
+# Directory below the root, whose subdirectories <name>/<value> link to the files with this extended attribute.
+QUERY_XATTR_DIR = ".query/xattr"
+
+# Query directories are read only: r-xr-xr-x
+QUERY_MODE = 0o555
+
+# Directory below the root, in which mkdir <name> takes a snapshot of the tree and rmdir <name> drops it.
+SNAPSHOTS_DIR = ".snapshots"
+
+# Directories below the root, which are changed by the filesystem only.
+RESERVED_DIRS = (CONTROL_DIR, QUERY_XATTR_DIR.split(os.sep)[0], SNAPSHOTS_DIR)
+
+# Extended attribute of the root, which controls the profiler.
+PROFILE_XATTR = b"user.iotfs.profile"
+
+# Directories with this suffix are created as time series.
+SERIES_SUFFIX = ".series"
+
+# Virtual files of a time series directory containing an aggregate.
+SERIES_AGGREGATES = ("count", "min", "max", "mean", "last")
+
 # Special link mode.
 LINK_MODE = 41471
+
+
+def split_path(path):
+    """ Returns the parts of a path relative to the root entry without empty and "." parts.
+
+    Raises
+    ------
+    ValueError
+        If a part is "..", which would be created as a directory of this name.
+    """
+    parts = [part for part in path.split(os.sep) if part != "" and part != "."]
+    if ".." in parts:
+        raise ValueError("Path contains ..: {}".format(path))
+    return parts
+
+
+def normalize_update_path(path):
+    """ Returns the normalized path of an update relative to the root entry.
+
+    Raises
+    ------
+    ValueError
+        If the path is empty, contains ".." or lies below a reserved directory, e.g. .iotfs.
+    """
+    parts = split_path(path)
+    if len(parts) == 0:
+        raise ValueError("Path is empty: {}".format(path))
+    if parts[0] in RESERVED_DIRS:
+        raise ValueError("Path is below the reserved directory {}: {}".format(parts[0], path))
+    return os.sep.join(parts)
+
+
+def remove_socket(path):
+    """ Removes the Unix domain socket at path, e.g. one left behind by a previous run. A missing path is ignored.
+
+    Raises
+    ------
+    FileExistsError
+        If path is no socket, which is never removed.
+    """
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(errno.EEXIST, "No socket, not removed", path)
+    os.unlink(path)
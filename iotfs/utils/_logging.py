@@ -1,14 +1,22 @@
 # -*- coding: utf-8 -*-
 
+import atexit
 import logging
+import logging.handlers
+from queue import Queue
 from sys import stdout
 import os
 
 LOGGER_LIST = []
 
+# logger name -> logging.handlers.QueueListener writing the records of the logger
+LISTENERS = dict()
+
 
 def create_logger(name="iotfs", debug=False, with_file=True):
     """ Creates a logger.
+    Records are put into a queue and written to stdout and the log file by a separate thread,
+    so logging doesn't block the trio loop handling requests.
 
     """
 
@@ -42,9 +50,14 @@ def create_logger(name="iotfs", debug=False, with_file=True):
     else:
         logger.setLevel(logging.INFO)
 
+    handlers = [sh]
     if with_file:
-        logger.addHandler(fh)
-    logger.addHandler(sh)
+        handlers.insert(0, fh)
+    queue = Queue(-1)
+    listener = logging.handlers.QueueListener(queue, *handlers)
+    listener.start()
+    LISTENERS[logger.name] = listener
+    logger.addHandler(logging.handlers.QueueHandler(queue))
 
     # duplicate logs:
     # https://stackoverflow.com/questions/19561058/duplicate-output-in-simple-python-logging-configuration/19561320
@@ -54,3 +67,25 @@ def create_logger(name="iotfs", debug=False, with_file=True):
     logger.info("Initialize Logger: %s", logger.name)
 
     return logger
+
+
+@atexit.register
+def flush_loggers():
+    """ Writes all queued records and stops the threads of the loggers.
+
+    """
+    for name in list(LISTENERS):
+        LISTENERS.pop(name).stop()
+
+
+def restart_loggers():
+    """ Restarts the threads of the loggers in a forked process, which only inherits the forking thread.
+
+    """
+    for name, listener in list(LISTENERS.items()):
+        queue = Queue(-1)
+        for handler in logging.getLogger(name).handlers:
+            if isinstance(handler, logging.handlers.QueueHandler):
+                handler.queue = queue
+        LISTENERS[name] = logging.handlers.QueueListener(queue, *listener.handlers)
+        LISTENERS[name].start()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import trio
+
+
+class Metrics():
+
+    """
+    Metrics holds named counters and gauges of a filesystem.
+    A filesystem running as shard of a sharded mount shares its metrics by periodically publishing them
+    into a dict, which is shared by all shards (multiprocessing.Manager().dict()). Totals span all shards then.
+
+    ...
+
+    Attributes
+    ----------
+    shared : dict, optional
+        a dict shared by all shards. Maps the name of a shard to the published metrics of the shard.
+    shard : str, optional
+        the name of the shard, under which metrics are published
+
+    """
+
+    def __init__(self, shared=None, shard=None):
+        """
+        Parameters
+        ----------
+        shared : dict, optional
+            a dict shared by all shards. Maps the name of a shard to the published metrics of the shard.
+        shard : str, optional
+            the name of the shard, under which metrics are published
+        """
+
+        self.values = dict()
+        self.shared = shared
+        self.shard = shard
+
+    def share(self, shared, shard):
+        self.shared = shared
+        self.shard = shard
+
+    def increment(self, name, amount=1):
+        self.values[name] = self.values.get(name, 0) + amount
+
+    def set(self, name, value):
+        self.values[name] = value
+
+    def get(self, name, default=0):
+        return self.values.get(name, default)
+
+    def snapshot(self):
+        """ Returns a copy of the metrics of this filesystem.
+
+        """
+        return dict(self.values)
+
+    def total(self):
+        """ Returns the metrics summed over all shards. Without sharing, the metrics of this filesystem are returned.
+
+        """
+        if self.shared is None:
+            return self.snapshot()
+        shards = dict(self.shared)
+        # The own metrics are more recent than the published ones.
+        shards[self.shard] = self.snapshot()
+        return sum_metrics(shards.values())
+
+    def publish(self):
+        if self.shared is not None:
+            self.shared[self.shard] = self.snapshot()
+
+    async def run(self, interval=1.0):
+        """ Publishes the metrics every interval until cancelled.
+        Publishing talks to the process of the shared dict, so it's done in a worker thread.
+
+        """
+        while True:
+            await trio.to_thread.run_sync(self.publish)
+            await trio.sleep(interval)
+
+
+def sum_metrics(metrics):
+    """ Sums a list of metric dicts by name.
+
+    """
+    total = dict()
+    for values in metrics:
+        for name, value in values.items():
+            total[name] = total.get(name, 0) + value
+    return total
@@ -0,0 +1,199 @@
+import errno
+import os
+import struct
+
+import pytest
+import trio
+
+from iotfs.adapters.adapter import Adapter
+from iotfs.adapters.ingest import IngestAdapter, encode_batch, decode_frame, decode_ack, ACK
+from iotfs.adapters.mqtt import MQTTAdapter, encode_packet, encode_string, decode_packet, CONNACK, SUBACK, PUBLISH,\
+    CONNECT, SUBSCRIBE
+from iotfs.adapters.stream import StreamAdapter
+from iotfs.filesystem.data.data import Data
+from iotfs.utils._fs_utils import Encodings, Updates
+
+
+def create_data():
+    data = Data()
+    data.add_root_entry("dir")
+    return data
+
+
+def read(data, path):
+    entry = data.get_entry_by_relative_path(path)
+    assert entry is not None
+    return data.nodes[entry.inode].get_data(encoding=Encodings.UTF_8_ENCODING)
+
+
+class ListAdapter(Adapter):
+
+    def __init__(self, updates, **kwargs):
+        super().__init__(**kwargs)
+        self.updates = updates
+
+    async def produce(self, channel):
+        for update in self.updates:
+            await channel.send(update)
+
+
+def test_update_paths():
+    adapter = ListAdapter([])
+    assert adapter.update("/site/./temp", b"1") == (Updates.WRITE, "site/temp", b"1")
+    for path in ("../../etc", "site/../../etc", ".iotfs/metrics", "./.iotfs/changes", ".query/xattr", ".snapshots/x",
+                 ""):
+        with pytest.raises(ValueError):
+            adapter.update(path, b"1")
+    assert ListAdapter([], root="in").update(".iotfs", b"1") == (Updates.WRITE, "in/.iotfs", b"1")
+
+
+def test_batches():
+    data = create_data()
+    updates = [(Updates.WRITE, "a/b/value", str(idx)) for idx in range(100)]
+    updates.append((Updates.APPEND, "a/b/value", "!"))
+    updates.append((Updates.MKDIR, "a/c", None))
+    adapter = ListAdapter(updates, batch_size=1000, buffer_size=10)
+    trio.run(adapter.run, data)
+    assert read(data, "a/b/value") == "99!"
+    assert data.get_entry_by_relative_path("a/c") is not None
+    assert adapter.applied == 102
+    assert adapter.batches < 102
+
+
+def test_remove():
+    data = create_data()
+    data.apply_updates([(Updates.WRITE, "a/value", "1")])
+    data.apply_updates([(Updates.REMOVE, "a/value", None), (Updates.REMOVE, "a", None)])
+    assert data.get_entry_by_relative_path("a") is None
+    assert len(data.nodes) == 1
+
+
+def test_remove_open_file():
+    data = create_data()
+    data.apply_updates([(Updates.WRITE, "a/value", "1")])
+    inode = data.get_entry_by_relative_path("a/value").inode
+    # Looked up and opened by the kernel.
+    data.try_increase_op_count(inode)
+    data.try_increase_op_count(inode)
+    data.apply_updates([(Updates.REMOVE, "a/value", None), (Updates.REMOVE, "a", None)])
+    assert data.get_entry_by_relative_path("a") is None
+    assert data.nodes[inode].get_data(encoding=Encodings.UTF_8_ENCODING) == "1"
+
+    data.try_decrease_op_count(inode)
+    assert inode in data.nodes
+    data.nodes[inode].dec_open_count()
+    data.try_remove_inode(inode)
+    assert inode not in data.nodes and len(data.removed) == 0
+    assert len(data.nodes) == 1
+
+
+async def stand_in_broker(stream, messages):
+    buffer = bytearray()
+    received = []
+    while len(received) < 2:
+        buffer += await stream.receive_some(4096)
+        offset = 0
+        while True:
+            packet = decode_packet(buffer, offset)
+            if packet is None:
+                break
+            received.append(packet[0])
+            offset = packet[3]
+        del buffer[:offset]
+    assert received == [CONNECT, SUBSCRIBE]
+    await stream.send_all(encode_packet(CONNACK, bytes([0, 0])))
+    await stream.send_all(encode_packet(SUBACK, struct.pack("!H", 1) + bytes([0])))
+    packets = b"".join(encode_packet(PUBLISH, encode_string(topic) + payload) for topic, payload in messages)
+    await stream.send_all(packets)
+    # Half close and wait for the client to close the connection.
+    await stream.send_eof()
+    while await stream.receive_some(4096):
+        pass
+    await stream.aclose()
+
+
+def test_mqtt():
+    data = create_data()
+    messages = [("site/device{}/temp".format(idx % 10), str(idx).encode()) for idx in range(1000)]
+
+    async def main():
+        async with trio.open_nursery() as nursery:
+            listeners = await nursery.start(trio.serve_tcp, lambda stream: stand_in_broker(stream, messages), 0)
+            port = listeners[0].socket.getsockname()[1]
+            adapter = MQTTAdapter("127.0.0.1", port=port, root="mqtt")
+            await adapter.run(data)
+            nursery.cancel_scope.cancel()
+        return adapter
+
+    adapter = trio.run(main)
+    assert adapter.applied == 1000
+    for idx in range(990, 1000):
+        assert read(data, os.path.join("mqtt", "site", "device{}".format(idx % 10), "temp")) == str(idx)
+
+
+def test_stream():
+    data = create_data()
+    adapter = StreamAdapter(0, root="stream")
+    lines = b"".join("sensor{} {}\n".format(idx % 5, idx).encode() for idx in range(500))
+
+    async def main():
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(adapter.run, data)
+            while adapter.listeners is None:
+                await trio.sleep(0.01)
+            port = adapter.listeners[0].socket.getsockname()[1]
+            stream = await trio.open_tcp_stream("127.0.0.1", port)
+            async with stream:
+                await stream.send_all(lines + b"last 1")
+            while adapter.applied < 501:
+                await trio.sleep(0.01)
+            nursery.cancel_scope.cancel()
+
+    trio.run(main)
+    for idx in range(495, 500):
+        assert read(data, os.path.join("stream", "sensor{}".format(idx % 5))) == str(idx)
+    assert read(data, os.path.join("stream", "last")) == "1"
+
+
+def test_ingest(tmp_path):
+    data = create_data()
+    path = str(tmp_path / "ingest.sock")
+    adapter = IngestAdapter(path, root="ingest")
+    first = [(Updates.WRITE, "site/temp", b"21.5"), (Updates.APPEND, "site/temp", b"!"), (Updates.MKDIR, "empty", None)]
+    second = [(Updates.WRITE, "site/humidity", b"40"), (Updates.REMOVE, "empty", None)]
+    # Fails as a whole, because the directory is gone already.
+    third = [(Updates.WRITE, "site/temp", b"0"), (Updates.REMOVE, "empty", None)]
+    outside = [(Updates.WRITE, "site/temp", b"0"), (Updates.MKDIR, "../../etc", None)]
+    acks = []
+
+    async def main():
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(adapter.run, data)
+            while adapter.listeners is None:
+                await trio.sleep(0.01)
+            sock = trio.socket.socket(trio.socket.AF_UNIX, trio.socket.SOCK_STREAM)
+            await sock.connect(path)
+            async with trio.SocketStream(sock) as stream:
+                malformed = encode_batch(3, first)[:-2]
+                malformed = struct.pack("!I", len(malformed) - 4) + malformed[4:]
+                await stream.send_all(encode_batch(1, first) + encode_batch(2, second) + encode_batch(4, third) +
+                                      encode_batch(5, outside) + malformed)
+                buffer = bytearray()
+                while len(acks) < 5:
+                    buffer += await stream.receive_some(1024)
+                    frame = decode_frame(buffer)
+                    while frame is not None:
+                        assert frame[0] == ACK
+                        acks.append(decode_ack(frame[1]))
+                        del buffer[:frame[2]]
+                        frame = decode_frame(buffer)
+            nursery.cancel_scope.cancel()
+
+    trio.run(main)
+    assert acks == [(1, 0, 3), (2, 0, 2), (4, errno.ENOENT, 0), (5, errno.EINVAL, 0), (3, errno.EINVAL, 0)]
+    assert read(data, "ingest/site/temp") == "21.5!"
+    assert data.get_entry_by_relative_path("etc") is None
+    assert read(data, "ingest/site/humidity") == "40"
+    assert data.get_entry_by_relative_path("ingest/empty") is None
+    assert adapter.batches == 2 and adapter.applied == 5
+    assert not os.path.exists(path)
@@ -0,0 +1,89 @@
+import errno
+
+import pytest
+
+from iotfs.filesystem._batch import parse_batch
+from iotfs.filesystem.data.data import Data
+from iotfs.utils._fs_utils import Updates
+
+
+def test_lines():
+    updates = parse_batch(b"write site/temp 21.5\n\nappend /site/log a b c\nmkdir site/empty\nunlink site/old\n")
+    assert updates == [(Updates.WRITE, "site/temp", b"21.5"), (Updates.APPEND, "site/log", b"a b c"),
+                       (Updates.MKDIR, "site/empty", None), (Updates.REMOVE, "site/old", None)]
+
+
+def test_json():
+    updates = parse_batch(b'[{"op": "write", "path": "site/temp", "data": "21.5"}, {"path": "site/count", "data": 3},'
+                          b'{"op": "rmdir", "path": "site/empty"}]')
+    assert updates == [(Updates.WRITE, "site/temp", b"21.5"), (Updates.WRITE, "site/count", b"3"),
+                       (Updates.REMOVE, "site/empty", None)]
+    assert parse_batch(b' {"op": "mkdir", "path": "a"}') == [(Updates.MKDIR, "a", None)]
+
+
+def test_malformed_batches():
+    for buf in (b"write site/temp 1\nmove a b\n", b"write\n", b"write ../etc/passwd x\n", b"[{\"op\": \"write\"}]",
+                b"[1, 2", b'"text"', b"remove ./.iotfs/metrics\n", b"remove .query/xattr\n", b"mkdir .snapshots/x\n",
+                b"write site/./../.iotfs/batch x\n", b"mkdir ./\n"):
+        with pytest.raises(ValueError):
+            parse_batch(buf)
+
+
+def test_normalized_paths():
+    updates = parse_batch(b"write ./site//temp/. 1\nmkdir .iotfs.d\n")
+    assert updates == [(Updates.WRITE, "site/temp", b"1"), (Updates.MKDIR, ".iotfs.d", None)]
+
+
+def test_atomic_updates():
+    data = Data()
+    data.add_root_entry("mnt")
+    data.apply_updates([(Updates.WRITE, "site/temp", b"1"), (Updates.WRITE, "site/dev/state", b"on")])
+    nodes = len(data.nodes)
+    for updates, code in (([(Updates.WRITE, "site/temp", b"2"), (Updates.REMOVE, "site/missing", None)], errno.ENOENT),
+                          ([(Updates.WRITE, "site/new", b"2"), (Updates.APPEND, "site/temp/x", b"3")], errno.ENOTDIR),
+                          ([(Updates.MKDIR, "site/empty", None), (Updates.WRITE, "site", b"4")], errno.EISDIR),
+                          ([(Updates.REMOVE, "site/temp", None), (Updates.REMOVE, "site", None)], errno.ENOTEMPTY),
+                          ([(Updates.REMOVE, "site/temp", None), (Updates.REMOVE, "site/temp", None)], errno.ENOENT)):
+        with pytest.raises(OSError) as info:
+            data.apply_updates(updates, atomic=True)
+        assert info.value.errno == code
+        assert len(data.nodes) == nodes
+        assert data.nodes[data.get_entry_by_relative_path("site/temp").inode].get_data() == b"1"
+
+    # Each update is checked against the tree as changed by the ones before it.
+    data.apply_updates([(Updates.REMOVE, "site/dev/state", None), (Updates.REMOVE, "site/dev", None),
+                        (Updates.WRITE, "site/dev", b"off"), (Updates.REMOVE, "site/temp", None),
+                        (Updates.WRITE, "site/temp/value", b"5")], atomic=True)
+    assert data.nodes[data.get_entry_by_relative_path("site/dev").inode].get_data() == b"off"
+    assert data.nodes[data.get_entry_by_relative_path("site/temp/value").inode].get_data() == b"5"
+
+    # Otherwise failing updates are skipped and not counted.
+    assert data.apply_updates([(Updates.WRITE, "site/count", b"1"), (Updates.APPEND, "site/count", b"2"),
+                               (Updates.REMOVE, "site/missing", None), (Updates.MKDIR, "site/dev", None)]) == 2
+
+
+def test_parent_parts():
+    data = Data()
+    data.add_root_entry("mnt")
+    updates = [(Updates.WRITE, "../etc/passwd", b"x"), (Updates.WRITE, "site/..", b"x"), (Updates.MKDIR, "..", None),
+               (Updates.MKDIR, "site/../../up", None), (Updates.REMOVE, "site/..", None)]
+    assert data.apply_updates(updates) == 0
+    assert len(data.nodes) == 1
+    with pytest.raises(ValueError):
+        data.make_dirs("site/../etc")
+    assert data.get_entry_by_relative_path("..") is None
+    with pytest.raises(OSError) as info:
+        data.apply_updates([(Updates.MKDIR, "site", None), (Updates.WRITE, "site/../x", b"1")], atomic=True)
+    assert info.value.errno == errno.EINVAL
+    assert len(data.nodes) == 1
+
+
+def test_changes():
+    data = Data()
+    data.add_root_entry("mnt")
+    changes = []
+    updates = [(Updates.WRITE, "site/temp", b"1"), (Updates.APPEND, "site/temp", b"2"),
+               (Updates.REMOVE, "missing", None), (Updates.MKDIR, "/site/empty/", None),
+               (Updates.APPEND, "site/log", b"a"), (Updates.WRITE, "site", b"x")]
+    assert data.apply_updates(updates, changes=changes) == 4
+    assert changes == [(Updates.WRITE, "site/temp"), (Updates.MKDIR, "site/empty"), (Updates.APPEND, "site/log")]
@@ -0,0 +1,23 @@
+from iotfs.benchmark.report import summarize, compare, percentile
+
+
+def test_summarize():
+    summary = summarize([0.001] * 98 + [0.002, 0.01])
+    assert summary["count"] == 100
+    assert summary["p50"] == 1000.0
+    assert summary["p99"] == 2000.0
+    assert summary["max"] == 10000.0
+    assert percentile([], 50) == 0.0
+
+
+def test_compare():
+    baseline = {"standard/size=1000/fanout=10": {
+        "read": {"ops_per_sec": 1000.0, "p99": 10.0},
+        "write": {"ops_per_sec": 1000.0, "p99": 10.0}}}
+    results = {"standard/size=1000/fanout=10": {
+        "read": {"ops_per_sec": 900.0, "p99": 11.0},
+        "write": {"ops_per_sec": 700.0, "p99": 20.0},
+        "lookup": {"ops_per_sec": 1.0, "p99": 1000.0}}}
+    regressions = compare(results, baseline, threshold=0.2)
+    assert [(operation, metric) for _, operation, metric, _, _ in regressions] == \
+        [("write", "ops_per_sec"), ("write", "p99")]
@@ -0,0 +1,105 @@
+import os
+
+import trio
+
+from iotfs.filesystem._executor import Executor
+from iotfs.filesystem.data.data import Data
+from iotfs.utils._metrics import Metrics
+from iotfs.utils._fs_utils import ROOT_INODE
+
+
+def create_data(tmp_path, budget):
+    data = Data()
+    data.add_root_entry("mnt")
+    data.bodies.metrics = Metrics()
+    data.bodies.configure(budget, directory=str(tmp_path))
+    return data
+
+
+def test_spills_least_recently_used(tmp_path):
+    data = create_data(tmp_path, 25)
+    inodes = [data.add_entry(str(idx), ROOT_INODE, data=str(idx) * 10).inode for idx in range(3)]
+    first = data.nodes[inodes[0]]
+    assert not first.is_resident()
+    assert os.path.exists(first.spill_path)
+    assert data.bodies.size == 20
+    assert data.bodies.metrics.get("bodies.spills") == 1
+    # Metadata stays in memory.
+    assert first.size == 10
+
+    # Accessing the body reads it back and spills the next least recently used one.
+    assert first.get_data() == b"0" * 10
+    assert data.bodies.metrics.get("bodies.misses") == 1
+    assert not data.nodes[inodes[1]].is_resident()
+    assert list(data.bodies.resident) == [inodes[2], inodes[0]]
+
+
+def test_write_drops_copy_on_disk(tmp_path):
+    data = create_data(tmp_path, 10)
+    first = data.add_entry("a", ROOT_INODE, data="a" * 10)
+    data.add_entry("b", ROOT_INODE, data="b" * 10)
+    node = data.nodes[first.inode]
+    path = node.spill_path
+    node.data = "c" * 5
+    assert node.spill_path is None
+    assert not os.path.exists(path)
+    data.remove_entry(data.get_entry_by_relative_path("b"))
+    assert data.bodies.size == 5
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_shared_bodies_are_charged_once(tmp_path):
+    data = create_data(tmp_path, 250)
+    nodes = [data.nodes[data.add_entry(name, ROOT_INODE, data="x" * 100).inode] for name in "abc"]
+    nodes.append(data.nodes[data.add_entry("d", ROOT_INODE, data="z" * 100).inode])
+    assert data.bodies.size == 200
+    assert data.bodies.metrics.get("bodies.spills") == 0
+
+    # Spilling a shared body frees its memory with its last resident reference only.
+    nodes[2].data = "y" * 100
+    assert data.bodies.size == 200
+    assert [node.is_resident() for node in nodes] == [False, False, True, True]
+    data.remove_entry(data.get_entry_by_relative_path("c"))
+    assert data.bodies.size == 100 and list(data.bodies.charges.values()) == [1]
+
+
+def test_fault_counts_hits_and_misses(tmp_path):
+    data = create_data(tmp_path, 10)
+    first = data.add_entry("a", ROOT_INODE, data="a" * 10).inode
+    second = data.add_entry("b", ROOT_INODE, data="b" * 10).inode
+    executor = Executor()
+
+    async def read():
+        await data.bodies.fault(second, data.nodes[second], executor)
+        await data.bodies.fault(first, data.nodes[first], executor)
+
+    trio.run(read)
+    metrics = data.bodies.metrics
+    assert (metrics.get("bodies.hits"), metrics.get("bodies.misses"), metrics.get("bodies.spills")) == (1, 1, 2)
+    assert data.nodes[first].is_resident()
+    assert metrics.get("bodies.resident") == 10
+
+
+def test_run_spills_in_workers(tmp_path):
+    data = create_data(tmp_path, 25)
+    data.bodies.executor = Executor()
+    inodes = [data.add_entry(str(idx), ROOT_INODE, data=str(idx) * 10).inode for idx in range(4)]
+    # Nothing is written on the loop.
+    assert data.bodies.size == 40 and os.listdir(str(tmp_path)) == []
+
+    async def main():
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(data.bodies.run)
+            while data.bodies.size > 25:
+                await trio.sleep(0.01)
+            # A body written while it's spilled keeps the new body.
+            data.nodes[inodes[3]].data = "x" * 10
+            data.nodes[inodes[2]].data = "y" * 20
+            while data.bodies.size > 25:
+                await trio.sleep(0.01)
+            nursery.cancel_scope.cancel()
+
+    trio.run(main)
+    assert [data.nodes[inode].is_resident() for inode in inodes] == [False, False, True, False]
+    assert data.nodes[inodes[3]].get_data() == b"x" * 10
+    assert sorted(os.listdir(str(tmp_path))) == sorted(str(inode) for inode in inodes[:2] + [inodes[3]])
@@ -0,0 +1,42 @@
+import trio
+
+from iotfs.filesystem._changes import ChangeLog
+
+
+def test_read():
+    log = ChangeLog()
+    log.append("create", "site/temp")
+    log.append("write", "site/temp", 4)
+    content = b"1\tcreate\tsite/temp\t0\n2\twrite\tsite/temp\t4\n"
+    assert trio.run(log.read, 0, 100) == content
+    assert trio.run(log.read, 5, 10) == content[5:15]
+    assert log.end == len(content)
+
+
+def test_wait():
+    log = ChangeLog(wait=1.0)
+    results = []
+
+    async def main():
+        async def reader():
+            results.append(await log.read(0, 100))
+
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(reader)
+            await trio.sleep(0.01)
+            log.append("mkdir", "site")
+
+    trio.run(main)
+    assert results == [b"1\tmkdir\tsite\t0\n"]
+    log.wait = 0.01
+    assert trio.run(log.read, log.end, 100) == b""
+
+
+def test_dropped():
+    log = ChangeLog(capacity=2)
+    for idx in range(5):
+        log.append("write", "f", idx)
+    assert log.snapshot() == b"4\twrite\tf\t3\n5\twrite\tf\t4\n"
+    # Dropped parts keep their length, so offsets of readers stay valid.
+    assert trio.run(log.read, 0, log.start + 100) == b"#" * (log.start - 1) + b"\n"
+    assert trio.run(log.read, log.start, 100) == log.snapshot()
@@ -0,0 +1,68 @@
+import trio
+
+from iotfs.filesystem.data.compression import CompressedBody, CompressionRule, parse_rules
+from iotfs.filesystem.data.data import Data
+from iotfs.utils._metrics import Metrics
+from iotfs.utils._fs_utils import Updates
+
+
+def create_data():
+    data = Data()
+    data.add_root_entry("mnt")
+    data.compression.metrics = Metrics()
+    data.compression.block_size = 256
+    return data
+
+
+def test_blocks():
+    data = bytes(range(100))
+    for codec in ("zlib", "lzma"):
+        body = CompressedBody.compress(data, codec=codec, block_size=16)
+        assert len(body.blocks) == 7
+        assert body.decompress() == data
+        assert list(body.block_range(15, 2)) == [0, 1]
+        assert list(body.block_range(100, 10)) == []
+
+
+def test_compresses_old_and_large_files():
+    data = create_data()
+    data.compression.add_rule(CompressionRule("logs", min_age=60, min_size=1000))
+    data.apply_updates([(Updates.WRITE, "logs/small", "a" * 100), (Updates.WRITE, "logs/large", "b" * 2000),
+                        (Updates.WRITE, "other", "c" * 2000)])
+    small = data.nodes[data.get_entry_by_relative_path("logs/small").inode]
+    large = data.nodes[data.get_entry_by_relative_path("logs/large").inode]
+
+    assert trio.run(data.compression.compress) == 1
+    assert large.compressed is not None and small.compressed is None
+    assert large.size == 2000
+    assert large.get_data() == b"b" * 2000
+    assert trio.run(data.compression.compress, 10 ** 10) == 1
+    assert small.compressed is not None
+    assert data.nodes[data.get_entry_by_relative_path("other").inode].compressed is None
+
+
+def test_read_decompresses_touched_blocks():
+    data = create_data()
+    data.compression.add_rule(CompressionRule("logs"))
+    data.apply_updates([(Updates.WRITE, "logs/a", "0123456789" * 100)])
+    inode = data.get_entry_by_relative_path("logs/a").inode
+    node = data.nodes[inode]
+    trio.run(data.compression.compress)
+
+    assert data.compression.read(inode, node, 14, 4) == b"4567"
+    assert data.compression.read(inode, node, 250, 10) == b"0123456789"
+    assert data.compression.read(inode, node, 998, 10) == b"89"
+    metrics = data.compression.metrics
+    assert (metrics.get("compression.block_misses"), metrics.get("compression.block_hits")) == (3, 1)
+
+    # Writing keeps the raw body again, until it's compressed once more.
+    node.data = node.get_data() + b"x"
+    assert node.compressed is None
+    assert data.compression.blocks_size == 0
+    assert list(data.compression.rules.values())[0].pending.get(inode) is not None
+
+
+def test_parse_rules():
+    (path, rule), (other, dropped) = parse_rules("logs codec=lzma level=1 min_size=1k\nold codec=none\n")
+    assert (rule.path, rule.codec, rule.level, rule.min_size) == ("logs", "lzma", 1, 1024)
+    assert (other, dropped) == ("old", None)
@@ -0,0 +1,39 @@
+from iotfs.filesystem.data.data import Data
+from iotfs.utils._fs_utils import Updates
+
+CONFIG = "interval=60\nthreshold=21.5\n" * 10
+
+
+def create_data():
+    data = Data()
+    data.add_root_entry("mnt")
+    return data
+
+
+def test_shares_equal_bodies():
+    data = create_data()
+    data.apply_updates([(Updates.WRITE, "dev{}/config".format(idx), CONFIG) for idx in range(10)])
+    data.apply_updates([(Updates.WRITE, "dev0/small", "1"), (Updates.WRITE, "dev0/status", "x" * 100)])
+    nodes = [data.nodes[data.get_entry_by_relative_path("dev{}/config".format(idx)).inode] for idx in range(10)]
+    assert all(node.get_data() is nodes[0].get_data() for node in nodes)
+
+    stats = data.store.stats()
+    assert (stats["bodies"], stats["references"]) == (2, 11)
+    assert stats["logical_bytes"] == 10 * len(CONFIG) + 100
+    assert stats["stored_bytes"] == len(CONFIG) + 100
+
+
+def test_copy_on_write():
+    data = create_data()
+    data.apply_updates([(Updates.WRITE, "a", CONFIG), (Updates.WRITE, "b", CONFIG)])
+    a = data.nodes[data.get_entry_by_relative_path("a").inode]
+    b = data.nodes[data.get_entry_by_relative_path("b").inode]
+    a.data = a.get_data()[:70]
+    assert b.get_data() == CONFIG.encode()
+    assert data.store.stats()["references"] == 2
+    assert data.store.ratio() == 1.0
+
+    data.remove_entry(data.get_entry_by_relative_path("a"))
+    data.remove_entry(data.get_entry_by_relative_path("b"))
+    assert data.store.bodies == dict()
+    assert (data.store.logical_bytes, data.store.stored_bytes) == (0, 0)
@@ -0,0 +1,149 @@
+import os
+import queue
+import socket
+import threading
+import time
+
+import pytest
+
+from iotfs.listener import protocol
+from iotfs.listener.client import EventClient
+from iotfs.listener.objects import Events, Operations, CreateObject, RenameObject, WriteObject
+from iotfs.listener.server import EventServer, POLL_INTERVAL
+
+
+def create_event(value):
+    node = {"parent": 1, "type": "FILE", "mode": oct(0o100644), "invisible": False, "open_count": 0, "lock": False,
+            "data": value}
+    entry = {"inode": 5, "name": b"temp", "path": "/mnt/site"}
+    return WriteObject(Operations.WRITE_FILE, {"node": node, "entry": entry}, len(value))
+
+
+def start_server(path, **kwargs):
+    server = EventServer(path, queue.Queue(), **kwargs)
+    thread = threading.Thread(target=server.start)
+    thread.start()
+    while not os.path.exists(path):
+        time.sleep(0.01)
+    return server, thread
+
+
+def test_round_trip():
+    directory = {"node": {"parent": 1, "type": "DIR", "mode": oct(0o40755), "invisible": False, "lock": True},
+                 "entry": {"inode": 7, "name": b"site", "path": "/mnt"}}
+    events = [create_event(b"21.5"), CreateObject(Operations.CREATE_DIR, directory),
+              RenameObject(Operations.RENAME_DIR, directory, {"entry": {"inode": 9}}, b"moved")]
+    frame = protocol.encode_batch(3, 1, [protocol.encode_event(item) for item in events])
+    frames = protocol.read_frames(bytearray(frame + frame[:10]))
+
+    assert len(frames) == 1 and frames[0][0] == protocol.BATCH
+    sequence, dropped, decoded = protocol.decode_batch(frames[0][1])
+    assert (sequence, dropped) == (3, 1)
+    assert decoded[0].event == Events.WRITE and decoded[0].buffer_length == 4
+    assert decoded[0].obj["node"]["data"] == b"21.5" and decoded[0].obj["entry"]["path"] == "/mnt/site"
+    assert decoded[1].obj == {"node": directory["node"], "entry": directory["entry"]}
+    assert (decoded[2].operation, decoded[2].new_dir, decoded[2].new_name) == (Operations.RENAME_DIR,
+                                                                             {"entry": {"inode": 9}}, b"moved")
+
+
+def test_streams_events(tmp_path):
+    path = str(tmp_path / "events.sock")
+    server, thread = start_server(path, batch_size=16, window=2)
+    try:
+        with EventClient(path) as client:
+            while len(server.clients) == 0:
+                time.sleep(0.01)
+            for idx in range(1000):
+                server.queue.put(create_event(str(idx)))
+            received = []
+            for item in client.events():
+                received.append(item.obj["node"]["data"])
+                if len(received) == 1000:
+                    break
+        assert received == [os.fsencode(str(idx)) for idx in range(1000)]
+        assert client.dropped == 0
+    finally:
+        server.stop()
+        thread.join()
+    assert not os.path.exists(path)
+
+
+def test_slow_client_drops_oldest_events(tmp_path):
+    path = str(tmp_path / "events.sock")
+    server, thread = start_server(path, batch_size=1, window=1, max_pending=3)
+    try:
+        with EventClient(path) as client:
+            while len(server.clients) == 0:
+                time.sleep(0.01)
+            for idx in range(10):
+                server.queue.put(create_event(str(idx)))
+            # The client doesn't acknowledge its first batch, while all events arrive.
+            server.queue.join()
+            received = []
+            for item in client.events():
+                received.append(item.obj["node"]["data"])
+                if len(received) == 4:
+                    break
+        assert received == [b"0", b"7", b"8", b"9"]
+        assert client.dropped == 6
+    finally:
+        server.stop()
+        thread.join()
+
+
+class CountingServer(EventServer):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rounds = 0
+
+    def serve(self):
+        self.rounds += 1
+        super().serve()
+
+
+def test_stalled_client_doesnt_spin(tmp_path):
+    path = str(tmp_path / "events.sock")
+    server = CountingServer(path, queue.Queue(), batch_size=1, window=8)
+    thread = threading.Thread(target=server.start)
+    thread.start()
+    while not os.path.exists(path):
+        time.sleep(0.01)
+    # The client neither reads nor acknowledges, so the server can't write all of its batches.
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        while len(server.clients) == 0:
+            time.sleep(0.01)
+        for _ in range(16):
+            server.queue.put(create_event(b"x" * 65536))
+        server.queue.join()
+        time.sleep(0.05)
+        client = next(iter(server.clients.values()))
+        assert len(client.outgoing) > 0
+        rounds = server.rounds
+        time.sleep(0.5)
+        # A round waits for POLL_INTERVAL, while the client stalls.
+        assert server.rounds - rounds < 0.5 / POLL_INTERVAL * 2
+    finally:
+        server.stop()
+        thread.join()
+        sock.close()
+
+
+def test_keeps_other_files_at_path(tmp_path):
+    path = tmp_path / "events.sock"
+    path.write_bytes(b"data")
+    server = EventServer(str(path), queue.Queue())
+    with pytest.raises(FileExistsError):
+        server.listen()
+    assert path.read_bytes() == b"data"
+
+    # A socket left behind is replaced.
+    path.unlink()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(str(path))
+    sock.close()
+    server.listen()
+    server.close()
+    assert not path.exists()
@@ -0,0 +1,49 @@
+import threading
+import time
+
+import pytest
+import trio
+
+from iotfs.filesystem._executor import Executor
+
+
+def test_max_in_flight():
+    executor = Executor(max_in_flight=2)
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def job(value):
+        with lock:
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return value * 2
+
+    results = []
+
+    async def main():
+        async def run(value):
+            results.append(await executor.run(job, value))
+
+        async with trio.open_nursery() as nursery:
+            for value in range(6):
+                nursery.start_soon(run, value)
+
+    trio.run(main)
+    assert sorted(results) == [0, 2, 4, 6, 8, 10]
+    assert running[1] == 2
+    assert executor.completed == 6
+    assert executor.in_flight == 0
+
+
+def test_error():
+    executor = Executor()
+
+    def job():
+        raise OSError("disk failed")
+
+    with pytest.raises(OSError):
+        trio.run(executor.run, job)
+    assert executor.failed == 1
@@ -0,0 +1,78 @@
+import trio
+
+from iotfs.filesystem._executor import Executor
+from iotfs.filesystem._handles import Handle, HandleTable, MIN_WINDOW, MAX_WINDOW
+from iotfs.filesystem.data.compression import CompressionRule
+from iotfs.filesystem.data.data import Data
+from iotfs.filesystem.data.series import TimeSeries
+from iotfs.utils._metrics import Metrics
+from iotfs.utils._fs_utils import Updates
+
+
+def test_sequential_reads_grow_window():
+    handle = Handle(1, 2, 0)
+
+    assert handle.record(1000, 100) is None
+    assert handle.record(1100, 100) is None
+    assert not handle.is_sequential()
+    assert handle.record(1200, 100) == (1300, MIN_WINDOW)
+    assert handle.is_sequential()
+    assert handle.record(1300, 100) == (1300 + MIN_WINDOW, MIN_WINDOW + 100)
+    for idx in range(10):
+        handle.record(1400 + idx * 100, 100)
+    assert handle.window == MAX_WINDOW
+
+    # A random read starts over.
+    assert handle.record(10 ** 6, 100) is None
+    assert not handle.is_sequential() and handle.window == 0
+
+
+def test_lines_per_handle():
+    series = TimeSeries()
+    first = Handle(1, 2, 0)
+    second = Handle(2, 2, 0)
+    series.parse(first.lines(b"10,1\n20,2"))
+    series.parse(second.lines(b"15,50\n"))
+    series.parse(first.lines(b".5\n30,3"))
+    assert list(series.values) == [1.0, 50.0, 2.5]
+    assert second.partial == b""
+    # The dangling line of a handle is parsed on its own, once it is flushed.
+    assert first.partial == b"30,3"
+    series.parse(first.partial)
+    assert list(series.timestamps)[-1] == 30.0 and series.last == 3.0
+
+
+def test_open_and_release():
+    table = HandleTable(Data(), Executor(), Metrics())
+    first = table.open(5, 0)
+    second = table.open(5, 0)
+
+    assert first.fh != second.fh
+    assert table.get(first.fh) is first
+    assert table.metrics.get("handles.open") == 2
+    assert table.release(first.fh) is first
+    assert table.release(first.fh) is None
+    assert table.metrics.get("handles.open") == 1
+
+
+def test_read_ahead_decompresses_blocks():
+    data = Data()
+    data.add_root_entry("mnt")
+    data.compression.block_size = 256
+    data.compression.add_rule(CompressionRule("logs"))
+    data.apply_updates([(Updates.WRITE, "logs/a", "0123456789" * 1000)])
+    inode = data.get_entry_by_relative_path("logs/a").inode
+    node = data.nodes[inode]
+    trio.run(data.compression.compress)
+    table = HandleTable(data, Executor(), Metrics())
+    handle = table.open(inode, 0)
+
+    for off in (0, 100, 200):
+        table.read(handle, inode, off, 100, node)
+    assert table.pending[inode] == (200, 2 * MIN_WINDOW + 100)
+    trio.run(table.prefetch, inode, *table.pending.pop(inode))
+
+    assert len(data.compression.cached[inode]) == len(node.compressed.blocks)
+    assert data.compression.read(inode, node, 300, 10) == b"0123456789"
+    assert table.metrics.get("handles.read_ahead") == 1
+    assert table.metrics.get("handles.sequential_reads") == 2
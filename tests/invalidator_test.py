@@ -0,0 +1,39 @@
+import logging
+
+import pyfuse3
+import trio
+
+from iotfs.filesystem._executor import Executor
+from iotfs.filesystem._invalidator import Invalidator
+from iotfs.filesystem.data.data import Data
+from iotfs.utils._fs_utils import Updates, ROOT_INODE
+from iotfs.utils._metrics import Metrics
+
+
+def test_invalidate_updates(monkeypatch):
+    sent = []
+    monkeypatch.setattr(pyfuse3, "invalidate_inode", lambda inode: sent.append(inode))
+    monkeypatch.setattr(pyfuse3, "invalidate_entry", lambda parent_inode, name: sent.append((parent_inode, name)))
+    log = logging.getLogger("invalidator_test")
+    metrics = Metrics()
+    invalidator = Invalidator(Executor(logger=log), metrics, log, interval=0.01)
+    data = Data(logger=log)
+    data.add_root_entry("mnt")
+    data.invalidator = invalidator
+    # Unmounted changes aren't collected.
+    data.apply_updates([(Updates.WRITE, "old", b"1")])
+    old = data.get_entry_by_relative_path("old").inode
+
+    async def main():
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(invalidator.run)
+            await trio.sleep(0.02)
+            data.apply_updates([(Updates.WRITE, "old", b"2"), (Updates.WRITE, "new", b"1")])
+            data.apply_updates([(Updates.WRITE, "old", b"3")])
+            await trio.sleep(0.05)
+            nursery.cancel_scope.cancel()
+
+    trio.run(main)
+    new = data.get_entry_by_relative_path("new").inode
+    assert sorted(sent, key=str) == sorted([(ROOT_INODE, b"new"), old, new, ROOT_INODE], key=str)
+    assert metrics.get("invalidations") == 4
@@ -0,0 +1,75 @@
+import errno
+
+import pytest
+
+from iotfs.filesystem.data.data import Data
+from iotfs.utils._fs_utils import ROOT_INODE, LinkTypes, Updates
+from iotfs.utils._metrics import Metrics
+
+
+def create_data():
+    data = Data()
+    data.add_root_entry("mnt")
+    data.links.metrics = Metrics()
+    data.apply_updates([(Updates.WRITE, "site/readings/1", "21.5"), (Updates.WRITE, "site/readings/2", "22.0")])
+    return data
+
+
+def link(data, name, parent, path):
+    return data.add_link_entry(name, data.get_entry_by_relative_path(parent).inode, LinkTypes.SYMBOLIC,
+                               link_path=path)
+
+
+def target(data, entry):
+    result = data.get_symbolic_target(entry)
+    return None if result is None else data.get_relative_path(result.inode)
+
+
+def test_resolves_relative_paths_once():
+    data = create_data()
+    latest = link(data, "latest", "site", "/mnt/site/readings/1")
+    assert latest.link_path == "readings/1"
+    assert target(data, latest) == "site/readings/1"
+    assert target(data, latest) == "site/readings/1"
+    assert (data.links.metrics.get("links.misses"), data.links.metrics.get("links.hits")) == (1, 1)
+
+
+def test_invalidated_by_rename_unlink_and_create():
+    data = create_data()
+    latest = link(data, "latest", "site", "/mnt/site/readings/2")
+    other = link(data, "other", "site", "/mnt/site/readings/1")
+    target(data, latest)
+    target(data, other)
+
+    # Moving the reading away drops only the targets depending on it.
+    readings = data.get_entry_by_relative_path("site/readings").inode
+    data.rename_entry(data.get_entry_by_relative_path("site/readings/2"), ROOT_INODE, b"2")
+    assert latest.inode not in data.links.targets
+    assert other.inode in data.links.targets
+    assert target(data, latest) is None
+
+    # Missing targets are cached until the name is created.
+    data.apply_updates([(Updates.WRITE, "site/readings/2", "23.0")])
+    assert target(data, latest) == "site/readings/2"
+
+    data.remove_entry(data.get_entry_by_parent_name(readings, b"1"))
+    assert target(data, other) is None
+
+
+def test_follows_chains_and_detects_loops():
+    data = create_data()
+    link(data, "dir", "site", "/mnt/site/readings")
+    chained = link(data, "chained", ".", "/mnt/site/dir/1")
+    assert chained.link_path == "site/dir/1"
+    assert target(data, chained) == "site/readings/1"
+
+    first = link(data, "a", ".", "/mnt/site")
+    second = link(data, "b", ".", "/mnt/site")
+    data.rename_entry(first, ROOT_INODE, b"tmp")
+    data.rename_entry(second, ROOT_INODE, b"a")
+    data.rename_entry(first, ROOT_INODE, b"b")
+    first.link_path, second.link_path = "a", "b"
+    with pytest.raises(OSError) as e:
+        data.links.resolve(first.inode)
+    assert e.value.errno == errno.ELOOP
+    assert data.get_symbolic_target(first) is None
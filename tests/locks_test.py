@@ -0,0 +1,55 @@
+import trio
+
+from iotfs.filesystem.data.locks import LockTable
+
+
+def test_inodes():
+    locks = LockTable()
+    events = []
+
+    async def hold(inodes, name, delay):
+        async with locks.inodes(*inodes):
+            events.append(name + " start")
+            await trio.sleep(delay)
+            events.append(name + " end")
+
+    async def main():
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(hold, [1, 2], "a", 0.1)
+            await trio.sleep(0.01)
+            # Overlapping inodes wait, other inodes don't.
+            nursery.start_soon(hold, [2, 1], "b", 0)
+            nursery.start_soon(hold, [3], "c", 0)
+
+    trio.run(main)
+    assert events == ["a start", "c start", "c end", "a end", "b start", "b end"]
+    assert locks.locks == {}
+    assert locks.holders == 0
+
+
+def test_all():
+    locks = LockTable()
+    events = []
+
+    async def hold(inode, name):
+        async with locks.inodes(inode):
+            events.append(name)
+            await trio.sleep(0.05)
+
+    async def bulk():
+        async with locks.all():
+            events.append("all")
+            await trio.sleep(0.05)
+
+    async def main():
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(hold, 1, "first")
+            await trio.sleep(0.01)
+            nursery.start_soon(bulk)
+            await trio.sleep(0.01)
+            # Waits for the bulk update, which waits for the first holder.
+            nursery.start_soon(hold, 2, "second")
+
+    trio.run(main)
+    assert events == ["first", "all", "second"]
+    assert not locks.exclusive
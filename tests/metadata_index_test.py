@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+from iotfs.filesystem.data import metadata_index
+from iotfs.filesystem.data.data import Data
+from iotfs.filesystem.data.metadata_index import Query, SortedIndex
+from iotfs.utils._fs_utils import ROOT_INODE, Types
+
+
+def create_data():
+    data = Data()
+    data.add_root_entry("mnt")
+    site = data.add_entry("site", ROOT_INODE, node_type=Types.DIR)
+    data.add_entry("dev1", site.inode, data="1" * 10)
+    data.add_entry("dev2", site.inode, data="2" * 2000)
+    data.add_entry("other", ROOT_INODE, data="")
+    return data
+
+
+def test_sorted_index():
+    index = SortedIndex()
+    for value, inode in ((5, 2), (1, 3), (5, 4), (9, 5)):
+        index.add(value, inode)
+    assert index.range(5, 5) == [2, 4]
+    assert index.range(1, 9, False, False) == [2, 4]
+    assert index.range(None, 5, True, False) == [3]
+    index.discard(5, 2)
+    assert index.range(5) == [4, 5]
+
+
+def test_sorted_index_buckets(monkeypatch):
+    monkeypatch.setattr(metadata_index, "BUCKET_SIZE", 4)
+    index = SortedIndex()
+    pairs = set()
+    generator = random.Random(7)
+    for _ in range(2000):
+        pair = (generator.randrange(50), generator.randrange(1000))
+        if pair in pairs and generator.random() < 0.7:
+            index.discard(*pair)
+            pairs.discard(pair)
+        elif pair not in pairs:
+            index.add(*pair)
+            pairs.add(pair)
+    expected = sorted(pairs)
+    assert len(index) == len(expected) and len(index.buckets) > 1
+    assert index.range() == [inode for _, inode in expected]
+    for low, high in ((0, 49), (10, 20), (25, 25), (30, 10), (60, 70)):
+        inodes = [inode for value, inode in expected if low <= value <= high]
+        assert index.range(low, high) == inodes
+        assert index.count(low, high) == len(inodes)
+        inodes = [inode for value, inode in expected if low < value < high]
+        assert index.range(low, high, False, False) == inodes
+
+
+def test_find():
+    data = create_data()
+    assert data.find(Query("size>1k")) == ["site/dev2"]
+    assert data.find(Query("path=site/ type=f")) == ["site/dev1", "site/dev2"]
+    assert data.find(Query("path=site/dev size<=10")) == ["site/dev1"]
+    assert data.find(Query("path=si type=d")) == ["site"]
+
+    dev1 = data.get_entry_by_relative_path("site/dev1")
+    data.nodes[dev1.inode].data = "1" * 4096
+    data.nodes[dev1.inode].mtime = 0
+    assert data.find(Query("size>=4k")) == ["site/dev1"]
+    assert data.find(Query("mtime<1")) == ["site/dev1"]
+    assert data.find(Query("mtime>-60 type=f")) == ["other", "site/dev2"]
+
+    data.remove_entry(dev1)
+    assert data.find(Query("size>=4k")) == []
+
+
+def test_invalid_query():
+    with pytest.raises(ValueError):
+        Query("size>big")
+    with pytest.raises(ValueError):
+        Query("owner=me")
+
+
+def test_total_size():
+    data = create_data()
+
+    def total():
+        return sum(node.size or 0 for node in data.nodes.values())
+
+    assert data.total_size == total()
+    dev1 = data.get_entry_by_relative_path("site/dev1")
+    data.nodes[dev1.inode].data = "1" * 4096
+    data.add_entry("dev3", dev1.parent.inode, data="3" * 100)
+    assert data.total_size == total()
+    data.remove_entry(dev1)
+    assert data.total_size == total()
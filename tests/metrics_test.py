@@ -0,0 +1,16 @@
+from iotfs.utils._metrics import Metrics, sum_metrics
+
+
+def test_total():
+    shared = dict()
+    first = Metrics(shared=shared, shard="a")
+    second = Metrics(shared=shared, shard="b")
+    first.increment("operations", 3)
+    second.increment("operations")
+    second.increment("errors")
+    first.publish()
+    second.publish()
+    first.increment("operations")
+    assert first.total() == {"operations": 5, "errors": 1}
+    assert Metrics().total() == {}
+    assert sum_metrics([{"a": 1}, {"a": 2, "b": 1}]) == {"a": 3, "b": 1}
@@ -0,0 +1,55 @@
+import pytest
+
+from iotfs.filesystem._changes import ChangeLog
+from iotfs.filesystem.data.data import Data
+from iotfs.filesystem.data.node import File
+from iotfs.filesystem.data.page_cache import parse_rules
+from iotfs.utils._fs_utils import ROOT_INODE, CachePolicies, Updates
+
+
+def create_data():
+    data = Data()
+    data.add_root_entry("mnt")
+    data.apply_updates([(Updates.WRITE, "firmware/blob", "x" * 100), (Updates.WRITE, "sensors/temp", "21.5"),
+                        (Updates.WRITE, "other", "1")])
+    return data
+
+
+def open_file(data, path):
+    inode = data.get_entry_by_relative_path(path).inode
+    return data.page_cache.open(inode, data.nodes[inode])
+
+
+def test_policies_of_subtrees_and_types():
+    data = create_data()
+    data.page_cache.add_rule("firmware", CachePolicies.IMMUTABLE)
+    data.page_cache.add_rule("sensors", CachePolicies.LIVE)
+    virtual = data.add_virtual_entry("virtual", ROOT_INODE, lambda: "1")
+
+    assert open_file(data, "firmware/blob") == (True, False)
+    assert open_file(data, "sensors/temp") == (False, True)
+    assert data.page_cache.open(virtual.inode, data.nodes[virtual.inode]) == (False, True)
+
+    data.page_cache.set_type(File, CachePolicies.IMMUTABLE)
+    assert open_file(data, "sensors/temp") == (True, False)
+    # Streams are read directly regardless.
+    stream = data.add_stream_entry("stream", ROOT_INODE, ChangeLog())
+    assert data.page_cache.open(stream.inode, data.nodes[stream.inode]) == (False, True)
+
+
+def test_updates_drop_pages_once():
+    data = create_data()
+    data.page_cache.add_rule("firmware", CachePolicies.IMMUTABLE)
+    # Written by updates before the first open.
+    assert open_file(data, "other") == (False, False)
+    assert open_file(data, "other") == (True, False)
+    data.apply_updates([(Updates.APPEND, "other", "2"), (Updates.WRITE, "firmware/blob", "y")])
+    assert open_file(data, "other") == (False, False)
+    assert open_file(data, "firmware/blob") == (True, False)
+
+
+def test_parse_rules():
+    assert parse_rules(b"firmware immutable\nsensors LIVE\n\nold default") == [
+        ("firmware", CachePolicies.IMMUTABLE), ("sensors", CachePolicies.LIVE), ("old", CachePolicies.DEFAULT)]
+    with pytest.raises(ValueError):
+        parse_rules("firmware cached")
@@ -0,0 +1,62 @@
+import logging
+import threading
+import time
+
+import trio
+
+from iotfs.filesystem._profiler import Profiler
+
+
+def operation(func):
+    return func()
+
+
+def busy_handler(stopped):
+    while not stopped.is_set():
+        sum(range(1000))
+
+
+def test_stacks():
+    stopped = threading.Event()
+    thread = threading.Thread(target=operation, args=(lambda: busy_handler(stopped),))
+    thread.start()
+    profiler = Profiler(operation.__code__, logging.getLogger("profiler_test"))
+    try:
+        profiler.start(rate=500, thread_id=thread.ident)
+        time.sleep(0.2)
+        profiler.control(b"stop")
+    finally:
+        stopped.set()
+        thread.join()
+    assert not profiler.is_running()
+    assert profiler.samples > 0
+    assert "profiler_test.py:operation;profiler_test.py:<lambda>;profiler_test.py:busy_handler" in profiler.collapsed()
+    profiler.control("reset")
+    assert profiler.collapsed() == ""
+
+
+def test_cpu():
+    profiler = Profiler(operation.__code__, logging.getLogger("profiler_test"))
+
+    async def handler(name, seconds):
+        token = profiler.enter(name)
+        try:
+            for _ in range(10):
+                end = time.perf_counter() + seconds / 10
+                while time.perf_counter() < end:
+                    pass
+                # Other tasks run meanwhile, but aren't charged to this handler.
+                await trio.sleep(0)
+        finally:
+            profiler.exit(token)
+
+    async def main():
+        profiler.control("start 100")
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(handler, "read", 0.02)
+            nursery.start_soon(handler, "write", 0.08)
+        profiler.control("stop")
+
+    trio.run(main)
+    assert profiler.cpu["write"] > profiler.cpu["read"] * 2
+    assert profiler.attribution().startswith("write ")
@@ -0,0 +1,108 @@
+import trio
+
+from iotfs.filesystem.data.data import Data
+from iotfs.utils._fs_utils import ROOT_INODE
+
+
+def create_data(cache_size=1024):
+    data = Data(cache_size=cache_size)
+    data.add_root_entry("dir")
+    return data
+
+
+def test_single_provider_call():
+    data = create_data()
+    calls = []
+
+    async def provider():
+        calls.append(1)
+        await trio.sleep(0.05)
+        return "value"
+
+    inode = data.add_virtual_entry("file", ROOT_INODE, provider, ttl=10).inode
+    results = []
+
+    async def read():
+        results.append(await data.providers.fetch(inode, data.nodes[inode]))
+
+    async def main():
+        async with trio.open_nursery() as nursery:
+            for _ in range(10):
+                nursery.start_soon(read)
+
+    trio.run(main)
+    assert len(calls) == 1
+    assert results == [b"value"] * 10
+    assert data.nodes[inode].size == 5
+
+
+def test_ttl():
+    data = create_data()
+    calls = []
+
+    def provider():
+        calls.append(1)
+        return len(calls)
+
+    inode = data.add_virtual_entry("file", ROOT_INODE, provider, ttl=0.05).inode
+
+    async def main():
+        node = data.nodes[inode]
+        assert await data.providers.fetch(inode, node) == b"1"
+        assert await data.providers.fetch(inode, node) == b"1"
+        await trio.sleep(0.1)
+        assert await data.providers.fetch(inode, node) == b"2"
+
+    trio.run(main)
+
+
+def test_version():
+    data = create_data()
+    calls = []
+    versions = [1]
+
+    def provider():
+        calls.append(1)
+        return len(calls)
+
+    inode = data.add_virtual_entry("file", ROOT_INODE, provider, ttl=None, version=lambda: versions[-1]).inode
+
+    async def main():
+        node = data.nodes[inode]
+        assert await data.providers.fetch(inode, node) == b"1"
+        assert await data.providers.fetch(inode, node) == b"1"
+        versions.append(2)
+        assert await data.providers.fetch(inode, node) == b"2"
+        assert await data.providers.fetch(inode, node) == b"2"
+
+    trio.run(main)
+
+
+def test_session():
+    data = create_data()
+    inode = data.add_virtual_entry("file", ROOT_INODE, lambda handle: handle, ttl=None, session=True).inode
+
+    async def main():
+        node = data.nodes[inode]
+        assert await data.providers.provide(node, "first") == b"first"
+        assert await data.providers.provide(node, "second") == b"second"
+
+    trio.run(main)
+    assert inode not in data.providers.entries
+
+
+def test_lru_eviction():
+    data = create_data(cache_size=10)
+    first = data.add_virtual_entry("first", ROOT_INODE, lambda: b"x" * 6, ttl=None).inode
+    second = data.add_virtual_entry("second", ROOT_INODE, lambda: b"y" * 6, ttl=None).inode
+
+    async def main():
+        await data.providers.fetch(first, data.nodes[first])
+        await data.providers.fetch(second, data.nodes[second])
+
+    trio.run(main)
+    assert first not in data.providers.entries
+    assert second in data.providers.entries
+    assert data.providers.size == 6
+    # The size is still known after eviction.
+    assert data.nodes[first].size == 6
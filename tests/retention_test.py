@@ -0,0 +1,109 @@
+import trio
+
+from iotfs.filesystem.data.data import Data
+from iotfs.filesystem.data.retention import RetentionRule, parse_rules
+from iotfs.utils._fs_utils import ROOT_INODE, Updates
+
+
+def create_data():
+    data = Data()
+    data.add_root_entry("mnt")
+    return data
+
+
+def test_max_files_and_bytes():
+    data = create_data()
+    rule = data.retention.add_rule(RetentionRule("sensors", max_files=3, max_bytes=25))
+    for idx in range(5):
+        data.apply_updates([(Updates.WRITE, "sensors/dev/{}".format(idx), b"x" * 10)])
+        data.nodes[data.get_entry_by_relative_path("sensors/dev/{}".format(idx)).inode].mtime = idx
+    data.apply_updates([(Updates.WRITE, "other", b"x" * 100)])
+    assert (rule.files, rule.bytes) == (5, 50)
+
+    removed = data.retention.expire()
+    assert removed == [("sensors/dev/0", 10), ("sensors/dev/1", 10), ("sensors/dev/2", 10)]
+    assert (rule.files, rule.bytes) == (2, 20)
+    assert data.get_entry_by_relative_path("other") is not None
+
+
+def test_max_age():
+    data = create_data()
+    rule = data.retention.add_rule(RetentionRule("logs", max_age=60))
+    logs = data.get_entry_by_relative_path("logs").inode
+    old = data.add_entry("old", logs, data="1")
+    new = data.add_entry("new", logs, data="1")
+    data.nodes[old.inode].mtime = 0
+    # A file modified again stays, its outdated heap entry is dropped.
+    data.nodes[new.inode].mtime = 0
+    data.nodes[new.inode].mtime = 10 ** 20
+    assert data.retention.expire(now=10 ** 19) == [("logs/old", 1)]
+    assert rule.files == 1
+
+    # Files moved out of the directory aren't removed by its rule.
+    data.nodes[new.inode].mtime = 0
+    data.rename_entry(data.get_entry(new.inode), ROOT_INODE, b"new")
+    assert rule.files == 0
+    assert data.retention.expire(now=10 ** 19) == []
+
+
+def test_move_directory():
+    data = create_data()
+    outer = data.retention.add_rule(RetentionRule("a"))
+    old = data.retention.add_rule(RetentionRule("a/old"))
+    new = data.retention.add_rule(RetentionRule("a/new"))
+    inner = data.retention.add_rule(RetentionRule("a/old/dir"))
+    data.apply_updates([(Updates.WRITE, "a/old/dir/{}".format(idx), b"x" * 10) for idx in range(3)])
+    heap = outer.heap
+    data.rename_entry(data.get_entry_by_relative_path("a/old/dir"), data.get_entry_by_relative_path("a/new").inode,
+                      b"dir")
+    assert [(rule.files, rule.bytes) for rule in (outer, old, new, inner)] == [(3, 30), (0, 0), (3, 30), (3, 30)]
+    # The rule above both directories isn't rebuilt.
+    assert outer.heap is heap
+
+
+def test_expire_open_file():
+    data = create_data()
+    rule = data.retention.add_rule(RetentionRule("logs", max_files=1))
+    logs = data.get_entry_by_relative_path("logs").inode
+    old = data.add_entry("old", logs, data="1").inode
+    data.add_entry("new", logs, data="2")
+    data.nodes[old].mtime = 0
+    # The kernel looked up and opened the oldest file.
+    data.try_increase_op_count(old)
+    data.try_increase_op_count(old)
+    assert data.retention.expire() == [("logs/old", 1)]
+    assert data.get_entry_by_relative_path("logs/old") is None
+    assert rule.files == 1
+    assert data.nodes[old].get_data() == b"1"
+    assert data.retention.expire() == []
+
+    data.try_decrease_op_count(old)
+    data.nodes[old].dec_open_count()
+    data.try_remove_inode(old)
+    assert old not in data.nodes
+
+
+def test_run():
+    data = create_data()
+    data.retention.add_rule(RetentionRule("d", max_files=1))
+    directory = data.get_entry_by_relative_path("d").inode
+    for idx in range(10):
+        data.add_entry(str(idx), directory, data="1")
+    removed = []
+    data.retention.removed = lambda path, size: removed.append(path)
+
+    async def main():
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(data.retention.run, 0.01, 2)
+            await trio.sleep(0.05)
+            nursery.cancel_scope.cancel()
+
+    trio.run(main)
+    assert len(removed) == 9
+    assert len(data.get_children(directory)) == 1
+
+
+def test_parse_rules():
+    rules = parse_rules(b"sensors max_age=3600 max_bytes=1M\nlogs max_files=10\ntmp\n")
+    assert [(rule.path, rule.max_age, rule.max_bytes, rule.max_files) for rule in rules] == [
+        ("sensors", 3600.0, 1 << 20, None), ("logs", None, None, 10), ("tmp", None, None, None)]
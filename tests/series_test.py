@@ -0,0 +1,54 @@
+import pytest
+
+from iotfs.filesystem.data.series import TimeSeries
+
+
+def test_aggregates():
+    series = TimeSeries()
+    assert series.mean() is None
+    for idx, value in enumerate([3, 1, 4, 1, 5]):
+        series.append(value, timestamp=idx)
+    assert series.count == 5
+    assert series.min == 1
+    assert series.max == 5
+    assert series.last == 5
+    assert series.mean() == pytest.approx(2.8)
+
+
+def test_parse():
+    series = TimeSeries()
+    assert series.parse(b"10,1.5\n2.5\n\n") == 2
+    assert series.timestamps[0] == 10
+    assert list(series.values) == [1.5, 2.5]
+    with pytest.raises(ValueError):
+        series.parse(b"3\nno value\n")
+    # A failed write does not append a part of it.
+    assert series.count == 2
+
+
+def test_parse_last_line():
+    series = TimeSeries()
+    assert series.parse(b"10,1.5\r\n20,2.5") == 2
+    assert list(series.timestamps) == [10, 20]
+
+
+def test_late_samples():
+    series = TimeSeries()
+    for timestamp in (10, 30, 20, 5, 30):
+        series.append(float(timestamp), timestamp=timestamp)
+    assert list(series.timestamps) == [5, 10, 20, 30, 30]
+    assert series.last == 30.0 and series.version == 5
+    assert series.downsample(10) == [(0.0, 5.0, 5.0, 5.0, 1), (10.0, 10.0, 10.0, 10.0, 1), (20.0, 20.0, 20.0, 20.0, 1),
+                                     (30.0, 30.0, 30.0, 30.0, 2)]
+
+
+def test_downsample():
+    series = TimeSeries()
+    for idx in range(25):
+        series.append(float(idx), timestamp=1000 + idx)
+    assert series.downsample(10) == [
+        (1000.0, 0.0, 9.0, 4.5, 10),
+        (1010.0, 10.0, 19.0, 14.5, 10),
+        (1020.0, 20.0, 24.0, 22.0, 5),
+    ]
+    assert series.to_csv().splitlines()[0] == "1000.0,0.0"
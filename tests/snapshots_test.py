@@ -0,0 +1,45 @@
+from iotfs.filesystem.data.data import Data
+from iotfs.utils._fs_utils import ROOT_INODE, Updates
+
+
+def create_data():
+    data = Data()
+    data.add_root_entry("mnt")
+    data.apply_updates([(Updates.WRITE, "site/dev/temp", "21.5"), (Updates.WRITE, "site/hum", "40")])
+    return data
+
+
+def names(data, snapshot, inode):
+    return sorted(data.snapshots.name(snapshot, child) for child in data.snapshots.children(snapshot, inode))
+
+
+def test_snapshot_is_frozen():
+    data = create_data()
+    site = data.get_entry_by_relative_path("site").inode
+    temp = data.get_entry_by_relative_path("site/dev/temp").inode
+    snapshot = data.snapshots.create("before", "site")
+    assert (snapshot.nodes, snapshot.children) == (dict(), dict())
+
+    data.apply_updates([(Updates.APPEND, "site/dev/temp", ";22"), (Updates.WRITE, "site/dev/new", "1"),
+                        (Updates.REMOVE, "site/hum", None)])
+    data.rename_entry(data.get_entry(temp), site, b"moved")
+
+    assert data.snapshots.node(snapshot, temp).get_data() == b"21.5"
+    assert data.nodes[temp].get_data() == b"21.5;22"
+    assert names(data, snapshot, site) == [b"dev", b"hum"]
+    dev = data.snapshots.lookup(snapshot, site, b"dev")
+    assert names(data, snapshot, dev) == [b"temp"]
+    assert data.snapshots.name(snapshot, site) == b"before"
+    # Only the touched nodes were copied.
+    assert sorted(snapshot.nodes) == sorted([temp, data.get_entry_by_relative_path("site/dev").inode, site,
+                                             data.snapshots.lookup(snapshot, site, b"hum")])
+
+
+def test_views():
+    data = create_data()
+    snapshot = data.snapshots.create("all")
+    view = data.snapshots.view(snapshot, ROOT_INODE)
+    assert data.snapshots.is_view(view) and not data.xattrs.is_view(view)
+    assert data.snapshots.resolve(view) == (snapshot, ROOT_INODE)
+    data.snapshots.remove("all")
+    assert data.snapshots.resolve(view) == (None, ROOT_INODE)
@@ -0,0 +1,39 @@
+import pyfuse3
+
+from iotfs.filesystem._trace import TraceWriter, Payload, read_trace, hash_name
+from iotfs.utils._fs_utils import Updates
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "trace.bin")
+    trace = TraceWriter(path, "/mnt/iot")
+    attr = pyfuse3.EntryAttributes()
+    attr.st_size = 2
+    trace.record("lookup", [1, b"sensor", None], 0.5, 0.001, inode=2)
+    trace.record("write", [2, 0, b"12.5"], 0.75, 0.002)
+    trace.record("forget", [[(2, 1)]], 1.0, 0.0)
+    trace.record("apply_updates", [[(Updates.WRITE, "a/b", "1"), (Updates.MKDIR, "c", None)]], 1.5, 0.0)
+    trace.record("readdir", [1, 0, ["token"]], 2.0, 0.0, error=2)
+    trace.record("open", [2, 0, None], 2.5, 0.0, handle=7)
+    trace.close()
+
+    mount_point, records = read_trace(path)
+    assert mount_point == "/mnt/iot"
+    assert [record[0] for record in records] == ["lookup", "write", "forget", "apply_updates", "readdir",
+                                                  "open"]
+    assert records[0][1:] == (0.5, 0.001, 0, 2, [1, b"sensor", None])
+    assert records[1][5] == [2, 0, Payload(4)]
+    assert records[2][5] == [[[2, 1]]]
+    assert records[3][5] == [[[0, "a/b", Payload(1)], [2, "c", Payload(0)]]]
+    assert records[4][3] == 2 and records[4][5] == [1, 0, None]
+    assert records[5][5] == [2, 0, None, 7]
+
+
+def test_hash_names(tmp_path):
+    path = str(tmp_path / "trace.bin")
+    trace = TraceWriter(path, "iot", hash_names=True)
+    trace.record("lookup", [1, b"sensor", None], 0.0, 0.0)
+    trace.close()
+    mount_point, records = read_trace(path)
+    assert mount_point == hash_name(b"iot").decode()
+    assert records[0][5] == [1, hash_name(b"sensor"), None]
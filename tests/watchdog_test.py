@@ -0,0 +1,34 @@
+import logging
+import time
+
+import trio
+
+from iotfs.filesystem._watchdog import Watchdog
+from iotfs.utils._metrics import Metrics
+
+
+async def operation(*args):
+    return await blocking_handler(*args)
+
+
+async def blocking_handler(fs, inode):
+    time.sleep(0.4)
+
+
+def test_stall():
+    metrics = Metrics()
+    watchdog = Watchdog(operation.__code__, metrics, logging.getLogger("watchdog_test"), threshold=0.1)
+
+    async def main():
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(watchdog.run)
+            await trio.sleep(0.2)
+            await operation(None, 42)
+            await trio.sleep(0.2)
+            nursery.cancel_scope.cancel()
+
+    trio.run(main)
+    assert watchdog.last_stall == ("blocking_handler", 42)
+    assert metrics.get("stalls") == 1
+    assert metrics.get("stalls.blocking_handler") == 1
+    assert metrics.get("stall_seconds") > 0.2
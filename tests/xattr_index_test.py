@@ -0,0 +1,43 @@
+from iotfs.filesystem.data.xattr_index import XattrIndex, link_name
+
+
+def names(index, inode):
+    return dict((key[-1], index.view(*key)) for key in index.children(inode))
+
+
+def test_find():
+    index = XattrIndex()
+    index.add(2, b"user.type", b"thermo")
+    index.add(3, b"user.type", b"thermo")
+    index.add(3, b"user.room", b"kitchen")
+    assert index.find(b"user.type", b"thermo") == [2, 3]
+    index.discard(2, b"user.type", b"thermo")
+    index.discard_node(3, {b"user.type": b"thermo", b"user.room": b"kitchen"})
+    assert index.find(b"user.type", b"thermo") == []
+    assert index.index == dict()
+
+
+def test_views():
+    index = XattrIndex()
+    index.root = 5
+    index.add(2, b"user.type", b"thermo")
+    index.add(3, b"user.type", b"a/b")
+    attribute = names(index, 5)[b"user.type"]
+    assert index.is_browsable(attribute)
+    # Values, which aren't valid names, can't be listed.
+    assert list(names(index, attribute)) == [b"thermo"]
+    value = index.lookup(attribute, b"thermo", None)
+    assert value == (b"user.type", b"thermo")
+    links = names(index, index.view(*value))
+    assert list(links) == [2]
+    assert link_name(2, b"temp") == b"2-temp"
+    assert index.lookup(index.view(*value), b"2-temp", lambda inode: b"temp") == (b"user.type", b"thermo", 2)
+    assert index.lookup(index.view(*value), b"2-other", lambda inode: b"temp") is None
+
+    # Views of emptied entries are dropped, the kernel may still refer to them.
+    view = index.view(*value)
+    index.discard(2, b"user.type", b"thermo")
+    assert index.key(view) is None
+    assert index.is_view(view) and index.is_browsable(view)
+    assert index.children(view) == []
+    assert index.lookup(view, b"2-temp", lambda inode: b"temp") is None